@@ -0,0 +1,67 @@
+"""Reports the memory used per movie by a populated MemoryRepository.
+
+Run from the CS235Assignment2 directory:
+
+    python -m benchmarks.memory_per_movie [--data-path PATH] [--copies N]
+
+--copies loads the catalogue N times over (with distinct titles) to see how memory scales with catalogue size.
+"""
+import argparse
+import csv
+import gc
+import os
+import sys
+import tempfile
+import tracemalloc
+
+from cs235flix.adapters.memory_repository import MemoryRepository, load_movies_and_tags
+
+
+def write_copies(data_path: str, copies: int, directory: str):
+    with open(os.path.join(data_path, 'movies.csv'), encoding='utf-8-sig', newline='') as infile:
+        rows = list(csv.reader(infile))
+    with open(os.path.join(directory, 'movies.csv'), 'w', encoding='utf-8', newline='') as outfile:
+        writer = csv.writer(outfile)
+        writer.writerow(rows[0])
+        # Movies are identified by rank, so each copy is ranked after the one before it.
+        last_rank = max(int(row[0]) for row in rows[1:])
+        for copy in range(copies):
+            for row in rows[1:]:
+                writer.writerow([copy * last_rank + int(row[0]), f'{row[1]} {copy}' if copy else row[1]] + row[2:])
+
+
+def measure(data_path: str):
+    gc.collect()
+    tracemalloc.start()
+    repo = MemoryRepository()
+    load_movies_and_tags(data_path, repo)
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return repo, used
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--data-path', default=os.path.join('cs235flix', 'adapters', 'data'))
+    parser.add_argument('--copies', type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        data_path = args.data_path
+        if args.copies > 1:
+            write_copies(args.data_path, args.copies, directory)
+            data_path = directory
+        repo, used = measure(data_path)
+
+    number_of_movies = repo.get_number_of_movies()
+    movie = repo.get_first_movie()
+    print(f'movies:               {number_of_movies}')
+    print(f'repository bytes:     {used}')
+    print(f'bytes per movie:      {used / number_of_movies:.0f}')
+    instance_dict = sys.getsizeof(movie.__dict__) if hasattr(movie, '__dict__') else 0
+    print(f'Movie instance bytes: {sys.getsizeof(movie) + instance_dict}')
+
+
+if __name__ == '__main__':
+    main()
@@ -15,3 +15,16 @@ class Config:
 
     SECRET_KEY = environ.get('SECRET_KEY')
 
+    # Repository configuration
+    DATABASE_PATH = environ.get('DATABASE_PATH')
+    SNAPSHOT_PATH = environ.get('SNAPSHOT_PATH')
+    CATALOGUE_PATH = environ.get('CATALOGUE_PATH')
+    INGEST_WORKERS = int(environ.get('INGEST_WORKERS') or 1)
+    JOURNAL_PATH = environ.get('JOURNAL_PATH')
+    JOURNAL_COMPACT_INTERVAL = float(environ.get('JOURNAL_COMPACT_INTERVAL') or 0)
+    RELOAD_INTERVAL = float(environ.get('RELOAD_INTERVAL') or 0)
+
+    # Response configuration
+    COMPRESS_MIN_SIZE = int(environ.get('COMPRESS_MIN_SIZE') or 0)
+    STATIC_FINGERPRINTS = (environ.get('STATIC_FINGERPRINTS') or 'False').lower() == 'true'
+
@@ -2,10 +2,17 @@
 
 import os
 
-from flask import Flask
+import click
+from flask import Flask, g
 
 import cs235flix.adapters.repository as repo
-from cs235flix.adapters.memory_repository import MemoryRepository, populate
+from cs235flix.adapters.memory_repository import MemoryRepository, populate, hash_seed_passwords
+from cs235flix.adapters.snapshot import populate_from_snapshot
+from cs235flix.adapters.catalogue_repository import populate_catalogue, build_catalogue
+from cs235flix.adapters.reloader import CatalogueReloader
+from cs235flix.adapters import database_repository
+from cs235flix.adapters.journal import open_journal
+from cs235flix.utilities.assets import ResponseCompressor, StaticFingerprints
 
 
 def create_app(test_config=None):
@@ -23,9 +30,49 @@ def create_app(test_config=None):
         app.config.from_mapping(test_config)
         data_path = app.config['TEST_DATA_PATH']
 
-    # Create the MemoryRepository implementation for a memory-based repository.
-    repo.repo_instance = MemoryRepository()
-    populate(data_path, repo.repo_instance)
+    app.cli.add_command(hash_seed_users_command)
+    app.cli.add_command(build_catalogue_command)
+
+    # Choose the repository implementation: a SQLite database, a memory-mapped catalogue, a pickled snapshot of a
+    # MemoryRepository, or a MemoryRepository populated from the CSV files.
+    if app.config.get('DATABASE_PATH'):
+        # Keep everything in a SQLite database shared by all worker processes. It is only populated when empty.
+        repo.repo_instance = database_repository.DatabaseRepository(app.config['DATABASE_PATH'])
+        database_repository.populate(data_path, repo.repo_instance)
+        # Build each user once per request, however many times the request looks them up.
+        app.before_request(repo.repo_instance.begin_request)
+        app.teardown_request(repo.repo_instance.end_request)
+    elif app.config.get('CATALOGUE_PATH'):
+        # Serve movies from a memory-mapped catalogue file shared by all worker processes.
+        repo.repo_instance = populate_catalogue(data_path, app.config['CATALOGUE_PATH'])
+    elif app.config.get('SNAPSHOT_PATH'):
+        # Reuse the repository pickled by an earlier start, unless the CSV files have changed since.
+        repo.repo_instance = populate_from_snapshot(data_path, app.config['SNAPSHOT_PATH'])
+    else:
+        repo.repo_instance = MemoryRepository()
+        populate(data_path, repo.repo_instance, app.config.get('INGEST_WORKERS'))
+
+    # Requests use the repository through g.repo, bound once as each begins, so that a reload putting a new
+    # repository in place part way through a request can't mix two catalogues in it.
+    app.before_request(bind_repository)
+
+    if app.config.get('JOURNAL_PATH') and not app.config.get('DATABASE_PATH'):
+        # Keep registrations, reviews and watch history across restarts.
+        app.extensions['journal'] = open_journal(app.config['JOURNAL_PATH'], repo.repo_instance, data_path,
+                                                 app.config.get('JOURNAL_COMPACT_INTERVAL', 0))
+
+    if app.config.get('RELOAD_INTERVAL') and not (app.config.get('DATABASE_PATH') or app.config.get('CATALOGUE_PATH')):
+        # Pick up changes to movies.csv without a restart.
+        app.extensions['catalogue_reloader'] = CatalogueReloader(data_path, app.config['RELOAD_INTERVAL'])
+        app.before_request(app.extensions['catalogue_reloader'].check)
+
+    if app.config.get('COMPRESS_MIN_SIZE'):
+        # Compress larger responses for clients that accept gzip or brotli.
+        app.after_request(ResponseCompressor(app.config['COMPRESS_MIN_SIZE']))
+
+    if app.config.get('STATIC_FINGERPRINTS'):
+        # Version static URLs by content, so that browsers can cache the files indefinitely.
+        app.extensions['static_fingerprints'] = StaticFingerprints(app)
 
     # Build the application - these steps require an application context.
     with app.app_context():
@@ -42,4 +89,28 @@ def create_app(test_config=None):
         from .utilities import utilities
         app.register_blueprint(utilities.utilities_blueprint)
 
+        from .api import api
+        app.register_blueprint(api.api_blueprint)
+
     return app
+
+
+def bind_repository():
+    g.repo = repo.repo_instance
+
+
+@click.command('hash-seed-users')
+@click.option('--data-path', default=os.path.join('cs235flix', 'adapters', 'data'), show_default=True)
+def hash_seed_users_command(data_path):
+    """Store password hashes in users.csv so that startup doesn't hash seed passwords."""
+    count = hash_seed_passwords(os.path.join(data_path, 'users.csv'))
+    click.echo(f'Hashed {count} seed passwords.')
+
+
+@click.command('build-catalogue')
+@click.argument('catalogue_path')
+@click.option('--data-path', default=os.path.join('cs235flix', 'adapters', 'data'), show_default=True)
+def build_catalogue_command(catalogue_path, data_path):
+    """Write a memory-mappable catalogue of the movies in movies.csv."""
+    build_catalogue(data_path, catalogue_path)
+    click.echo(f'Wrote {catalogue_path}.')
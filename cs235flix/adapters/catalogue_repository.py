@@ -0,0 +1,434 @@
+import os
+import sys
+import math
+import mmap
+import struct
+import hashlib
+import weakref
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import List
+
+from cs235flix.adapters.repository import RepositoryException, MOVIE_METRICS
+from cs235flix.adapters.memory_repository import MemoryRepository, load_users, load_reviews
+from cs235flix.adapters.text_index import TextIndex
+from cs235flix.domain.model import Actor, Director, Genre, Movie, Tag
+from cs235flix.datafilereaders.movie_file_csv_reader import MovieFileCSVReader
+
+
+# A catalogue file is a header followed by sections of native-order 32-bit integer arrays, plus one heap of UTF-8
+# strings that the arrays refer to by string id. Movie ids are ranks, which may have gaps, so movies are stored in
+# rank order and the ids section gives the rank of the movie at each position of every per-movie section. Bump
+# CATALOGUE_VERSION whenever the layout changes.
+CATALOGUE_MAGIC = b'CS235CAT'
+CATALOGUE_VERSION = 3
+NO_STRING = 0xFFFFFFFF
+NO_VALUE = 0xFFFFFFFF
+
+# Metrics are stored as whole numbers, multiplied by these scales; finer values are rounded.
+METRIC_SCALES = {'rating': 100, 'votes': 1, 'revenue_millions': 100, 'metascore': 1}
+
+SECTIONS = (
+    'string_offsets',       # string id -> start of the string in string_heap, plus the end of the last string
+    'string_heap',          # UTF-8 bytes
+    'ids',                  # per movie: its rank, ascending
+    'titles',               # per movie: string id
+    'descriptions',         # per movie: string id
+    'directors',            # per movie: string id, or NO_STRING
+    'years',                # per movie: release year, or 0
+    'runtimes',             # per movie: runtime in minutes
+    'actor_starts',         # per movie: start of its actors in actor_names, plus the end of the last movie's
+    'actor_names',          # string ids
+    'genre_starts',         # per movie: start of its genres in genre_names, plus the end of the last movie's
+    'genre_names',          # string ids
+    'actor_keys',           # string ids of actor names, sorted by name
+    'actor_postings_start',
+    'actor_postings',       # ascending movie ids for each actor in actor_keys
+    'director_keys',
+    'director_postings_start',
+    'director_postings',
+    'tag_keys',             # string ids of tag names, in the order the tags were first used
+    'tag_postings_start',
+    'tag_postings',
+    'year_values',          # release years, ascending
+    'year_ids',             # movie ids in the order of year_values
+    'runtime_values',
+    'runtime_ids',
+) + tuple(metric + suffix for metric in MOVIE_METRICS for suffix in (
+    '_column',              # per movie: scaled value, or NO_VALUE
+    '_values',              # scaled values, ascending
+    '_ascending',           # movie ids in the order of _values, then the ids of movies without a value
+    '_descending',          # movie ids by descending value, ties in id order, then the ids without a value
+))
+HEADER = struct.Struct('<8sIcxxxI32s')  # magic, version, byte order, number of movies, source digest
+SECTION_ENTRY = struct.Struct('<QQ')
+
+
+def native_byteorder():
+    return b'L' if sys.byteorder == 'little' else b'B'
+
+
+class CatalogueException(Exception):
+    pass
+
+
+class StringTable:
+    # Collects the distinct strings written to a catalogue, handing out string ids.
+
+    def __init__(self):
+        self._ids = dict()
+        self._offsets = array('I', [0])
+        self._heap = bytearray()
+
+    def add(self, text: str) -> int:
+        if text is None:
+            return NO_STRING
+        string_id = self._ids.get(text)
+        if string_id is None:
+            string_id = self._ids[text] = len(self._ids)
+            self._heap += text.encode('utf-8')
+            self._offsets.append(len(self._heap))
+        return string_id
+
+    @property
+    def offsets(self) -> array:
+        return self._offsets
+
+    @property
+    def heap(self) -> bytes:
+        return bytes(self._heap)
+
+
+class SortedNames:
+    # Read-only sequence of the names in a keys section, so bisect can search it without decoding every name.
+
+    def __init__(self, catalogue, keys):
+        self._catalogue = catalogue
+        self._keys = keys
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __getitem__(self, index):
+        return self._catalogue.string(self._keys[index])
+
+
+def build_postings(postings: dict, strings: StringTable, sort_keys: bool):
+    names = sorted(postings) if sort_keys else list(postings)
+    keys = array('I', [strings.add(name) for name in names])
+    starts = array('I', [0])
+    ids = array('I')
+    for name in names:
+        ids.extend(postings[name])
+        starts.append(len(ids))
+    return keys, starts, ids
+
+
+def write_catalogue(filename: str, ranked_movies: List[tuple], source_digest: str = ''):
+    # Writes (rank, movie) pairs, with distinct ranks, to a catalogue file. source_digest records what the catalogue
+    # was built from.
+    strings = StringTable()
+    columns = {name: array('I') for name in SECTIONS if name != 'string_heap'}
+    columns['actor_starts'].append(0)
+    columns['genre_starts'].append(0)
+    actor_postings, director_postings, tag_postings = dict(), dict(), dict()
+
+    ranked_movies = sorted(ranked_movies, key=lambda pair: pair[0])
+    for id, movie in ranked_movies:
+        columns['ids'].append(id)
+        columns['titles'].append(strings.add(movie.title))
+        columns['descriptions'].append(strings.add(movie.description))
+        director_name = movie.director.director_full_name if movie.director is not None else None
+        columns['directors'].append(strings.add(director_name))
+        columns['years'].append(movie.release_year or 0)
+        columns['runtimes'].append(movie.runtime_minutes)
+        for metric in MOVIE_METRICS:
+            value = getattr(movie, metric)
+            columns[metric + '_column'].append(NO_VALUE if value is None else round(value * METRIC_SCALES[metric]))
+
+        for actor in movie.actors:
+            columns['actor_names'].append(strings.add(actor.actor_full_name))
+        columns['actor_starts'].append(len(columns['actor_names']))
+        for genre in movie.genres:
+            columns['genre_names'].append(strings.add(genre.genre_name))
+        columns['genre_starts'].append(len(columns['genre_names']))
+
+        for name in dict.fromkeys(actor.actor_full_name for actor in movie.actors):
+            actor_postings.setdefault(name, []).append(id)
+        if director_name is not None:
+            director_postings.setdefault(director_name, []).append(id)
+        for name in dict.fromkeys(genre.genre_name for genre in movie.genres):
+            tag_postings.setdefault(name, []).append(id)
+
+    for prefix, postings, sort_keys in (('actor', actor_postings, True), ('director', director_postings, True),
+                                        ('tag', tag_postings, False)):
+        keys, starts, ids = build_postings(postings, strings, sort_keys)
+        columns[prefix + '_keys'] = keys
+        columns[prefix + '_postings_start'] = starts
+        columns[prefix + '_postings'] = ids
+
+    # Movies without a release year are left out of the year index.
+    year_pairs = sorted((year, id) for id, year in zip(columns['ids'], columns['years']) if year)
+    runtime_pairs = sorted((runtime, id) for id, runtime in zip(columns['ids'], columns['runtimes']))
+    for prefix, pairs in (('year', year_pairs), ('runtime', runtime_pairs)):
+        columns[prefix + '_values'] = array('I', [value for value, id in pairs])
+        columns[prefix + '_ids'] = array('I', [id for value, id in pairs])
+
+    for metric in MOVIE_METRICS:
+        column = columns[metric + '_column']
+        pairs = sorted((value, id) for id, value in zip(columns['ids'], column) if value != NO_VALUE)
+        missing = [id for id, value in zip(columns['ids'], column) if value == NO_VALUE]
+        columns[metric + '_values'] = array('I', [value for value, id in pairs])
+        columns[metric + '_ascending'] = array('I', [id for value, id in pairs] + missing)
+        pairs.sort(key=lambda pair: (-pair[0], pair[1]))
+        columns[metric + '_descending'] = array('I', [id for value, id in pairs] + missing)
+
+    columns['string_offsets'] = strings.offsets
+    columns['string_heap'] = strings.heap
+
+    # Lay the sections out after the header and section table, aligned so that they can be cast to 32-bit arrays.
+    offset = HEADER.size + SECTION_ENTRY.size * len(SECTIONS)
+    table = []
+    for name in SECTIONS:
+        offset += -offset % 4
+        length = len(columns[name]) * (columns[name].itemsize if isinstance(columns[name], array) else 1)
+        table.append((offset, length))
+        offset += length
+
+    temp_path = f'{filename}.{os.getpid()}.tmp'
+    with open(temp_path, 'wb') as outfile:
+        outfile.write(HEADER.pack(CATALOGUE_MAGIC, CATALOGUE_VERSION, native_byteorder(), len(ranked_movies),
+                                  bytes.fromhex(source_digest)))
+        for entry in table:
+            outfile.write(SECTION_ENTRY.pack(*entry))
+        for name, (offset, length) in zip(SECTIONS, table):
+            outfile.write(b'\0' * (offset - outfile.tell()))
+            data = columns[name]
+            outfile.write(data.tobytes() if isinstance(data, array) else data)
+    os.replace(temp_path, filename)
+
+
+def read_header(filename: str):
+    # Returns (number of movies, source digest) for a catalogue file this code can read, or raises CatalogueException.
+    with open(filename, 'rb') as infile:
+        header = infile.read(HEADER.size)
+    if len(header) < HEADER.size:
+        raise CatalogueException(f'{filename} is not a catalogue file')
+    magic, version, byteorder, number_of_movies, digest = HEADER.unpack(header)
+    if magic != CATALOGUE_MAGIC:
+        raise CatalogueException(f'{filename} is not a catalogue file')
+    if version != CATALOGUE_VERSION or byteorder != native_byteorder():
+        raise CatalogueException(f'{filename} was written by an incompatible version or platform')
+    return number_of_movies, digest.hex()
+
+
+class CatalogueRepository(MemoryRepository):
+    """ Repository serving the movie catalogue from a memory-mapped catalogue file.
+
+    The operating system shares the mapped pages between all processes that open the same file, so worker processes
+    don't each hold a copy of the catalogue. Movie objects are built on request and kept only while something (such
+    as a review or a watch list) refers to them. Users, reviews and watch history are held in memory, as they are by
+    MemoryRepository. The catalogue itself is read-only.
+    """
+
+    def __init__(self, filename: str):
+        super().__init__()
+        self._number_of_movies, self._source_digest = read_header(filename)
+
+        with open(filename, 'rb') as infile:
+            self._mmap = mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._mmap)
+        table_start = HEADER.size
+        self._sections = dict()
+        for index, name in enumerate(SECTIONS):
+            offset, length = SECTION_ENTRY.unpack_from(self._mmap, table_start + index * SECTION_ENTRY.size)
+            section = view[offset:offset + length]
+            self._sections[name] = section if name == 'string_heap' else section.cast('I')
+
+        # Tags are few, so they are kept as objects. They don't list their movies; use get_tag_summary instead.
+        for string_id in self._sections['tag_keys']:
+            super().add_tag(Tag(self.string(string_id)))
+        self._tag_positions = {tag.tag_name: index for index, tag in enumerate(self._tags)}
+
+        self._live_movies = weakref.WeakValueDictionary()  # key=rank, value=movie built from the catalogue
+        self._movie_ids = weakref.WeakKeyDictionary()  # key=movie built from the catalogue, value=rank
+        self._text_index = None  # built on the first search, so that processes which never search don't hold one
+
+    @property
+    def source_digest(self) -> str:
+        return self._source_digest
+
+    def string(self, string_id: int) -> str:
+        if string_id == NO_STRING:
+            return None
+        offsets = self._sections['string_offsets']
+        return bytes(self._sections['string_heap'][offsets[string_id]:offsets[string_id + 1]]).decode('utf-8')
+
+    # Helper method to find the position of the movie with the given rank in the per-movie sections, or None.
+    def _position(self, id) -> int:
+        if type(id) is not int:
+            return None
+        ids = self._sections['ids']
+        position = bisect_left(ids, id)
+        if position == len(ids) or ids[position] != id:
+            return None
+        return position
+
+    # Helper method to build the Movie with the given rank from the catalogue, or reuse one that is still in use.
+    def _movie(self, id: int) -> Movie:
+        movie = self._live_movies.get(id)
+        if movie is not None:
+            return movie
+
+        sections = self._sections
+        index = self._position(id)
+        movie = Movie(self.string(sections['titles'][index]), sections['years'][index])
+        movie.description = self.string(sections['descriptions'][index])
+        director_name = self.string(sections['directors'][index])
+        if director_name is not None:
+            movie.director = Director(director_name)
+        actor_names = sections['actor_names'][sections['actor_starts'][index]:sections['actor_starts'][index + 1]]
+        movie.actors = [Actor(self.string(string_id)) for string_id in actor_names]
+        genre_names = sections['genre_names'][sections['genre_starts'][index]:sections['genre_starts'][index + 1]]
+        movie.genres = [Genre(self.string(string_id)) for string_id in genre_names]
+        if sections['runtimes'][index] > 0:
+            movie.runtime_minutes = sections['runtimes'][index]
+        for metric in MOVIE_METRICS:
+            value = sections[metric + '_column'][index]
+            if value != NO_VALUE:
+                scale = METRIC_SCALES[metric]
+                setattr(movie, metric, value if scale == 1 else value / scale)
+        movie.tags = [self._tags[self._tag_positions[genre.genre_name]] for genre in movie.genres]
+
+        self._live_movies[id] = movie
+        self._movie_ids[movie] = id
+        return movie
+
+    def add_movie(self, movie: Movie):
+        raise RepositoryException('The catalogue is read-only')
+
+    def add_movies_bulk(self, movies: List[Movie]):
+        raise RepositoryException('The catalogue is read-only')
+
+    def add_ranked_movies_bulk(self, ranked_movies):
+        raise RepositoryException('The catalogue is read-only')
+
+    def add_tag(self, tag: Tag):
+        raise RepositoryException('The catalogue is read-only')
+
+    def reload_movies(self, ranked_movies):
+        raise RepositoryException('The catalogue is read-only; rebuild it with build-catalogue instead')
+
+    def get_movie(self, id: int) -> Movie:
+        if self._position(id) is None:
+            return None
+        return self._movie(id)
+
+    def get_movies_by_id(self, id_list):
+        return [self._movie(id) for id in id_list if self._position(id) is not None]
+
+    def get_number_of_movies(self):
+        return self._number_of_movies
+
+    def get_movie_ids(self):
+        return self._sections['ids']
+
+    def get_first_movie(self):
+        ids = self._sections['ids']
+        return self._movie(ids[0]) if len(ids) > 0 else None
+
+    def get_last_movie(self):
+        ids = self._sections['ids']
+        return self._movie(ids[-1]) if len(ids) > 0 else None
+
+    def movie_index(self, movie: Movie):
+        return self._movie_ids.get(movie, ValueError)
+
+    # Helper method to return the postings of name in one of the actor, director or tag indexes.
+    def _postings(self, prefix: str, position: int):
+        starts = self._sections[prefix + '_postings_start']
+        return self._sections[prefix + '_postings'][starts[position]:starts[position + 1]]
+
+    # Helper method to find name in one of the name-sorted actor or director indexes.
+    def _person_postings(self, prefix: str, name: str):
+        names = SortedNames(self, self._sections[prefix + '_keys'])
+        position = bisect_left(names, name)
+        if position == len(names) or names[position] != name:
+            return []
+        return self._postings(prefix, position).tolist()
+
+    def get_movie_ids_for_actor(self, name: str):
+        return self._person_postings('actor', name)
+
+    def get_movie_ids_for_director(self, name: str):
+        return self._person_postings('director', name)
+
+    def get_tag_summary(self, tag_name: str):
+        position = self._tag_positions.get(tag_name)
+        if position is None:
+            return None
+        # Built on each call rather than cached, so that processes don't each keep copies of large tags.
+        movie_ids = tuple(self._postings('tag', position))
+        return movie_ids, len(movie_ids)
+
+    # Helper method to return the ascending ranks whose values lie in [low, high] of the year or runtime index.
+    def _range(self, prefix: str, low: int, high: int):
+        values = self._sections[prefix + '_values']
+        start = bisect_left(values, low)
+        end = bisect_right(values, high)
+        return sorted(self._sections[prefix + '_ids'][start:end])
+
+    def get_movie_ids_for_year_range(self, start: int, end: int):
+        return self._range('year', start, end)
+
+    def get_movie_ids_for_runtime(self, minimum: int, maximum: int):
+        return self._range('runtime', minimum, maximum)
+
+    def get_movie_ids_for_metric_range(self, metric: str, minimum, maximum):
+        # Scale the bounds as the values were, rounding away float error such as 8.1 * 100 = 810.0000000000001.
+        scale = METRIC_SCALES[metric]
+        values = self._sections[metric + '_values']
+        start = 0 if minimum is None else bisect_left(values, math.ceil(round(minimum * scale, 6)))
+        end = len(values) if maximum is None else bisect_right(values, math.floor(round(maximum * scale, 6)))
+        return sorted(self._sections[metric + '_ascending'][start:end])
+
+    def get_movie_ids_by_metric(self, metric: str, descending: bool = False):
+        return tuple(self._sections[metric + ('_descending' if descending else '_ascending')])
+
+    def search_movie_ids(self, query: str, limit: int = None):
+        if self._text_index is None:
+            text_index = TextIndex()
+            sections = self._sections
+            for index, id in enumerate(sections['ids']):
+                text_index.add(id, self.string(sections['titles'][index]), self.string(sections['descriptions'][index]))
+            self._text_index = text_index
+        return self._text_index.search(query, limit)
+
+
+def file_digest(filename: str) -> str:
+    with open(filename, 'rb') as infile:
+        return hashlib.sha256(infile.read()).hexdigest()
+
+
+def build_catalogue(data_path: str, catalogue_path: str):
+    # Writes a catalogue of the movies in data_path's movies.csv.
+    movies_path = os.path.join(data_path, 'movies.csv')
+    file = MovieFileCSVReader(movies_path)
+    # Skip the same malformed rows as load_movies_and_tags, and keep the ranks as movie ids, so that movie ids match.
+    write_catalogue(catalogue_path, list(file.iter_ranked_movies(skip_bad_rows=True)), file_digest(movies_path))
+
+
+def populate_catalogue(data_path: str, catalogue_path: str) -> CatalogueRepository:
+    # Opens the catalogue at catalogue_path, rebuilding it first if it is missing or was built from a different
+    # movies.csv, then loads users and reviews into the repository.
+    try:
+        current = read_header(catalogue_path)[1] == file_digest(os.path.join(data_path, 'movies.csv'))
+    except (OSError, CatalogueException):
+        current = False
+    if not current:
+        build_catalogue(data_path, catalogue_path)
+
+    repo = CatalogueRepository(catalogue_path)
+    users = load_users(data_path, repo)
+    load_reviews(data_path, repo, users)
+    return repo
@@ -0,0 +1,615 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Iterable, List
+
+from cs235flix.adapters.repository import AbstractRepository, RepositoryException, MOVIE_METRICS
+from cs235flix.adapters.memory_repository import read_csv_file, read_csv_headers
+from cs235flix.adapters.text_index import TextIndex
+from cs235flix.domain.model import Actor, Director, Genre, Movie, Review, User, Tag
+from cs235flix.datafilereaders.movie_file_csv_reader import MovieFileCSVReader
+
+from werkzeug.security import generate_password_hash
+
+
+# Movie ids are ranks, as in MemoryRepository. Lists of actors and genres keep their order through position columns.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS movies (
+    id INTEGER PRIMARY KEY,
+    title TEXT NOT NULL,
+    release_year INTEGER,
+    description TEXT NOT NULL DEFAULT '',
+    director TEXT,
+    runtime_minutes INTEGER NOT NULL DEFAULT 0,
+    rating REAL,
+    votes INTEGER,
+    revenue_millions REAL,
+    metascore INTEGER
+);
+CREATE INDEX IF NOT EXISTS movies_title ON movies (title, release_year);
+CREATE INDEX IF NOT EXISTS movies_release_year ON movies (release_year, id);
+CREATE INDEX IF NOT EXISTS movies_runtime ON movies (runtime_minutes, id);
+CREATE INDEX IF NOT EXISTS movies_director ON movies (director, id);
+CREATE INDEX IF NOT EXISTS movies_rating ON movies (rating, id);
+CREATE INDEX IF NOT EXISTS movies_votes ON movies (votes, id);
+CREATE INDEX IF NOT EXISTS movies_revenue_millions ON movies (revenue_millions, id);
+CREATE INDEX IF NOT EXISTS movies_metascore ON movies (metascore, id);
+
+CREATE TABLE IF NOT EXISTS movie_actors (
+    movie_id INTEGER NOT NULL REFERENCES movies (id),
+    position INTEGER NOT NULL,
+    actor_name TEXT NOT NULL,
+    PRIMARY KEY (movie_id, position)
+);
+CREATE INDEX IF NOT EXISTS movie_actors_name ON movie_actors (actor_name, movie_id);
+
+CREATE TABLE IF NOT EXISTS tags (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS movie_tags (
+    movie_id INTEGER NOT NULL REFERENCES movies (id),
+    position INTEGER NOT NULL,
+    tag_name TEXT NOT NULL,
+    PRIMARY KEY (movie_id, position)
+);
+CREATE INDEX IF NOT EXISTS movie_tags_name ON movie_tags (tag_name, movie_id);
+
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY,
+    user_name TEXT NOT NULL UNIQUE,
+    password TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS friends (
+    user_id INTEGER NOT NULL REFERENCES users (id),
+    friend_id INTEGER NOT NULL,
+    pending INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, pending, friend_id)
+);
+
+CREATE TABLE IF NOT EXISTS reviews (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users (id),
+    movie_id INTEGER NOT NULL REFERENCES movies (id),
+    review_text TEXT,
+    rating INTEGER,
+    timestamp TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS reviews_movie ON reviews (movie_id, id);
+CREATE INDEX IF NOT EXISTS reviews_user ON reviews (user_id, id);
+
+CREATE TABLE IF NOT EXISTS watched (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users (id),
+    movie_id INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS watched_user ON watched (user_id, id);
+
+-- A single row counting additions to movies, tags and reviews, kept up by the triggers below. The repository never
+-- updates or deletes those rows.
+CREATE TABLE IF NOT EXISTS data_version (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    changes INTEGER NOT NULL,
+    modified TEXT NOT NULL
+);
+INSERT OR IGNORE INTO data_version VALUES (1, 0, strftime('%Y-%m-%dT%H:%M:%f', 'now'));
+CREATE TRIGGER IF NOT EXISTS movies_added AFTER INSERT ON movies BEGIN
+    UPDATE data_version SET changes = changes + 1, modified = strftime('%Y-%m-%dT%H:%M:%f', 'now');
+END;
+CREATE TRIGGER IF NOT EXISTS tags_added AFTER INSERT ON tags BEGIN
+    UPDATE data_version SET changes = changes + 1, modified = strftime('%Y-%m-%dT%H:%M:%f', 'now');
+END;
+CREATE TRIGGER IF NOT EXISTS movie_tags_added AFTER INSERT ON movie_tags BEGIN
+    UPDATE data_version SET changes = changes + 1, modified = strftime('%Y-%m-%dT%H:%M:%f', 'now');
+END;
+CREATE TRIGGER IF NOT EXISTS reviews_added AFTER INSERT ON reviews BEGIN
+    UPDATE data_version SET changes = changes + 1, modified = strftime('%Y-%m-%dT%H:%M:%f', 'now');
+END;
+"""
+
+MOVIE_FIELDS = ('id', 'title', 'release_year', 'description', 'director', 'runtime_minutes') + MOVIE_METRICS
+MOVIE_COLUMNS = ', '.join(MOVIE_FIELDS)
+
+# Bump SCHEMA_VERSION whenever SCHEMA changes; databases created from an older schema must be recreated.
+SCHEMA_VERSION = 3
+
+# SQLite limits the number of parameters in a statement, so long id lists are queried in batches.
+MAX_PARAMETERS = 500
+
+# Connections each process keeps open; threads wanting more wait for one to be returned.
+POOL_SIZE = 8
+
+
+class ConnectionPool:
+    # Lends connections to the database, each to one thread at a time, and keeps at most size of them. Connections
+    # are opened when first needed and then reused by whichever thread borrows them next. Connections opened before a
+    # fork are not reused by the child process.
+
+    def __init__(self, database_path: str, size: int = POOL_SIZE):
+        self._database_path = database_path
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._idle = []
+        self._pid = os.getpid()
+        self._closed = False
+
+    @contextmanager
+    def connection(self):
+        # Lends a connection for the with block, committing at the end of the block, or rolling back if it raises.
+        with self._slots:
+            connection = self._borrow()
+            try:
+                with connection:
+                    yield connection
+            finally:
+                self._return(connection)
+
+    def _borrow(self) -> sqlite3.Connection:
+        with self._lock:
+            if self._pid != os.getpid():
+                self._idle = []
+                self._pid = os.getpid()
+            if len(self._idle) > 0:
+                return self._idle.pop()
+        connection = sqlite3.connect(self._database_path, timeout=30, check_same_thread=False)
+        connection.execute('PRAGMA foreign_keys = ON')
+        connection.execute('PRAGMA synchronous = NORMAL')
+        return connection
+
+    def _return(self, connection: sqlite3.Connection):
+        with self._lock:
+            if not self._closed and self._pid == os.getpid():
+                self._idle.append(connection)
+                return
+        connection.close()
+
+    def close_all(self):
+        # Closes the idle connections, and those lent out as they are returned.
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for connection in idle:
+            connection.close()
+
+
+class DatabaseRepository(AbstractRepository):
+    # Keeps the catalogue, users, reviews and watch history in a SQLite database that any number of processes can
+    # share. Domain objects are built from the database on each call, so they reflect writes by other processes.
+    # Between begin_request and end_request, though, each user is built once and then reused by the calling thread.
+
+    def __init__(self, database_path: str):
+        self._pool = ConnectionPool(database_path)
+        with self._pool.connection() as connection:
+            # Write-ahead logging lets readers in other processes carry on while one process writes.
+            connection.execute('PRAGMA journal_mode = WAL')
+            version = connection.execute('PRAGMA user_version').fetchone()[0]
+            if version != SCHEMA_VERSION:
+                if connection.execute("SELECT 1 FROM sqlite_master WHERE name = 'movies'").fetchone() is not None:
+                    raise RepositoryException(f'{database_path} has an older schema; delete it to repopulate it')
+                connection.executescript(SCHEMA)
+                connection.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+        self._text_index = None
+        self._text_index_key = None
+        self._text_index_lock = threading.Lock()
+        self._request = threading.local()
+
+    def _execute(self, sql: str, parameters=()):
+        # Returns every row sql gives, as the connection goes back to the pool straight away.
+        with self._pool.connection() as connection:
+            return connection.execute(sql, parameters).fetchall()
+
+    def _fetch_one(self, sql: str, parameters=()):
+        with self._pool.connection() as connection:
+            return connection.execute(sql, parameters).fetchone()
+
+    def close(self):
+        self._pool.close_all()
+
+    def begin_request(self):
+        # Until end_request, users fetched by this thread are kept and reused, unless a write changes them.
+        self._request.users = dict()
+
+    def end_request(self, exception=None):
+        self._request.users = None
+
+    # Helper method to drop the users kept for this request, after a write that may change them.
+    def _forget_users(self):
+        if getattr(self._request, 'users', None) is not None:
+            self._request.users.clear()
+
+    def add_user(self, user: User):
+        with self._pool.connection() as connection:
+            try:
+                cursor = connection.execute('INSERT INTO users (id, user_name, password) VALUES (?, ?, ?)',
+                                            (user.id, user.user_name, user.password))
+            except sqlite3.IntegrityError:
+                raise RepositoryException(f'User {user.user_name} already exists')
+        user.id = cursor.lastrowid
+        self._forget_users()
+
+    def get_user(self, username) -> User:
+        if type(username) is not str:
+            return None
+        users = getattr(self._request, 'users', None)
+        if users is not None and username.strip().lower() in users:
+            return users[username.strip().lower()]
+        row = self._fetch_one('SELECT id, user_name, password FROM users WHERE user_name = ?',
+                              (username.strip().lower(),))
+        if row is None:
+            return None
+
+        user = make_user(row)
+        user.friends = self._friends(user.id, pending=False)
+        user.pending_friends = self._friends(user.id, pending=True)
+        user.reviews = self._reviews('user_id = ?', (user.id,), user=user)
+        watched_ids = self._watched_ids(user.id)
+        movies = self._movies(watched_ids)
+        for id in watched_ids:
+            if id in movies:
+                user.watch_movie(movies[id], id)
+        if users is not None:
+            users[user.user_name] = user
+        return user
+
+    def get_user_by_id(self, id) -> User:
+        row = self._fetch_one('SELECT user_name FROM users WHERE id = ?', (id,))
+        return None if row is None else self.get_user(row[0])
+
+    def _friends(self, user_id: int, pending: bool) -> List[User]:
+        rows = self._execute(
+            'SELECT users.id, users.user_name, users.password FROM friends JOIN users ON users.id = friends.friend_id '
+            'WHERE friends.user_id = ? AND friends.pending = ? ORDER BY friends.rowid', (user_id, int(pending)))
+        return [make_user(row) for row in rows]
+
+    def _watched_ids(self, user_id: int) -> List[int]:
+        rows = self._execute('SELECT movie_id FROM watched WHERE user_id = ? ORDER BY id', (user_id,))
+        return [movie_id for movie_id, in rows]
+
+    def _user_id(self, user_name: str) -> int:
+        row = self._fetch_one('SELECT id FROM users WHERE user_name = ?', (user_name.strip().lower(),))
+        if row is None:
+            raise RepositoryException(f'Unknown user {user_name}')
+        return row[0]
+
+    def add_movie(self, movie: Movie):
+        with self._pool.connection() as connection:
+            id = connection.execute('SELECT COALESCE(MAX(id), 0) + 1 FROM movies').fetchone()[0]
+            insert_movies(connection, [(id, movie)])
+
+    def add_movies_bulk(self, movies: Iterable[Movie]):
+        # Movies are ranked in the given order and tagged by their genres, all in one transaction.
+        with self._pool.connection() as connection:
+            first_id = connection.execute('SELECT COALESCE(MAX(id), 0) + 1 FROM movies').fetchone()[0]
+            insert_movies(connection, enumerate(movies, start=first_id))
+
+    def get_movie(self, id: int) -> Movie:
+        return self._movies([id]).get(id)
+
+    def get_movies_by_id(self, id_list):
+        movies = self._movies(id_list)
+        return [movies[id] for id in id_list if id in movies]
+
+    def _movies(self, id_list) -> dict:
+        # Returns the movies with ids in id_list, keyed by id, with their actors, genres, tags and reviews.
+        ids = sorted(set(id for id in id_list if type(id) is int))
+        movies = dict()
+        for start in range(0, len(ids), MAX_PARAMETERS):
+            batch = ids[start:start + MAX_PARAMETERS]
+            placeholders = ', '.join('?' * len(batch))
+
+            rows = self._execute(f'SELECT {MOVIE_COLUMNS} FROM movies WHERE id IN ({placeholders})', batch)
+            for row in rows:
+                movies[row[0]] = make_movie(row)
+
+            rows = self._execute(f'SELECT movie_id, actor_name FROM movie_actors WHERE movie_id IN ({placeholders}) '
+                                 'ORDER BY movie_id, position', batch)
+            for movie_id, actor_name in rows:
+                movies[movie_id].add_actor(Actor(actor_name))
+
+            rows = self._execute(f'SELECT movie_id, tag_name FROM movie_tags WHERE movie_id IN ({placeholders}) '
+                                 'ORDER BY movie_id, position', batch)
+            for movie_id, tag_name in rows:
+                movies[movie_id].add_genre(Genre(tag_name))
+                movies[movie_id].add_tag(Tag(tag_name))
+
+            self._reviews(f'movie_id IN ({placeholders})', batch, movies=movies)
+        return movies
+
+    def _reviews(self, condition: str, parameters, movies: dict = None, user: User = None) -> List[Review]:
+        # Returns the reviews matching condition, by users fetched unless user is given. Reviews are added to the
+        # given movies; otherwise their movies are fetched, already carrying their reviews.
+        rows = self._execute(
+            'SELECT reviews.movie_id, reviews.review_text, reviews.rating, reviews.timestamp, '
+            'users.id, users.user_name, users.password FROM reviews JOIN users ON users.id = reviews.user_id '
+            f'WHERE reviews.{condition} ORDER BY reviews.id', parameters)
+        attach = movies is not None
+        if not attach:
+            movies = self._movies(row[0] for row in rows)
+
+        reviews = []
+        users = dict() if user is None else {user.id: user}
+        for movie_id, review_text, rating, timestamp, *user_row in rows:
+            movie = movies.get(movie_id)
+            review_user = users.get(user_row[0])
+            if review_user is None:
+                review_user = users[user_row[0]] = make_user(user_row)
+            review = Review(movie, review_text, rating)
+            review.user = review_user
+            review.timestamp = datetime.fromisoformat(timestamp)
+            if attach and movie is not None:
+                movie.add_review(review)
+            reviews.append(review)
+        return reviews
+
+    def get_movies_by_year(self, year: int):
+        return self.get_movies_by_id(self.get_movie_ids_for_year_range(year, year))
+
+    def get_movie_ids_for_year_range(self, start: int, end: int):
+        rows = self._execute('SELECT id FROM movies WHERE release_year BETWEEN ? AND ? ORDER BY id', (start, end))
+        return [id for id, in rows]
+
+    def get_movie_ids_for_runtime(self, minimum: int, maximum: int):
+        rows = self._execute('SELECT id FROM movies WHERE runtime_minutes BETWEEN ? AND ? ORDER BY id',
+                             (minimum, maximum))
+        return [id for id, in rows]
+
+    def get_movie_ids_for_metric_range(self, metric: str, minimum, maximum):
+        if metric not in MOVIE_METRICS:
+            raise KeyError(metric)
+        conditions, parameters = [f'{metric} IS NOT NULL'], []
+        if minimum is not None:
+            conditions.append(f'{metric} >= ?')
+            parameters.append(minimum)
+        if maximum is not None:
+            conditions.append(f'{metric} <= ?')
+            parameters.append(maximum)
+        rows = self._execute(f'SELECT id FROM movies WHERE {" AND ".join(conditions)} ORDER BY id', parameters)
+        return [id for id, in rows]
+
+    def get_movie_ids_by_metric(self, metric: str, descending: bool = False):
+        if metric not in MOVIE_METRICS:
+            raise KeyError(metric)
+        rows = self._execute(f'SELECT id FROM movies ORDER BY {metric} IS NULL, {metric} '
+                             f'{"DESC" if descending else "ASC"}, id')
+        return tuple(id for id, in rows)
+
+    def search_movie_ids(self, query: str, limit: int = None):
+        # Each process keeps a text index built from the movies table, rebuilt once movies are added. Movies are
+        # never changed or deleted, so their count and highest id tell whether the index is current.
+        key = self._fetch_one('SELECT COUNT(*), MAX(id) FROM movies')
+        with self._text_index_lock:
+            if self._text_index_key != key:
+                text_index = TextIndex()
+                for id, title, description in self._execute('SELECT id, title, description FROM movies'):
+                    text_index.add(id, title, description)
+                self._text_index, self._text_index_key = text_index, key
+            text_index = self._text_index
+        return text_index.search(query, limit)
+
+    def get_number_of_movies(self):
+        return self._fetch_one('SELECT COUNT(*) FROM movies')[0]
+
+    def get_movie_ids(self):
+        return [id for id, in self._execute('SELECT id FROM movies ORDER BY id')]
+
+    def get_first_movie(self):
+        row = self._fetch_one('SELECT MIN(id) FROM movies')
+        return None if row[0] is None else self.get_movie(row[0])
+
+    def get_last_movie(self):
+        row = self._fetch_one('SELECT MAX(id) FROM movies')
+        return None if row[0] is None else self.get_movie(row[0])
+
+    def get_movie_ids_for_tag(self, tag_name: str):
+        summary = self.get_tag_summary(tag_name)
+        if summary is None:
+            # No Tag with name tag_name, so return an empty list.
+            return list()
+        return list(summary[0])
+
+    def get_tag_summary(self, tag_name: str):
+        if self._fetch_one('SELECT 1 FROM tags WHERE name = ?', (tag_name,)) is None:
+            return None
+        rows = self._execute('SELECT DISTINCT movie_id FROM movie_tags WHERE tag_name = ? ORDER BY movie_id',
+                             (tag_name,))
+        movie_ids = tuple(id for id, in rows)
+        return movie_ids, len(movie_ids)
+
+    def get_movie_ids_for_actor(self, name: str):
+        rows = self._execute('SELECT DISTINCT movie_id FROM movie_actors WHERE actor_name = ? ORDER BY movie_id',
+                             (name,))
+        return [id for id, in rows]
+
+    def get_movie_ids_for_director(self, name: str):
+        rows = self._execute('SELECT id FROM movies WHERE director = ? ORDER BY id', (name,))
+        return [id for id, in rows]
+
+    def add_tag(self, tag: Tag):
+        # Look the movies up before borrowing a connection for the writes.
+        movie_ids = [self.movie_index(movie) for movie in tag.tagged_movies]
+        with self._pool.connection() as connection:
+            connection.execute('INSERT OR IGNORE INTO tags (name) VALUES (?)', (tag.tag_name,))
+            for movie_id in movie_ids:
+                if movie_id is ValueError:
+                    continue
+                connection.execute(
+                    'INSERT INTO movie_tags (movie_id, position, tag_name) '
+                    'SELECT ?, COALESCE(MAX(position), -1) + 1, ? FROM movie_tags WHERE movie_id = ?',
+                    (movie_id, tag.tag_name, movie_id))
+
+    def get_tags(self) -> List[Tag]:
+        # Tags are returned without their movies; get_tag_summary gives the ids of those.
+        return [Tag(name) for name, in self._execute('SELECT name FROM tags ORDER BY id')]
+
+    def get_data_version(self):
+        changes, modified = self._fetch_one('SELECT changes, modified FROM data_version')
+        # The time tells versions of a database that was recreated apart.
+        return f'{changes}.{modified}', datetime.fromisoformat(modified)
+
+    def get_tags_version(self):
+        # Tags are never deleted, so their number changes whenever one is added, by any process.
+        return self._fetch_one('SELECT COUNT(*) FROM tags')[0]
+
+    def add_review(self, review: Review):
+        super().add_review(review)
+        movie_id = self.movie_index(review.movie)
+        if movie_id is ValueError:
+            raise RepositoryException('Review is for a Movie that is not in the repository')
+
+        user_id = self._user_id(review.user.user_name)
+        with self._pool.connection() as connection:
+            connection.execute(
+                'INSERT INTO reviews (user_id, movie_id, review_text, rating, timestamp) VALUES (?, ?, ?, ?, ?)',
+                (user_id, movie_id, review.review_text, review.rating, review.timestamp.isoformat()))
+        self._forget_users()
+
+    def add_reviews(self, reviews: List[Review]):
+        super().add_reviews(reviews)
+        # Look up each distinct user and movie once for the whole batch.
+        user_ids = {name: self._user_id(name) for name in set(review.user.user_name for review in reviews)}
+        movie_ids = dict()
+        for review in reviews:
+            if review.movie not in movie_ids:
+                movie_ids[review.movie] = self.movie_index(review.movie)
+                if movie_ids[review.movie] is ValueError:
+                    raise RepositoryException('Review is for a Movie that is not in the repository')
+
+        with self._pool.connection() as connection:
+            connection.executemany(
+                'INSERT INTO reviews (user_id, movie_id, review_text, rating, timestamp) VALUES (?, ?, ?, ?, ?)',
+                ((user_ids[review.user.user_name], movie_ids[review.movie], review.review_text, review.rating,
+                  review.timestamp.isoformat()) for review in reviews))
+        for review in reviews:
+            review.movie.add_review(review)
+            review.user.add_review(review)
+        self._forget_users()
+
+    def get_reviews(self):
+        return self._reviews('id IS NOT NULL', ())
+
+    def get_top_rated_movie_ids(self, quantity: int):
+        rows = self._execute('SELECT movie_id FROM reviews WHERE rating IS NOT NULL GROUP BY movie_id '
+                             'ORDER BY AVG(rating) DESC, COUNT(*) DESC, movie_id LIMIT ?', (quantity,))
+        return [id for id, in rows]
+
+    def get_reviews_for_user(self, user_name):
+        return self.get_user(user_name).reviews
+
+    def get_review_num_of_user(self, user_name):
+        if isinstance(user_name, User):
+            user_name = user_name.user_name
+        row = self._fetch_one('SELECT COUNT(*) FROM reviews JOIN users ON users.id = reviews.user_id '
+                              'WHERE users.user_name = ?', (user_name.strip().lower(),))
+        return row[0]
+
+    def get_friends_for_user(self, user_name):
+        return self._friends(self._user_id(user_name), pending=False)
+
+    def get_pending_friends_for_user(self, user_name):
+        return self._friends(self._user_id(user_name), pending=True)
+
+    def get_watched(self, user_name):
+        return self.get_movies_by_id(self.get_watched_ids(user_name))
+
+    def get_watched_ids(self, user_name):
+        return self._watched_ids(self._user_id(user_name))
+
+    def add_watched_ids(self, user_name, movie: Movie, id: int):
+        if type(movie) is not Movie:
+            return
+        user_id = self._user_id(user_name)
+        with self._pool.connection() as connection:
+            connection.execute('INSERT INTO watched (user_id, movie_id) VALUES (?, ?)', (user_id, id))
+        self._forget_users()
+
+    # Helper method to return movie index.
+    def movie_index(self, movie: Movie):
+        row = self._fetch_one('SELECT MIN(id) FROM movies WHERE title = ? AND release_year IS ?',
+                              (movie.title, movie.release_year))
+        return ValueError if row[0] is None else row[0]
+
+
+# Helper function to insert (id, movie) pairs, with their actors and genres, using an open transaction.
+def insert_movies(connection: sqlite3.Connection, ranked_movies: Iterable):
+    movie_rows, actor_rows, tag_rows = [], [], []
+    for id, movie in ranked_movies:
+        director = None if movie.director is None else movie.director.director_full_name
+        movie_rows.append((id, movie.title, movie.release_year, movie.description, director, movie.runtime_minutes)
+                          + tuple(getattr(movie, metric) for metric in MOVIE_METRICS))
+        actor_rows.extend((id, position, actor.actor_full_name) for position, actor in enumerate(movie.actors))
+        tag_rows.extend((id, position, genre.genre_name) for position, genre in enumerate(movie.genres))
+
+    connection.executemany(f'INSERT INTO movies ({MOVIE_COLUMNS}) VALUES ({", ".join("?" * len(MOVIE_FIELDS))})',
+                           movie_rows)
+    connection.executemany('INSERT INTO movie_actors (movie_id, position, actor_name) VALUES (?, ?, ?)', actor_rows)
+    connection.executemany('INSERT INTO movie_tags (movie_id, position, tag_name) VALUES (?, ?, ?)', tag_rows)
+    connection.executemany('INSERT OR IGNORE INTO tags (name) VALUES (?)', ((row[2],) for row in tag_rows))
+
+
+# Helper function to build a Movie, without actors, genres or reviews, from a row of the movies table.
+def make_movie(row) -> Movie:
+    id, title, release_year, description, director, runtime_minutes, *metrics = row
+    movie = Movie(title, release_year or 0)
+    movie.description = description
+    if director is not None:
+        movie.director = Director(director)
+    if runtime_minutes > 0:
+        movie.runtime_minutes = runtime_minutes
+    for metric, value in zip(MOVIE_METRICS, metrics):
+        setattr(movie, metric, value)
+    return movie
+
+
+# Helper function to build a User, without friends, reviews or watch history, from an (id, name, password) row.
+def make_user(row) -> User:
+    user = User(row[1], row[2])
+    user.id = row[0]
+    return user
+
+
+def populate(data_path: str, repo: DatabaseRepository):
+    # Loads the CSV files into an empty database. Processes starting together take turns, and only the first one
+    # to get the write lock loads anything. The borrowed connection commits, or rolls back on an error.
+    with repo._pool.connection() as connection:
+        connection.execute('BEGIN IMMEDIATE')
+        if connection.execute('SELECT COUNT(*) FROM movies').fetchone()[0] == 0:
+            load_movies(data_path, connection)
+            load_users(data_path, connection)
+            load_reviews(data_path, connection)
+
+
+def load_movies(data_path: str, connection: sqlite3.Connection):
+    # Movies are stored under their ranks, and malformed rows are skipped, as they are by the MemoryRepository.
+    file = MovieFileCSVReader(os.path.join(data_path, 'movies.csv'))
+    insert_movies(connection, file.iter_ranked_movies(skip_bad_rows=True))
+
+
+def load_users(data_path: str, connection: sqlite3.Connection):
+    filename = os.path.join(data_path, 'users.csv')
+    passwords_hashed = read_csv_headers(filename)[2] == 'password_hash'
+
+    friend_rows = []
+    for data_row in read_csv_file(filename):
+        user_id = int(data_row[0])
+        password = data_row[2] if passwords_hashed else generate_password_hash(data_row[2])
+        connection.execute('INSERT INTO users (id, user_name, password) VALUES (?, ?, ?)',
+                           (user_id, data_row[1].strip().lower(), password))
+
+        for pending, column in ((0, 3), (1, 4)):
+            friend_rows.extend((user_id, int(id), pending) for id in data_row[column].split(',') if id.strip())
+        connection.executemany('INSERT INTO watched (user_id, movie_id) VALUES (?, ?)',
+                               ((user_id, int(id)) for id in data_row[5].split(',') if id.strip()))
+
+    connection.executemany('INSERT INTO friends (user_id, friend_id, pending) VALUES (?, ?, ?)', friend_rows)
+
+
+def load_reviews(data_path: str, connection: sqlite3.Connection):
+    rows = ((int(data_row[1]), int(data_row[2]), data_row[3], int(data_row[4]),
+             datetime.fromisoformat(data_row[5]).isoformat())
+            for data_row in read_csv_file(os.path.join(data_path, 'reviews.csv')))
+    connection.executemany('INSERT INTO reviews (user_id, movie_id, review_text, rating, timestamp) '
+                           'VALUES (?, ?, ?, ?, ?)', rows)
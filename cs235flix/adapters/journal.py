@@ -0,0 +1,214 @@
+import os
+import json
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:
+    # Without fcntl (on Windows), the journal is only safe to share between the threads of one process.
+    fcntl = None
+
+from cs235flix.adapters.memory_repository import MemoryRepository, populate, save_users, save_reviews
+from cs235flix.domain.model import User, make_review
+
+
+logger = logging.getLogger(__name__)
+
+
+@contextmanager
+def locked(file, exclusive: bool):
+    # Holds a lock on file, shared with other processes' locks on it unless exclusive.
+    if fcntl is None:
+        yield
+        return
+    fcntl.flock(file.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+    try:
+        yield
+    finally:
+        fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+
+
+class Journal:
+    # Append-only log of the writes made to a MemoryRepository, one compact JSON array per line:
+    #   ["U", user_name, password_hash]
+    #   ["R", user_name, movie_id, rating, timestamp, review_text]
+    #   ["W", user_name, movie_id, position]
+    # Records are written as they happen but only fsynced in batches: once sync_batch of them are waiting, or
+    # within sync_interval seconds of being written, so a crash loses at most that window of writes.
+    # Worker processes share one journal file. Each write appends whole records under a shared file lock, and
+    # compaction takes the lock exclusively, so it sees every record written before it and none are written during it.
+
+    def __init__(self, path: str, sync_interval: float = 1.0, sync_batch: int = 64):
+        self._path = path
+        self._sync_batch = sync_batch
+        self._sync_interval = sync_interval
+        self._lock = threading.Lock()
+        self._file = open(path, 'ab', buffering=0)
+        self._unsynced = 0
+        self._closed = threading.Event()
+        self._syncer = threading.Thread(target=self._sync_periodically, daemon=True)
+        self._syncer.start()
+
+    def record(self, *fields):
+        line = json.dumps(fields, ensure_ascii=False, separators=(',', ':')) + '\n'
+        with self._lock:
+            with locked(self._file, exclusive=False):
+                self._file.write(line.encode('utf-8'))
+            self._unsynced += 1
+            if self._unsynced >= self._sync_batch:
+                self._sync()
+
+    def record_many(self, records):
+        # Writes several records at once, as record does one.
+        data = b''.join(json.dumps(fields, ensure_ascii=False, separators=(',', ':')).encode('utf-8') + b'\n'
+                        for fields in records)
+        with self._lock:
+            with locked(self._file, exclusive=False):
+                self._file.write(data)
+            self._unsynced += data.count(b'\n')
+            if self._unsynced >= self._sync_batch:
+                self._sync()
+
+    def sync(self):
+        with self._lock:
+            self._sync()
+
+    def _sync(self):
+        if self._unsynced > 0:
+            os.fsync(self._file.fileno())
+            self._unsynced = 0
+
+    def _sync_periodically(self):
+        while not self._closed.wait(self._sync_interval):
+            self.sync()
+
+    def close(self):
+        self._closed.set()
+        with self._lock:
+            self._sync()
+            self._file.close()
+
+    def is_empty(self) -> bool:
+        # True if no process has records in the journal.
+        with self._lock:
+            return os.fstat(self._file.fileno()).st_size == 0
+
+    def compact(self, fold):
+        # Calls fold(records) with every record in the journal, whichever process wrote it, to write them out, then
+        # empties the journal. The file is truncated in place rather than replaced, so that other processes go on
+        # appending to it, and stays locked throughout, so that no records are written while fold() runs and no
+        # other process compacts at the same time. An incomplete final record, left by a crash, is dropped.
+        with self._lock:
+            with locked(self._file, exclusive=True):
+                with open(self._path, 'rb') as infile:
+                    data = infile.read()
+                records = [json.loads(line) for line in data[:data.rfind(b'\n') + 1].splitlines()]
+                if len(records) > 0:
+                    fold(records)
+                self._file.truncate(0)
+                os.fsync(self._file.fileno())
+                self._unsynced = 0
+
+
+def replay_journal(path: str, memory_repo: MemoryRepository):
+    # Applies the records in the journal at path to memory_repo, which must not have the journal attached yet, and
+    # returns how many were read. A final record cut short by a crash is dropped from the file.
+    if not os.path.exists(path):
+        return 0
+
+    count = 0
+    good_size = 0
+    with open(path, 'rb') as infile, locked(infile, exclusive=True):
+        for line in infile:
+            if not line.endswith(b'\n'):
+                logger.warning('Dropped an incomplete record from the end of %s', path)
+                break
+            apply_record(memory_repo, json.loads(line))
+            good_size += len(line)
+            count += 1
+
+        if good_size < os.path.getsize(path):
+            os.truncate(path, good_size)
+    return count
+
+
+def apply_record(memory_repo: MemoryRepository, record):
+    # Records are applied only if the repository doesn't already reflect them, so replaying a journal over files
+    # that a compaction has already folded it into is harmless.
+    kind, user_name = record[0], record[1]
+    user = memory_repo.get_user(user_name)
+    if kind == 'U':
+        if user is None:
+            memory_repo.add_user(User(user_name, record[2]))
+        return
+
+    movie = memory_repo.get_movie(record[2])
+    if user is None or movie is None:
+        logger.warning('Skipped journal record %r for an unknown user or movie', record)
+    elif kind == 'R':
+        rating, timestamp, review_text = record[3], datetime.fromisoformat(record[4]), record[5]
+        if not any(review.movie == movie and review.timestamp == timestamp and review.review_text == review_text
+                   for review in user.reviews):
+            memory_repo.add_review(make_review(movie, review_text, rating, user, timestamp))
+    elif kind == 'W':
+        if len(user.watched_ids) <= record[3]:
+            memory_repo.add_watched_ids(user_name, movie, record[2])
+
+
+def open_journal(path: str, memory_repo: MemoryRepository, data_path: str, compact_interval: float = 0):
+    # Replays the journal at path into memory_repo and records its later writes there. Every compact_interval
+    # seconds, if it is positive, the journal is folded into the CSV files in data_path.
+    replay_journal(path, memory_repo)
+    journal = Journal(path)
+    memory_repo.attach_journal(journal)
+
+    if compact_interval > 0:
+        threading.Thread(target=compact_periodically, args=(journal, data_path, compact_interval), daemon=True).start()
+    return journal
+
+
+def compact_periodically(journal: Journal, data_path: str, interval: float):
+    while not journal._closed.wait(interval):
+        if not journal.is_empty():
+            try:
+                compact_journal(journal, data_path)
+            except Exception:
+                # The journal keeps every record until a compaction succeeds.
+                logger.exception('Compacting the journal failed')
+
+
+def compact_journal(journal: Journal, data_path: str):
+    # Folds the journal into users.csv and reviews.csv, and empties it. The files are rewritten from a repository
+    # populated from them and the whole journal, rather than from this process's repository, which lacks the writes
+    # that other processes journaled. A snapshot taken from the old files no longer matches them, so it is rebuilt at
+    # the next start.
+    # The repository is populated before the journal is locked, so that other processes' writes only wait while the
+    # records are read and the files rewritten. Should another process compact the journal in the meantime, the
+    # files will have changed, and the repository is populated again while the journal is locked.
+    versions = csv_versions(data_path)
+    memory_repo = MemoryRepository()
+    populate(data_path, memory_repo)
+
+    def fold(records):
+        repo_to_save = memory_repo
+        if csv_versions(data_path) != versions:
+            repo_to_save = MemoryRepository()
+            populate(data_path, repo_to_save)
+        for record in records:
+            apply_record(repo_to_save, record)
+        save_users(data_path, repo_to_save)
+        save_reviews(data_path, repo_to_save)
+
+    journal.compact(fold)
+
+
+def csv_versions(data_path: str):
+    # Tells the users.csv and reviews.csv files that compaction writes from any that replace them.
+    versions = list()
+    for name in ('users.csv', 'reviews.csv'):
+        stat = os.stat(os.path.join(data_path, name))
+        versions.append((stat.st_ino, stat.st_mtime_ns, stat.st_size))
+    return versions
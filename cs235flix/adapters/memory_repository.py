@@ -1,48 +1,335 @@
 import os
 import csv
+import copy
+import logging
+import threading
 from datetime import date, datetime
-from typing import List
+from typing import Iterable, List
 
-from bisect import bisect, bisect_left, insort_left
+from bisect import bisect, bisect_left, bisect_right, insort_left
+from math import inf
 
 from werkzeug.security import generate_password_hash
 
-from cs235flix.adapters.repository import AbstractRepository, RepositoryException
+from cs235flix.adapters.repository import AbstractRepository, RepositoryException, MOVIE_METRICS
+from cs235flix.adapters.text_index import TextIndex
 from cs235flix.domain.model import Actor, Director, Genre, Movie, Review, User, Tag, make_tag_association, make_review
 from cs235flix.datafilereaders.movie_file_csv_reader import MovieFileCSVReader
 
 
+logger = logging.getLogger(__name__)
+
+
 class MemoryRepository(AbstractRepository):
 
     def __init__(self):
         self._movies = list() #alphabetical
         self._movies_index = dict() #key=rank, value=movie name
+        self._movie_ids = dict() #key=movie, value=rank
+        self._last_id = 0 #highest rank
+        self._actor_index = dict() #key=actor name, value=sorted list of ranks
+        self._director_index = dict() #key=director name, value=sorted list of ranks
+        self._year_index = list() #sorted (release year, rank) pairs
+        self._runtime_index = list() #sorted (runtime minutes, rank) pairs
+        self._metric_indexes = {metric: list() for metric in MOVIE_METRICS} #sorted (value, rank) pairs per metric
+        self._metric_orders = dict() #key=(metric, descending), value=tuple of ranks, until the catalogue changes
+        self._text_index = TextIndex() #titles and descriptions, by rank
         self._tags = list()
-        self._users = list()
+        self._tags_by_name = dict() #key=tag name, value=first tag with that name
+        self._tag_summaries = dict() #key=tag name, value=(tuple of ranks, count)
+        self._tags_version = 0 #bumped whenever _tags changes
+        self._users = dict() #key=normalised user name, value=user
+        self._users_by_id = dict() #key=user id, value=user
         self._reviews = list()
+        self._rating_index = list() #sorted (-average rating, -number of ratings, rank) triples for rated movies
+        self._rating_keys = dict() #key=rank, value=the movie's triple in _rating_index
+        self._journal = None
+        self._successor = None #the copy that took over from this repository, once reload_movies has made one
+        self._lock = threading.RLock() #held while request threads change the containers reload_movies copies
+        self._data_source = os.urandom(4).hex() #tells this repository's data versions from other processes'
+        self._data_changes = 0 #bumped whenever movies, tags or reviews change
+        self._data_modified = datetime.utcnow()
+
+    def __getstate__(self):
+        # The journal is an open file of this process, and locks can't be pickled, so snapshots leave them out.
+        state = self.__dict__.copy()
+        state['_journal'] = None
+        state['_lock'] = None
+        state['_successor'] = None
+        return state
+
+    def __setstate__(self, state):
+        # Processes restoring the same snapshot go on to make different changes, so each needs its own data versions.
+        self.__dict__.update(state)
+        self._lock = threading.RLock()
+        self._data_source = os.urandom(4).hex()
+
+    def __copy__(self):
+        # Copies, such as reload_movies makes, share this repository's journal and lock along with its users and
+        # reviews; only snapshots leave them out. A copy's data versions are its own.
+        repo = type(self).__new__(type(self))
+        repo.__dict__.update(self.__dict__)
+        repo._data_source = os.urandom(4).hex()
+        return repo
+
+    # Helper method to note a change to the movies, tags or reviews for get_data_version.
+    def _touch(self):
+        self._data_changes += 1
+        self._data_modified = datetime.utcnow()
+
+    def get_data_version(self):
+        return f'{self._data_source}.{self._data_changes}', self._data_modified
+
+    def attach_journal(self, journal):
+        # Records later calls to add_user, add_review and add_watched_ids in journal.
+        self._journal = journal
 
     def add_user(self, user: User):
-        self._users.append(user)
+        with self._lock:
+            self._users[normalise_user_name(user.user_name)] = user
+            if user.id is not None:
+                self._users_by_id[user.id] = user
+        if self._journal is not None:
+            self._journal.record('U', user.user_name, user.password)
+
+    def get_users(self) -> List[User]:
+        # Users without an id, such as those who registered, are given the next free ones.
+        with self._lock:
+            users = list(self._users.values())
+            next_id = max(self._users_by_id, default=0) + 1
+            for user in users:
+                if user.id is None:
+                    user.id = next_id
+                    self._users_by_id[next_id] = user
+                    next_id += 1
+        return sorted(users, key=lambda user: user.id)
 
     def get_user(self, username) -> User:
-        user = None
-        for i in range(len(self._users)):
-            if self._users[i].user_name == username:
-                user = self._users[i]
-                break
-        return user
+        return self._users.get(normalise_user_name(username))
 
     def get_user_by_id(self, id) -> User:
-        user = None
-        for i in range(len(self._users)):
-            if self._users[i].id == id:
-                user = self._users[i]
-                break
-        return user
+        return self._users_by_id.get(id)
 
     def add_movie(self, movie: Movie):
         insort_left(self._movies, movie)  # inserts alphabetically
-        self._movies_index[len(self._movies)] = movie
+        self._last_id += 1
+        id = self._last_id
+        self._index_movie(movie, id)
+        if movie.release_year is not None:
+            insort_left(self._year_index, (movie.release_year, id))
+        insort_left(self._runtime_index, (movie.runtime_minutes, id))
+        for metric, pair in metric_pairs(movie, id):
+            insort_left(self._metric_indexes[metric], pair)
+
+    def add_movies_bulk(self, movies: Iterable[Movie]):
+        # Movies are ranked in the given order, after those already here, and tagged by their genres.
+        self.add_ranked_movies_bulk(enumerate(movies, start=self._last_id + 1))
+
+    def add_ranked_movies_bulk(self, ranked_movies: Iterable):
+        # Adds (rank, movie) pairs, such as those of MovieFileCSVReader.iter_ranked_movies, each movie under its rank,
+        # and tags them by their genres. Ranks need not be consecutive. ranked_movies is consumed in a single pass.
+        tagged_by_name = dict()  # key=tag name, value=set of movies already carrying the tag
+        for id, movie in ranked_movies:
+            self._movies.append(movie)
+            self._index_movie(movie, id)
+            if movie.release_year is not None:
+                self._year_index.append((movie.release_year, id))
+            self._runtime_index.append((movie.runtime_minutes, id))
+            for metric, pair in metric_pairs(movie, id):
+                self._metric_indexes[metric].append(pair)
+
+            for genre in movie.genres:
+                tag = self._tags_by_name.get(genre.genre_name)
+                if tag is None:
+                    tag = Tag(genre.genre_name)
+                    self.add_tag(tag)
+                tagged = tagged_by_name.get(tag.tag_name)
+                if tagged is None:
+                    tagged = tagged_by_name[tag.tag_name] = set(tag.tagged_movies)
+                # Set membership stands in for Tag.is_applied_to, which scans the tag's movies.
+                if movie not in tagged:
+                    tagged.add(movie)
+                    movie.add_tag(tag)
+                    tag.add_movie(movie)
+            self._last_id = max(self._last_id, id)
+
+        # Sort once rather than inserting each movie alphabetically.
+        self._movies.sort()
+        self._year_index.sort()
+        self._runtime_index.sort()
+        for index in self._metric_indexes.values():
+            index.sort()
+
+    # Helper method to add a movie to the id lookups and person indexes.
+    def _index_movie(self, movie: Movie, id: int):
+        self._movies_index[id] = movie
+        self._metric_orders.clear()
+        self._text_index.add(id, movie.title, movie.description)
+        self._touch()
+        # Keep the first id assigned to a movie, matching a scan over _movies_index.
+        self._movie_ids.setdefault(movie, id)
+
+        for name in set(actor.actor_full_name for actor in movie.actors):
+            ids = self._actor_index.setdefault(name, [])
+            insort_left(ids, id)
+
+        if movie.director is not None:
+            ids = self._director_index.setdefault(movie.director.director_full_name, [])
+            insort_left(ids, id)
+
+    def reload_movies(self, ranked_movies: Iterable, install=None):
+        """ Returns a copy of the repository whose movies are ranked_movies, (rank, movie) pairs, and the ranks of
+        the movies that were added, changed and removed to get there. The copy takes over from this repository,
+        which should only be read from afterwards.
+
+        Movies are matched by rank, as they are identified at startup. Only added, changed and removed movies are
+        indexed and tagged again. Unchanged movies are shared with this repository, as are users and reviews.
+        Otherwise this repository's catalogue is not modified, so readers of it see the old catalogue until the copy
+        is put in its place.
+
+        Writes are held back from the moment the copy is made until it has taken over, and install, if given, is
+        called with the copy in between to put it in place. Only then are the reviews of changed movies moved onto
+        the new movies, and those of removed movies dropped. Writes still made through this repository, by requests
+        that began before the copy took over, are passed on to the copy.
+        """
+        new_movies = dict(ranked_movies)
+        added = sorted(id for id in new_movies if id not in self._movies_index)
+        changed = list()
+        removed = list()
+        for id, movie in self._movies_index.items():
+            new_movie = new_movies.get(id)
+            if new_movie is None:
+                removed.append(id)
+            elif movie_fields(new_movie) != movie_fields(movie):
+                changed.append(id)
+            else:
+                new_movies[id] = movie
+
+        with self._lock:
+            repo = copy.copy(self)
+            # Copy the catalogue containers; users and reviews stay shared. Changed movies are given a copy of the
+            # reviews of the movies they replace, from which they count their ratings.
+            repo._movies = list(self._movies)
+            repo._movies_index = dict(self._movies_index)
+            repo._movie_ids = dict(self._movie_ids)
+            repo._actor_index = dict(self._actor_index)
+            repo._director_index = dict(self._director_index)
+            repo._year_index = list(self._year_index)
+            repo._runtime_index = list(self._runtime_index)
+            repo._metric_indexes = {metric: list(index) for metric, index in self._metric_indexes.items()}
+            repo._metric_orders = dict()
+            repo._text_index = self._text_index.copy()
+            repo._tags = list(self._tags)
+            repo._tags_by_name = dict(self._tags_by_name)
+            repo._tag_summaries = dict(self._tag_summaries)
+            repo._rating_index = list(self._rating_index)
+            repo._rating_keys = dict(self._rating_keys)
+            for id in changed:
+                new_movies[id].reviews = list(self._movies_index[id].reviews)
+
+            old_ids = sorted(removed + changed)
+            new_ids = sorted(added + changed)
+            for id in old_ids:
+                repo._unindex_movie(id)
+            for id in new_ids:
+                repo._reindex_movie(new_movies[id], id)
+            repo._retag_movies([self._movies_index[id] for id in old_ids], [new_movies[id] for id in new_ids])
+            repo._last_id = max(repo._movies_index, default=0)
+            repo._touch()
+
+            if install is not None:
+                install(repo)
+            self._hand_over(repo, [new_movies[id] for id in changed], [self._movies_index[id] for id in removed])
+        return repo, (added, sorted(changed), sorted(removed))
+
+    # Helper method to let repo, a copy made by reload_movies, take over from this repository: moving the reviews of
+    # changed movies onto new_movies, and dropping those of removed_movies, from the copy and from their users.
+    def _hand_over(self, repo, new_movies: List[Movie], removed_movies: List[Movie]):
+        for movie in new_movies:
+            for review in movie.reviews:
+                review.movie = movie
+
+        dropped = set(id(review) for movie in removed_movies for review in movie.reviews)
+        if dropped:
+            repo._reviews = [review for review in self._reviews if id(review) not in dropped]
+            for user in set(review.user for movie in removed_movies for review in movie.reviews):
+                user.reviews = [review for review in user.reviews if id(review) not in dropped]
+            logger.warning('Dropped %d reviews of removed movies', len(dropped))
+        self._successor = repo
+
+    # Helper method to take a movie out of the catalogue of a repository copy. Index lists are replaced, never
+    # changed in place, as they are shared with the repository that was copied.
+    def _unindex_movie(self, id: int):
+        movie = self._movies_index.pop(id)
+        self._remove_rating(id)
+        self._text_index.remove(id)
+        if self._movie_ids.get(movie) == id:
+            del self._movie_ids[movie]
+        position = bisect_left(self._movies, movie)
+        while self._movies[position] is not movie:
+            position += 1
+        del self._movies[position]
+
+        for name in set(actor.actor_full_name for actor in movie.actors):
+            replace_index_entry(self._actor_index, name, id, remove=True)
+        if movie.director is not None:
+            replace_index_entry(self._director_index, movie.director.director_full_name, id, remove=True)
+
+        if movie.release_year is not None:
+            del self._year_index[bisect_left(self._year_index, (movie.release_year, id))]
+        del self._runtime_index[bisect_left(self._runtime_index, (movie.runtime_minutes, id))]
+        for metric, pair in metric_pairs(movie, id):
+            del self._metric_indexes[metric][bisect_left(self._metric_indexes[metric], pair)]
+
+    # Helper method to put a movie into the catalogue of a repository copy, without changing shared index lists.
+    def _reindex_movie(self, movie: Movie, id: int):
+        insort_left(self._movies, movie)
+        self._movies_index[id] = movie
+        self._text_index.add(id, movie.title, movie.description)
+        first_id = self._movie_ids.get(movie)
+        if first_id is None or id < first_id:
+            self._movie_ids[movie] = id
+
+        for name in set(actor.actor_full_name for actor in movie.actors):
+            replace_index_entry(self._actor_index, name, id)
+        if movie.director is not None:
+            replace_index_entry(self._director_index, movie.director.director_full_name, id)
+
+        if movie.release_year is not None:
+            insort_left(self._year_index, (movie.release_year, id))
+        insort_left(self._runtime_index, (movie.runtime_minutes, id))
+        for metric, pair in metric_pairs(movie, id):
+            insort_left(self._metric_indexes[metric], pair)
+        self._update_rating(movie)
+
+    # Helper method to replace the tags of a repository copy that lost old_movies or gained new_movies. Tags with
+    # no movies left are dropped.
+    def _retag_movies(self, old_movies: List[Movie], new_movies: List[Movie]):
+        tag_names = set(tag.tag_name for movie in old_movies for tag in movie.tags)
+        tag_names.update(genre.genre_name for movie in new_movies for genre in movie.genres)
+        # Movies are matched by identity, as distinct movies may be equal.
+        old_movie_ids = set(map(id, old_movies))
+        new_movie_ids = set(map(id, new_movies))
+
+        for tag_name in tag_names:
+            old_tag = self._tags_by_name.get(tag_name)
+            tagged = list() if old_tag is None else [movie for movie in old_tag.tagged_movies
+                                                     if id(movie) not in old_movie_ids]
+            tagged.extend(movie for movie in new_movies if Genre(tag_name) in movie.genres)
+
+            tag = Tag(tag_name)
+            for movie in sorted(tagged, key=self.movie_index):
+                if id(movie) in new_movie_ids:
+                    movie.add_tag(tag)
+                tag.add_movie(movie)
+
+            if old_tag is not None:
+                self._tags.remove(old_tag)
+                self._tags_version += 1
+                del self._tags_by_name[tag_name]
+                self._tag_summaries.pop(tag_name, None)
+            if tag.number_of_tagged_movies > 0:
+                self.add_tag(tag)
 
     def get_movie(self, id: int) -> Movie:
         movie = None
@@ -55,29 +342,51 @@ class MemoryRepository(AbstractRepository):
         return movie
 
     def get_movies_by_year(self, year: int):
-        matching_movies = list()
+        return self.get_movies_by_id(self.get_movie_ids_for_year_range(year, year))
+
+    def get_movie_ids_for_year_range(self, start: int, end: int):
+        return range_query(self._year_index, start, end)
+
+    def get_movie_ids_for_runtime(self, minimum: int, maximum: int):
+        return range_query(self._runtime_index, minimum, maximum)
+
+    def get_movie_ids_for_metric_range(self, metric: str, minimum, maximum):
+        return range_query(self._metric_indexes[metric], minimum, maximum)
 
-        for movie in self._movies:
-            if movie.release_year == year:
-                matching_movies.append(movie)
+    def get_movie_ids_by_metric(self, metric: str, descending: bool = False):
+        # Orders are built from the sorted metric indexes when first asked for, then reused until movies change.
+        order = self._metric_orders.get((metric, descending))
+        if order is None:
+            index = self._metric_indexes[metric]
+            if descending:
+                index = sorted(index, key=lambda pair: (-pair[0], pair[1]))
+            ranked = set(id for _, id in index)
+            order = tuple([id for _, id in index] + [id for id in sorted(self._movies_index) if id not in ranked])
+            self._metric_orders[(metric, descending)] = order
+        return order
 
-        return matching_movies
+    def search_movie_ids(self, query: str, limit: int = None):
+        return self._text_index.search(query, limit)
 
     def get_number_of_movies(self):
         return len(self._movies)
 
+    def get_movie_ids(self):
+        return sorted(self._movies_index)
+
     def get_first_movie(self):
         movie = None
 
         if len(self._movies) > 0:
-            movie = self._movies_index[1]
+            # Ids follow the ranks in movies.csv, so the first may not be 1 if rows were skipped or removed.
+            movie = self._movies_index[min(self._movies_index)]
         return movie
 
     def get_last_movie(self):
         movie = None
 
         if len(self._movies) > 0:
-            movie = self._movies_index[self.get_number_of_movies()]
+            movie = self._movies_index[self._last_id]
         return movie
 
     def get_movies_by_id(self, id_list):
@@ -88,67 +397,127 @@ class MemoryRepository(AbstractRepository):
         return movies
 
     def get_movie_ids_for_tag(self, tag_name: str):
-        # Linear search, to find the first occurrence of a Tag with the name tag_name.
-        try:
-            tag = [tag for tag in self._tags if tag.tag_name == tag_name][0]
-        except IndexError:
-            return []
-
-        # Retrieve the ids of movies associated with the Tag.
-        if tag is not None:
-            # movies = [movie for movie in tag.tagged_movies]
-            # movie_ids = []
-            # for mov in movies:
-            #     movie_ids.append(self._movies.index(mov))
-            movie_ids = [self.movie_index(movie) for movie in tag.tagged_movies]
-
-        else:
+        summary = self.get_tag_summary(tag_name)
+        if summary is None:
             # No Tag with name tag_name, so return an empty list.
-            movie_ids = list()
-
-        return movie_ids
+            return list()
+        return list(summary[0])
+
+    def get_tag_summary(self, tag_name: str):
+        tag = self._tags_by_name.get(tag_name)
+        if tag is None:
+            return None
+
+        # Tags only ever gain movies, so a summary is stale once the tag's movie count moves on.
+        summary = self._tag_summaries.get(tag_name)
+        if summary is None or summary[1] != tag.number_of_tagged_movies:
+            movie_ids = tuple(self.movie_index(movie) for movie in tag.tagged_movies)
+            summary = (movie_ids, len(movie_ids))
+            with self._lock:
+                self._tag_summaries[tag_name] = summary
+        return summary
 
     def get_movie_ids_for_actor(self, name: str):
-        movies = []
-        for movie in self._movies:
-            for actor in movie.actors:
-                if actor.actor_full_name == name:
-                    movies.append(movie)
-                    break
-
-        if movies is not []:
-            movie_ids = [self.movie_index(movie) for movie in movies]
-        else:
-            movie_ids = list()
-
-        return movie_ids
+        return list(self._actor_index.get(name, []))
 
     def get_movie_ids_for_director(self, name: str):
-        movies = []
-        for movie in self._movies:
-            if movie.director.director_full_name == name:
-                movies.append(movie)
-
-        if movies is not []:
-            movie_ids = [self.movie_index(movie) for movie in movies]
-        else:
-            movie_ids = list()
-
-        return movie_ids
+        return list(self._director_index.get(name, []))
 
     def add_tag(self, tag: Tag):
         self._tags.append(tag)
+        self._tags_by_name.setdefault(tag.tag_name, tag)
+        self._tag_summaries.pop(tag.tag_name, None)
+        self._tags_version += 1
+        self._touch()
 
     def get_tags(self) -> List[Tag]:
         return self._tags
 
+    def get_tags_version(self):
+        return self._tags_version
+
     def add_review(self, review: Review):
         super().add_review(review)
-        self._reviews.append(review)
+        with self._lock:
+            if self._successor is not None:
+                self._pass_on_review(review)
+                return
+            self._reviews.append(review)
+            self._update_rating(review.movie)
+        self._touch()
+        if self._journal is not None:
+            self._journal.record('R', review.user.user_name, self.movie_index(review.movie), review.rating,
+                                 review.timestamp.isoformat(), review.review_text)
+
+    def add_reviews(self, reviews: List[Review]):
+        super().add_reviews(reviews)
+        with self._lock:
+            if self._successor is not None:
+                # Reviews in a batch are not attached to their movies yet, so they only need pointing at the
+                # successor's. As with a batch for an unknown movie, nothing is added if one has been removed.
+                movies = [self._successor_movie(review.movie) for review in reviews]
+                if None in movies:
+                    raise RepositoryException('Review not attached to an Movie')
+                for review, movie in zip(reviews, movies):
+                    review.movie = movie
+                self._successor.add_reviews(reviews)
+                return
+            for review in reviews:
+                review.movie.add_review(review)
+                review.user.add_review(review)
+            self._reviews.extend(reviews)
+            # Move each reviewed movie within the rating index once, however many of the reviews are for it.
+            for movie in dict((id(review.movie), review.movie) for review in reviews).values():
+                self._update_rating(movie)
+        self._touch()
+        if self._journal is not None:
+            self._journal.record_many(('R', review.user.user_name, self.movie_index(review.movie), review.rating,
+                                       review.timestamp.isoformat(), review.review_text) for review in reviews)
 
     def get_reviews(self):
         return self._reviews
 
+    # Helper method to give the successor's movie with the id that movie, one of this repository's or of the
+    # successor's, has. Returns None if the movie has been removed.
+    def _successor_movie(self, movie: Movie):
+        id = self.movie_index(movie)
+        if id is ValueError:
+            id = self._successor.movie_index(movie)
+        return self._successor.get_movie(id)
+
+    # Helper method to add a review, made for a movie of this repository after the successor took over, to the
+    # successor instead. A review of a removed movie is dropped.
+    def _pass_on_review(self, review: Review):
+        movie = self._successor_movie(review.movie)
+        if movie is None:
+            review.user.reviews = [user_review for user_review in review.user.reviews if user_review is not review]
+            logger.warning('Dropped a review by %s of a removed movie', review.user.user_name)
+            return
+        if movie is not review.movie:
+            review.movie = movie
+            if not any(movie_review is review for movie_review in movie.reviews):
+                movie.add_review(review)
+        self._successor.add_review(review)
+
+    def get_top_rated_movie_ids(self, quantity: int):
+        return [id for _, _, id in self._rating_index[:quantity]]
+
+    # Helper method to move a movie to its place in the rating index, after its ratings have changed.
+    def _update_rating(self, movie: Movie):
+        id = self.movie_index(movie)
+        if id is ValueError:
+            return
+        self._remove_rating(id)
+        if movie.number_of_ratings > 0:
+            key = (-movie.average_rating, -movie.number_of_ratings, id)
+            insort_left(self._rating_index, key)
+            self._rating_keys[id] = key
+
+    def _remove_rating(self, id: int):
+        key = self._rating_keys.pop(id, None)
+        if key is not None:
+            del self._rating_index[bisect_left(self._rating_index, key)]
+
     def get_reviews_for_user(self, user_name):
         user = self.get_user(user_name)
         return user.reviews
@@ -178,15 +547,65 @@ class MemoryRepository(AbstractRepository):
         return user.watched_ids
 
     def add_watched_ids(self, user_name, movie: Movie, id: int):
-        user = self.get_user(user_name)
-        user.watch_movie(movie, id)
+        with self._lock:
+            if self._successor is not None:
+                movie = self._successor.get_movie(id)
+                if movie is not None:
+                    self._successor.add_watched_ids(user_name, movie, id)
+                return
+            user = self.get_user(user_name)
+            position = len(user.watched_ids)
+            user.watch_movie(movie, id)
+            watched = len(user.watched_ids) > position
+        if self._journal is not None and watched:
+            self._journal.record('W', user.user_name, id, position)
 
     # Helper method to return movie index.
     def movie_index(self, movie: Movie):
-        for id in self._movies_index:
-            if self._movies_index[id] == movie:
-                return id
-        return ValueError
+        return self._movie_ids.get(movie, ValueError)
+
+
+# Helper function to return the ascending ranks whose keys lie in [low, high] of a sorted (key, rank) index. A bound
+# of None leaves that end of the range open.
+def range_query(index, low, high):
+    start = 0 if low is None else bisect_left(index, (low,))
+    end = len(index) if high is None else bisect_right(index, (high, inf))
+    return sorted(id for key, id in index[start:end])
+
+
+# Helper function to give the (metric, (value, rank)) pairs of the metrics a movie has values for.
+def metric_pairs(movie: Movie, id: int):
+    for metric in MOVIE_METRICS:
+        value = getattr(movie, metric)
+        if value is not None:
+            yield metric, (value, id)
+
+
+# Helper function to give a copy of index[name] with id added, or removed, in place of the original list.
+def replace_index_entry(index: dict, name: str, id: int, remove: bool = False):
+    ids = list(index.get(name, ()))
+    if remove:
+        ids.remove(id)
+    else:
+        insort_left(ids, id)
+
+    if ids:
+        index[name] = ids
+    else:
+        index.pop(name, None)
+
+
+# Helper function to give the fields of a movie that reload_movies compares.
+def movie_fields(movie: Movie):
+    return (movie.title, movie.release_year, movie.description, movie.director, movie.actors, movie.genres,
+            movie.runtime_minutes) + tuple(getattr(movie, metric) for metric in MOVIE_METRICS)
+
+
+# Helper function to match User's own normalisation of user names.
+def normalise_user_name(user_name):
+    if type(user_name) is str:
+        return user_name.strip().lower()
+    return user_name
 
 
 def read_csv_file(filename: str):
@@ -203,32 +622,61 @@ def read_csv_file(filename: str):
             yield row
 
 
-def load_movies_and_tags(data_path: str, repo: MemoryRepository):
+def load_movies_and_tags(data_path: str, repo: MemoryRepository, workers: int = None):
     file = MovieFileCSVReader(data_path + "/movies.csv")
 
-    file.read_csv_file()
-
-    # Add movies to repo, and create tag associations
-    for movie in file.dataset_of_movies:
-        repo.add_movie(movie)
-        for genre in movie.genres:
-            tags = [tag for tag in repo.get_tags() if tag.tag_name == genre.genre_name]
-            if len(tags) == 0:
-                newtag = Tag(genre.genre_name)
-                repo.add_tag(newtag)
-                make_tag_association(movie, newtag)
-            else:
-                existingtag = tags[0]
-                make_tag_association(movie, existingtag)
+    # Add movies to repo as they are read, each under its rank, and create tag associations. Malformed rows are
+    # skipped rather than stopping the application from starting, leaving a gap in the ids rather than shifting
+    # those of the movies after them. More than one worker parses the file in parallel, in that many processes.
+    repo.add_ranked_movies_bulk(file.iter_ranked_movies(skip_bad_rows=True, workers=workers))
+    for line_number, problem in file.bad_rows:
+        logger.warning('Skipped movies.csv line %d: %s', line_number, problem)
+
+
+def reload_movies_and_tags(data_path: str, repo: MemoryRepository, install=None):
+    # Returns a copy of repo brought up to date with movies.csv, along with the ranks that were added, changed and
+    # removed, calling install with the copy to put it in place of repo, as reload_movies does. As at startup, movies
+    # are identified by the rank given in the file.
+    file = MovieFileCSVReader(data_path + "/movies.csv")
+    new_repo, changes = repo.reload_movies(file.iter_ranked_movies(skip_bad_rows=True), install)
+    for line_number, problem in file.bad_rows:
+        logger.warning('Skipped movies.csv line %d: %s', line_number, problem)
+    return new_repo, changes
+
+
+def read_csv_headers(filename: str):
+    with open(filename, encoding='utf-8-sig') as infile:
+        return [item.strip() for item in next(csv.reader(infile))]
+
+
+def hash_seed_passwords(filename: str):
+    # Rewrites a users.csv file so that it stores password hashes, which load_users then uses as they are.
+    # Returns the number of passwords hashed.
+    with open(filename, encoding='utf-8-sig', newline='') as infile:
+        rows = list(csv.reader(infile))
+
+    headers = rows[0]
+    if headers[2].strip() == 'password_hash':
+        return 0
+
+    headers[2] = 'password_hash'
+    for row in rows[1:]:
+        row[2] = generate_password_hash(row[2].strip())
+
+    write_csv_file(filename, rows)
+    return len(rows) - 1
 
 
 def load_users(data_path: str, repo: MemoryRepository):
     users = dict()
 
-    for data_row in read_csv_file(os.path.join(data_path, 'users.csv')):
+    filename = os.path.join(data_path, 'users.csv')
+    passwords_hashed = read_csv_headers(filename)[2] == 'password_hash'
+
+    for data_row in read_csv_file(filename):
         user = User(
             user_name=data_row[1],
-            password=generate_password_hash(data_row[2])
+            password=data_row[2] if passwords_hashed else generate_password_hash(data_row[2])
         )
 
         friends_ids = data_row[3].split(",")
@@ -251,9 +699,15 @@ def load_users(data_path: str, repo: MemoryRepository):
         if watched_ids == ['']:
             pass
         else:
+            # Movies whose rows were skipped, or that have since been removed, are left out.
             int_ids = [int(x) for x in watched_ids]
+            movies = repo.get_movies_by_id(int_ids)
+            if len(movies) < len(int_ids):
+                missing = [id for id in int_ids if repo.get_movie(id) is None]
+                logger.warning('Skipped watched movies %s of user %s: no such movies', missing, data_row[0])
+                int_ids = [id for id in int_ids if id not in missing]
             user.watched_ids = int_ids
-            user.watched_movies = repo.get_movies_by_id(int_ids)
+            user.watched_movies = movies
 
     for key in users:
         user = users[key]
@@ -270,21 +724,61 @@ def load_users(data_path: str, repo: MemoryRepository):
 
 
 def load_reviews(data_path: str, repo: MemoryRepository, users):
+    reviews = []
     for data_row in read_csv_file(os.path.join(data_path, 'reviews.csv')):
-        review = make_review(
-            movie=repo.get_movie(int(data_row[2])),
-            review_text=data_row[3],
-            rating=int(data_row[4]),
-            user=users[data_row[1]],
-            timestamp=datetime.fromisoformat(data_row[5])
-        )
-
-        repo.add_review(review)
-
-
-def populate(data_path: str, repo: MemoryRepository):
+        movie = repo.get_movie(int(data_row[2]))
+        if movie is None:
+            # The movie's row was skipped, or the movie has since been removed. add_reviews would reject the batch.
+            logger.warning('Skipped review %s: no movie ranked %s', data_row[0], data_row[2])
+            continue
+        review = Review(movie, data_row[3], int(data_row[4]))
+        review.user = users[data_row[1]]
+        review.timestamp = datetime.fromisoformat(data_row[5])
+        reviews.append(review)
+
+    # Add the reviews in one batch, which attaches them to their movies and users.
+    repo.add_reviews(reviews)
+
+
+def save_users(data_path: str, repo: MemoryRepository):
+    # Writes the repository's users back to users.csv, with password hashes, as load_users reads them.
+    rows = [['id', 'user_name', 'password_hash', 'friends_ids', 'pending_friends_ids', 'watched_ids']]
+    for user in repo.get_users():
+        rows.append([user.id, user.user_name, user.password,
+                     ','.join(str(friend.id) for friend in user.friends),
+                     ','.join(str(friend.id) for friend in user.pending_friends),
+                     ','.join(map(str, user.watched_ids))])
+    write_csv_file(os.path.join(data_path, 'users.csv'), rows)
+
+
+def save_reviews(data_path: str, repo: MemoryRepository):
+    # Writes the repository's reviews back to reviews.csv, as load_reviews reads them.
+    rows = [['id', 'user-id', 'movie-id', 'review-text', 'rating', 'timestamp']]
+    id = 0
+    for review in repo.get_reviews():
+        movie_id = repo.movie_index(review.movie)
+        if movie_id is ValueError:
+            # The movie is no longer in the catalogue.
+            continue
+        id += 1
+        rows.append([id, review.user.id, movie_id, review.review_text, review.rating, review.timestamp.isoformat()])
+    write_csv_file(os.path.join(data_path, 'reviews.csv'), rows)
+
+
+def write_csv_file(filename: str, rows):
+    # Writes to a temporary file first so that a crash never leaves a partially written file. As in save_snapshot,
+    # the temporary file is named for this process.
+    temp_path = f'{filename}.{os.getpid()}.tmp'
+    with open(temp_path, 'w', encoding='utf-8', newline='') as outfile:
+        csv.writer(outfile, lineterminator='\n').writerows(rows)
+        outfile.flush()
+        os.fsync(outfile.fileno())
+    os.replace(temp_path, filename)
+
+
+def populate(data_path: str, repo: MemoryRepository, workers: int = None):
     # Load movies and tags into the repository.
-    load_movies_and_tags(data_path, repo)
+    load_movies_and_tags(data_path, repo, workers)
 
     # Load users into the repository.
     users = load_users(data_path, repo)
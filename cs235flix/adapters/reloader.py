@@ -0,0 +1,74 @@
+import os
+import time
+import logging
+import threading
+
+import cs235flix.adapters.repository as repo
+from cs235flix.adapters.memory_repository import reload_movies_and_tags
+
+
+logger = logging.getLogger(__name__)
+
+
+class CatalogueReloader:
+    # Picks up changes to movies.csv while the application is serving. check() is cheap enough to call before every
+    # request: at most once per interval it looks at the file's modification time, and if that has moved on, a
+    # background thread builds an updated copy of the repository. The copy replaces repo.repo_instance in a single
+    # assignment. Requests bind the repository once, as g.repo, so each sees either the old catalogue or the new
+    # one, never a mix of the two.
+
+    def __init__(self, data_path: str, interval: float):
+        self._data_path = data_path
+        self._movies_path = os.path.join(data_path, 'movies.csv')
+        self._interval = interval
+        self._mtime = os.stat(self._movies_path).st_mtime_ns
+        self._next_check = time.monotonic() + interval
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def check(self):
+        now = time.monotonic()
+        if now < self._next_check or not self._lock.acquire(blocking=False):
+            return
+
+        self._next_check = now + self._interval
+        mtime = os.stat(self._movies_path).st_mtime_ns
+        if mtime == self._mtime:
+            self._lock.release()
+            return
+
+        self._thread = threading.Thread(target=self._reload_and_release, args=(mtime,), daemon=True)
+        self._thread.start()
+
+    def join(self):
+        # Waits for a reload started by check() to finish.
+        if self._thread is not None:
+            self._thread.join()
+
+    def reload(self):
+        # Brings repo.repo_instance up to date with movies.csv, and returns the added, changed and removed ranks.
+        with self._lock:
+            return self._reload(os.stat(self._movies_path).st_mtime_ns)
+
+    def _reload_and_release(self, mtime: int):
+        try:
+            self._reload(mtime)
+        except Exception:
+            # Keep serving the old catalogue; the next change to the file triggers another attempt.
+            logger.exception('Reloading movies.csv failed')
+        finally:
+            self._lock.release()
+
+    def _reload(self, mtime: int):
+        # Only this thread replaces repo_instance, so the copy can't lose an earlier reload.
+        new_repo, changes = reload_movies_and_tags(self._data_path, repo.repo_instance, install)
+        self._mtime = mtime
+
+        added, changed, removed = changes
+        logger.info('Reloaded movies.csv: %d added, %d changed, %d removed', len(added), len(changed), len(removed))
+        return changes
+
+
+def install(new_repo):
+    # Puts a reloaded repository in place, while the one it was copied from holds back writes.
+    repo.repo_instance = new_repo
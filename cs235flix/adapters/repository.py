@@ -7,6 +7,9 @@ from cs235flix.domain.model import Actor, Director, Genre, Movie, Review, User,
 
 repo_instance = None
 
+# Numeric Movie attributes, from movies.csv, that repositories index for sorting and filtering.
+MOVIE_METRICS = ('rating', 'votes', 'revenue_millions', 'metascore')
+
 
 class RepositoryException(Exception):
 
@@ -50,11 +53,59 @@ class AbstractRepository(abc.ABC):
         """
         raise NotImplementedError
 
+    @abc.abstractmethod
+    def get_movie_ids_for_year_range(self, start: int, end: int):
+        """ Returns an ascending list of ids representing movies released between start and end, inclusive.
+
+        If there are no movies in the given range, this method returns an empty list.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_movie_ids_for_runtime(self, minimum: int, maximum: int):
+        """ Returns an ascending list of ids representing movies whose runtime, in minutes, lies between minimum and
+        maximum, inclusive.
+
+        If there are no movies in the given range, this method returns an empty list.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_movie_ids_for_metric_range(self, metric: str, minimum, maximum):
+        """ Returns an ascending list of ids representing movies whose metric, one of MOVIE_METRICS, lies between
+        minimum and maximum, inclusive. A bound of None leaves that end of the range open.
+
+        Movies without a value for the metric are left out.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_movie_ids_by_metric(self, metric: str, descending: bool = False):
+        """ Returns a tuple of the ids of all movies, ordered by metric, one of MOVIE_METRICS, lowest first unless
+        descending. Movies with equal values are in id order, and movies without a value come last.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def search_movie_ids(self, query: str, limit: int = None):
+        """ Returns a (movie_ids, count) pair for the movies whose title or description matches query, where
+        movie_ids lists the ids of the best limit matches, or all of them, best first, and count is the number of
+        matches.
+
+        Matches are ranked with BM25 over lowercase words. A quoted phrase in query must appear in every match.
+        """
+        raise NotImplementedError
+
     @abc.abstractmethod
     def get_number_of_movies(self):
         """ Returns the number of movies in the repository. """
         raise NotImplementedError
 
+    @abc.abstractmethod
+    def get_movie_ids(self):
+        """ Returns an ascending sequence of the ids of every movie in the repository. Ids need not be consecutive. """
+        raise NotImplementedError
+
     @abc.abstractmethod
     def get_first_movie(self) -> Movie:
         """ Returns the first movie, alphabetically ordered, from the repository.
@@ -87,14 +138,22 @@ class AbstractRepository(abc.ABC):
         """
         raise NotImplementedError
 
+    @abc.abstractmethod
+    def get_tag_summary(self, tag_name: str):
+        """ Returns a (movie_ids, count) pair for the Tag named tag_name, where movie_ids is an immutable tuple.
+
+        If there is no Tag named tag_name, this method returns None.
+        """
+        raise NotImplementedError
+
     @abc.abstractmethod
     def get_movie_ids_for_actor(self, name: str):
-        """ Returns a list of ids representing movies that have actor 'name' in it."""
+        """ Returns an ascending list of ids representing movies that have actor 'name' in it."""
         raise NotImplementedError
 
     @abc.abstractmethod
     def get_movie_ids_for_director(self, director_name: str):
-        """ Returns a list of ids representing movies that have director 'name'."""
+        """ Returns an ascending list of ids representing movies that have director 'name'."""
         raise NotImplementedError
 
     @abc.abstractmethod
@@ -107,6 +166,22 @@ class AbstractRepository(abc.ABC):
         """ Returns the Tags stored in the repository. """
         raise NotImplementedError
 
+    @abc.abstractmethod
+    def get_data_version(self):
+        """ Returns a (version, last_modified) pair, where version is a string that changes whenever movies, tags or
+        reviews are added or changed, and last_modified is the naive UTC datetime of the latest such change.
+
+        Versions are cheap to get, so that pages built from the repository can tell whether a cached copy is current.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_tags_version(self):
+        """ Returns a number that changes whenever Tags are added to or removed from the repository, so that
+        anything built from get_tags can tell when to rebuild.
+        """
+        raise NotImplementedError
+
     @abc.abstractmethod
     def add_review(self, review: Review):
         """ Adds a review to the repository.
@@ -119,11 +194,33 @@ class AbstractRepository(abc.ABC):
         if review.movie is None or review not in review.movie.reviews:
             raise RepositoryException('Review not correctly attached to an Movie')
 
+    @abc.abstractmethod
+    def add_reviews(self, reviews: List[Review]):
+        """ Adds reviews to the repository in one go, attaching each to its Movie and User.
+
+        If any Review lacks a Movie or a User, this method raises a RepositoryException and doesn't update the
+        repository.
+        """
+        for review in reviews:
+            if review.user is None:
+                raise RepositoryException('Review not attached to a User')
+            if review.movie is None:
+                raise RepositoryException('Review not attached to an Movie')
+
     @abc.abstractmethod
     def get_reviews(self):
         """ Returns the reviews stored in the repository. """
         raise NotImplementedError
 
+    @abc.abstractmethod
+    def get_top_rated_movie_ids(self, quantity: int):
+        """ Returns the ids of up to quantity movies with the highest average rating, best first. Ties go to the
+        movie with more ratings, then to the lower id.
+
+        Movies without ratings are left out.
+        """
+        raise NotImplementedError
+
     @abc.abstractmethod
     def movie_index(self, movie: Movie):
         """ Returns the index of movie stored in the repository. """
@@ -0,0 +1,64 @@
+import os
+import pickle
+import hashlib
+import struct
+
+from cs235flix.adapters.memory_repository import MemoryRepository, populate
+
+
+# Bump SNAPSHOT_VERSION whenever a change to the domain model or MemoryRepository makes old snapshots unusable.
+SNAPSHOT_MAGIC = b'CS235FLIX-SNAPSHOT'
+SNAPSHOT_VERSION = 11
+DATA_FILES = ('movies.csv', 'users.csv', 'reviews.csv')
+
+
+def data_fingerprint(data_path: str):
+    # Identifies the CSV files a repository was populated from, by name, modification time and content hash.
+    fingerprint = []
+    for name in DATA_FILES:
+        filename = os.path.join(data_path, name)
+        with open(filename, 'rb') as infile:
+            digest = hashlib.sha256(infile.read()).hexdigest()
+        fingerprint.append((name, os.stat(filename).st_mtime_ns, digest))
+    return tuple(fingerprint)
+
+
+def save_snapshot(snapshot_path: str, fingerprint, repo: MemoryRepository):
+    # Write to a temporary file first so that readers never see a partially written snapshot. The file is named for
+    # this process, so that workers starting together don't write into the same one.
+    temp_path = f'{snapshot_path}.{os.getpid()}.tmp'
+    with open(temp_path, 'wb') as outfile:
+        outfile.write(SNAPSHOT_MAGIC)
+        outfile.write(struct.pack('>I', SNAPSHOT_VERSION))
+        pickle.dump((fingerprint, repo), outfile, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temp_path, snapshot_path)
+
+
+def load_snapshot(snapshot_path: str, fingerprint):
+    # Returns the snapshotted repository, or None if there is no usable snapshot for the given fingerprint.
+    try:
+        with open(snapshot_path, 'rb') as infile:
+            if infile.read(len(SNAPSHOT_MAGIC)) != SNAPSHOT_MAGIC:
+                return None
+            if struct.unpack('>I', infile.read(4))[0] != SNAPSHOT_VERSION:
+                return None
+            snapshot_fingerprint, repo = pickle.load(infile)
+    except (OSError, EOFError, struct.error, pickle.UnpicklingError, AttributeError, ImportError):
+        return None
+
+    if snapshot_fingerprint != fingerprint:
+        return None
+    return repo
+
+
+def populate_from_snapshot(data_path: str, snapshot_path: str) -> MemoryRepository:
+    # Loads the repository from snapshot_path, parsing the CSV files and rewriting the snapshot only when they
+    # have changed since the snapshot was taken.
+    fingerprint = data_fingerprint(data_path)
+    repo = load_snapshot(snapshot_path, fingerprint)
+
+    if repo is None:
+        repo = MemoryRepository()
+        populate(data_path, repo)
+        save_snapshot(snapshot_path, fingerprint, repo)
+    return repo
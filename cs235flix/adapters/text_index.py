@@ -0,0 +1,159 @@
+import re
+import heapq
+from math import log
+
+
+# Words are runs of letters and digits, keeping apostrophes inside them, as in "don't".
+TOKEN_PATTERN = re.compile(r"[^\W_]+(?:'[^\W_]+)*")
+
+# Quoted parts of a query must appear in a movie as a phrase.
+PHRASE_PATTERN = re.compile(r'"([^"]*)"')
+
+# A word in a title counts as this many occurrences of it in a description.
+TITLE_WEIGHT = 3
+
+# BM25 parameters: how quickly repeated words stop adding to a score, and how much long documents are penalised.
+K1 = 1.2
+B = 0.75
+
+
+def tokenise(text: str):
+    """ Returns the lowercase words of text, in order, without stemming. """
+    return [match.group().lower() for match in TOKEN_PATTERN.finditer(text or '')]
+
+
+def parse_query(query: str):
+    # Returns the words of query, without repeats, and the phrases in it, each a list of words.
+    phrases = [tokenise(phrase) for phrase in PHRASE_PATTERN.findall(query)]
+    phrases = [phrase for phrase in phrases if len(phrase) > 1]
+    words = list(dict.fromkeys(tokenise(query.replace('"', ' '))))
+    return words, phrases
+
+
+class TextIndex:
+    # Positional inverted index over the titles and descriptions of movies, ranked with BM25. A movie's title and
+    # description are one document, the title first, with a gap so that phrases don't run from one into the other.
+    # Indexes are copied cheaply: a copy shares its posting dicts with the original and copies each one only when it
+    # first changes it.
+
+    def __init__(self):
+        self._postings = dict()  # key=word, value=dict of id to tuple of positions
+        self._owned = set()  # words whose posting dicts this index may change in place
+        self._words = dict()  # key=id, value=tuple of the distinct words in the movie
+        self._title_lengths = dict()  # key=id, value=number of words in the movie's title
+        self._lengths = dict()  # key=id, value=weighted number of words in the movie
+        self._total_length = 0
+
+    def __len__(self):
+        return len(self._lengths)
+
+    def copy(self):
+        # From now on neither index may change the posting dicts they share in place.
+        self._owned.clear()
+        index = TextIndex()
+        index._postings = dict(self._postings)
+        index._words = dict(self._words)
+        index._title_lengths = dict(self._title_lengths)
+        index._lengths = dict(self._lengths)
+        index._total_length = self._total_length
+        return index
+
+    def _postings_to_change(self, word: str):
+        postings = self._postings.get(word)
+        if word not in self._owned:
+            postings = self._postings[word] = dict() if postings is None else dict(postings)
+            self._owned.add(word)
+        return postings
+
+    def add(self, id: int, title: str, description: str):
+        """ Indexes the movie with the given id, replacing any movie indexed with it before. """
+        if id in self._lengths:
+            self.remove(id)
+
+        title_words = tokenise(title)
+        description_words = tokenise(description)
+        positions = dict()
+        for position, word in enumerate(title_words):
+            positions.setdefault(word, []).append(position)
+        for position, word in enumerate(description_words, start=len(title_words) + 1):
+            positions.setdefault(word, []).append(position)
+
+        for word, word_positions in positions.items():
+            self._postings_to_change(word)[id] = tuple(word_positions)
+        self._words[id] = tuple(positions)
+        self._title_lengths[id] = len(title_words)
+        length = TITLE_WEIGHT * len(title_words) + len(description_words)
+        self._lengths[id] = length
+        self._total_length += length
+
+    def remove(self, id: int):
+        """ Removes the movie with the given id from the index, if it is there. """
+        if id not in self._lengths:
+            return
+        for word in self._words.pop(id):
+            postings = self._postings_to_change(word)
+            del postings[id]
+            if len(postings) == 0:
+                del self._postings[word]
+                self._owned.discard(word)
+        del self._title_lengths[id]
+        self._total_length -= self._lengths.pop(id)
+
+    def _frequency(self, id: int, positions):
+        # Occurrences of a word in a movie, weighting those in its title.
+        title_length = self._title_lengths[id]
+        in_title = sum(1 for position in positions if position < title_length)
+        return TITLE_WEIGHT * in_title + len(positions) - in_title
+
+    def _has_phrase(self, id: int, phrase):
+        positions = [self._postings[word][id] for word in phrase]
+        following = [set(word_positions) for word_positions in positions[1:]]
+        return any(all(start + offset in word_positions for offset, word_positions in enumerate(following, start=1))
+                   for start in positions[0])
+
+    def search(self, query: str, limit: int = None):
+        """ Returns the ids of the movies matching query, best first, and how many movies match it. Movies match if
+        they contain any word of the query and every quoted phrase in it.
+
+        Only the best limit ids are returned if limit is given, so a page of results costs no more than scoring the
+        movies that match. Ties are broken by id.
+        """
+        words, phrases = parse_query(query)
+        postings = [self._postings[word] for word in words if word in self._postings]
+        if len(postings) == 0:
+            return [], 0
+
+        phrase_words = set(word for phrase in phrases for word in phrase)
+        if any(word not in self._postings for word in phrase_words):
+            return [], 0
+        if len(phrases) > 0:
+            # Start from the rarest phrase word, as every match must contain it.
+            rarest = min((self._postings[word] for word in phrase_words), key=len)
+            candidates = [id for id in rarest
+                          if all(id in self._postings[word] for word in phrase_words)
+                          and all(self._has_phrase(id, phrase) for phrase in phrases)]
+        else:
+            candidates = set()
+            for word_postings in postings:
+                candidates.update(word_postings)
+
+        number_of_movies = len(self._lengths)
+        average_length = self._total_length / number_of_movies
+        weights = [log(1 + (number_of_movies - len(word_postings) + 0.5) / (len(word_postings) + 0.5))
+                   for word_postings in postings]
+
+        def score(id):
+            length_factor = K1 * (1 - B + B * self._lengths[id] / average_length)
+            total = 0.0
+            for weight, word_postings in zip(weights, postings):
+                positions = word_postings.get(id)
+                if positions is not None:
+                    frequency = self._frequency(id, positions)
+                    total += weight * frequency * (K1 + 1) / (frequency + length_factor)
+            return -total, id
+
+        if limit is None:
+            ranked = sorted(candidates, key=score)
+        else:
+            ranked = heapq.nsmallest(limit, candidates, key=score)
+        return ranked, len(candidates)
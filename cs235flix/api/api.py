@@ -0,0 +1,188 @@
+import json
+
+from flask import Blueprint
+from flask import request, session, g, jsonify, Response, stream_with_context
+from werkzeug.urls import url_encode
+
+import cs235flix.utilities.utilities as utilities
+import cs235flix.movie.services as services
+import cs235flix.authentication.services as authentication_services
+
+
+# Configure Blueprint.
+api_blueprint = Blueprint(
+    'api_bp', __name__, url_prefix='/api/v1')
+
+
+# Page sizes: the default, and the most a client may ask for. Long pages are streamed.
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 1000
+
+# Movies are fetched from the repository this many at a time while a page is streamed.
+BATCH_SIZE = 100
+
+# Fields of a movie, as returned by the movie endpoints, with how each is made from movie_to_dict's dict.
+MOVIE_FIELDS = {
+    'id': lambda movie: movie['id'],
+    'title': lambda movie: movie['title'],
+    'year': lambda movie: movie['year'],
+    'description': lambda movie: movie['description'],
+    'director': lambda movie: None if movie['director'] is None else movie['director'].director_full_name,
+    'actors': lambda movie: [actor.actor_full_name for actor in movie['actors']],
+    'length': lambda movie: movie['length'],
+    'tags': lambda movie: [tag['name'] for tag in movie['tags']],
+    'rating': lambda movie: movie['rating'],
+    'votes': lambda movie: movie['votes'],
+    'revenue_millions': lambda movie: movie['revenue_millions'],
+    'metascore': lambda movie: movie['metascore'],
+    'average_rating': lambda movie: movie['average_rating'],
+    'number_of_ratings': lambda movie: movie['number_of_ratings'],
+    'rating_histogram': lambda movie: list(movie['rating_histogram']),
+    'number_of_reviews': lambda movie: len(movie['reviews'])
+}
+
+
+class BadRequestException(Exception):
+    pass
+
+
+@api_blueprint.errorhandler(BadRequestException)
+def bad_request(exception):
+    return error(400, str(exception))
+
+
+@api_blueprint.errorhandler(services.NonExistentMovieException)
+def movie_not_found(exception):
+    return error(404, 'No such movie')
+
+
+def error(status: int, message: str):
+    response = jsonify(error=message)
+    response.status_code = status
+    return response
+
+
+@api_blueprint.route('/movies', methods=['GET'])
+@utilities.conditional_get
+def movies():
+    # Lists movies by rank, or those of one actor, director or tag, or those matching a text query, best first. The
+    # sort, filter, min and max parameters work as they do for browse.
+    fields = read_fields()
+    cursor, limit = read_page()
+
+    number_of_matches = None
+    if 'actor' in request.args:
+        movie_ids = services.get_movie_ids_for_actor(request.args['actor'], g.repo)
+    elif 'director' in request.args:
+        movie_ids = services.get_movie_ids_for_director(request.args['director'], g.repo)
+    elif 'tag' in request.args:
+        movie_ids = services.get_movie_ids_for_tag(request.args['tag'], g.repo)
+    elif 'q' in request.args:
+        if not ('sort' in request.args or 'filter' in request.args):
+            # Only rank as many matches as it takes to fill this page.
+            movie_ids, number_of_matches = services.search_movie_ids(request.args['q'], g.repo,
+                                                                     cursor + limit)
+        else:
+            movie_ids = services.search_movie_ids(request.args['q'], g.repo)[0]
+    else:
+        movie_ids = None
+
+    movie_ids = services.sort_and_filter_movie_ids(
+        movie_ids, g.repo, request.args.get('sort'), request.args.get('filter'),
+        services.parse_number(request.args.get('min')), services.parse_number(request.args.get('max')))
+    if movie_ids is None:
+        movie_ids = services.get_movie_ids(g.repo)
+    count = len(movie_ids) if number_of_matches is None else number_of_matches
+
+    return stream_page('movies', movie_ids[cursor:cursor + limit], count, cursor, limit,
+                       lambda ids: (select_fields(movie, fields) for movie in
+                                    services.get_movies_by_id(ids, g.repo, include_tagged_movies=False)))
+
+
+@api_blueprint.route('/movies/<int:movie_id>', methods=['GET'])
+@utilities.conditional_get
+def movie(movie_id):
+    fields = read_fields()
+    movies = services.get_movies_by_id([movie_id], g.repo, include_tagged_movies=False)
+    if len(movies) == 0:
+        raise services.NonExistentMovieException
+    # Keep the fields in the order they were asked for, as the movie lists do.
+    return Response(json.dumps(select_fields(movies[0], fields), separators=(',', ':')), mimetype='application/json')
+
+
+@api_blueprint.route('/movies/<int:movie_id>/reviews', methods=['GET'])
+@utilities.conditional_get
+def reviews(movie_id):
+    cursor, limit = read_page()
+    reviews = services.get_reviews_for_movie(movie_id, g.repo)
+    return stream_page('reviews', reviews[cursor:cursor + limit], len(reviews), cursor, limit,
+                       lambda batch: (review_to_json(review) for review in batch))
+
+
+@api_blueprint.route('/watched', methods=['GET'])
+@utilities.conditional_get
+def watched():
+    # Lists the movies the session user has watched, in the order they watched them.
+    if 'user_name' not in session:
+        return error(401, 'Log in to see your watched movies')
+    fields = read_fields()
+    cursor, limit = read_page()
+    movie_ids = authentication_services.get_watched(session['user_name'], g.repo)
+    return stream_page('movies', movie_ids[cursor:cursor + limit], len(movie_ids), cursor, limit,
+                       lambda ids: (select_fields(movie, fields) for movie in
+                                    services.get_movies_by_id(ids, g.repo, include_tagged_movies=False)))
+
+
+def read_fields():
+    # Returns the movie fields named by the fields parameter, such as fields=id,title, or all of them.
+    if 'fields' not in request.args:
+        return list(MOVIE_FIELDS)
+    fields = [field.strip() for field in request.args['fields'].split(',') if field.strip()]
+    unknown = [field for field in fields if field not in MOVIE_FIELDS]
+    if len(fields) == 0 or len(unknown) > 0:
+        raise BadRequestException('Unknown fields: ' + ', '.join(unknown) if unknown else 'No fields given')
+    return fields
+
+
+def read_page():
+    # Returns the cursor and limit parameters, defaulting to the first page of DEFAULT_LIMIT items.
+    try:
+        cursor = int(request.args.get('cursor', 0))
+        limit = int(request.args.get('limit', DEFAULT_LIMIT))
+    except ValueError:
+        raise BadRequestException('cursor and limit must be whole numbers')
+    if cursor < 0 or not 1 <= limit <= MAX_LIMIT:
+        raise BadRequestException(f'cursor must not be negative, and limit must be from 1 to {MAX_LIMIT}')
+    return cursor, limit
+
+
+def select_fields(movie: dict, fields):
+    return {field: MOVIE_FIELDS[field](movie) for field in fields}
+
+
+def review_to_json(review: dict):
+    review = dict(review)
+    review['timestamp'] = review['timestamp'].isoformat()
+    return review
+
+
+def stream_page(name: str, items, count: int, cursor: int, limit: int, convert):
+    # Streams {name: [...], "count": ..., "next": ...} as it is serialised, converting items BATCH_SIZE at a time,
+    # so that long pages are neither built nor held in memory whole. next is the URL of the following page, if any:
+    # this URL with the same query parameters, but for the cursor.
+    next_url = None
+    if cursor + limit < count:
+        args = request.args.copy()
+        args['cursor'] = cursor + limit
+        next_url = request.base_url + '?' + url_encode(args)
+
+    def generate():
+        yield '{"%s":[' % name
+        separator = ''
+        for start in range(0, len(items), BATCH_SIZE):
+            for item in convert(items[start:start + BATCH_SIZE]):
+                yield separator + json.dumps(item, separators=(',', ':'))
+                separator = ','
+        yield '],"count":%d,"next":%s}' % (count, json.dumps(next_url))
+
+    return Response(stream_with_context(generate()), mimetype='application/json')
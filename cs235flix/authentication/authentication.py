@@ -1,4 +1,4 @@
-from flask import Blueprint, render_template, redirect, url_for, session, request
+from flask import Blueprint, render_template, redirect, url_for, session, request, g
 
 from flask_wtf import FlaskForm
 from wtforms import StringField, PasswordField, SubmitField
@@ -8,9 +8,7 @@ from password_validator import PasswordValidator
 
 from functools import wraps
 
-import cs235flix.utilities.utilities as utilities
 import cs235flix.authentication.services as services
-import cs235flix.adapters.repository as repo
 
 # Configure Blueprint.
 authentication_blueprint = Blueprint(
@@ -26,7 +24,7 @@ def register():
         # Successful POST, i.e. the username and password have passed validation checking.
         # Use the service layer to attempt to add the new user.
         try:
-            services.add_user(form.username.data, form.password.data, repo.repo_instance)
+            services.add_user(form.username.data, form.password.data, g.repo)
 
             # All is well, redirect the user to the login page.
             return redirect(url_for('authentication_bp.login'))
@@ -39,8 +37,7 @@ def register():
         title='Register',
         form=form,
         username_error_message=username_not_unique,
-        handler_url=url_for('authentication_bp.register'),
-        tag_urls=utilities.get_tags_and_urls()
+        handler_url=url_for('authentication_bp.register')
     )
 
 
@@ -55,10 +52,10 @@ def login():
         # Use the service layer to lookup the user.
         try:
             # Usernames are converted to lowercase, so we need to use .lower()
-            user = services.get_user(form.username.data.lower(), repo.repo_instance)
+            user = services.get_user(form.username.data.lower(), g.repo)
 
             # Authenticate user.
-            services.authenticate_user(user['user_name'], form.password.data, repo.repo_instance)
+            services.authenticate_user(user['user_name'], form.password.data, g.repo)
 
             # Initialise session and redirect the user to the home page.
             session.clear()
@@ -80,8 +77,7 @@ def login():
         title='Login',
         username_error_message=username_not_recognised,
         password_error_message=password_does_not_match_username,
-        form=form,
-        tag_urls=utilities.get_tags_and_urls()
+        form=form
     )
 
 
@@ -105,19 +101,18 @@ def login_required(view):
 def profile():
     movie_id = request.args.get('watched')
     username = session['user_name']
-    user = services.get_user(username, repo.repo_instance)
-    watched = services.get_watched(username, repo.repo_instance)
+    user = services.get_user(username, g.repo)
+    watched = services.get_watched(username, g.repo)
 
     if movie_id is not None:
-        services.add_watched(username, int(movie_id), repo.repo_instance)
+        services.add_watched(username, int(movie_id), g.repo)
 
     return render_template(
         'authentication/profile.html',
         title=username+"'s Profile",
-        user=services.get_user(username, repo.repo_instance),
+        user=services.get_user(username, g.repo),
         watched=watched,
-        handler_url=url_for('authentication_bp.profile'),
-        tag_urls=utilities.get_tags_and_urls()
+        handler_url=url_for('authentication_bp.profile')
     )
 
 class PasswordValid:
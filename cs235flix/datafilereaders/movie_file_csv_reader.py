@@ -1,8 +1,27 @@
+import io
 import csv
+import mmap
+from concurrent.futures import ProcessPoolExecutor
 
 from cs235flix.domain.model import Movie, Actor, Genre, Director
 
 
+# Bytes scanned at a time while looking for row boundaries.
+SCAN_BLOCK_SIZE = 1 << 20
+
+
+class MovieFileCSVException(Exception):
+
+    def __init__(self, line_number: int, message: str):
+        # Both arguments are passed on so that the exception can be pickled back from a worker process.
+        super().__init__(line_number, message)
+        self.line_number = line_number
+        self.message = message
+
+    def __str__(self):
+        return f'line {self.line_number}: {self.message}'
+
+
 class MovieFileCSVReader:
 
     def __init__(self, file_name: str):
@@ -11,47 +30,157 @@ class MovieFileCSVReader:
         self.__dataset_of_actors = set([])
         self.__dataset_of_directors = set([])
         self.__dataset_of_genres = set([])
+        self.__bad_rows = list()
+        # Registries interning each actor, director and genre, so each is shared by all the movies it appears in.
+        self.__actors = dict()
+        self.__directors = dict()
+        self.__genres = dict()
 
-    def read_csv_file(self):
-        with open(self.__file_name, mode='r', encoding='utf-8-sig') as csvfile:
-            movie_file_reader = csv.DictReader(csvfile)
+    @staticmethod
+    def __intern(registry: dict, entity_type, name: str):
+        name = name.strip()
+        entity = registry.get(name)
+        if entity is None:
+            entity = registry[name] = entity_type(name)
+        return entity
+
+    @staticmethod
+    def __parse_int(row: dict, column: str) -> int:
+        try:
+            return int(row[column])
+        except ValueError:
+            raise ValueError(f'{column} is not a whole number: {row[column]!r}')
 
-            for row in movie_file_reader:
-                title = row['Title']
-                release_year = int(row['Year'])
-                description = row['Description']
-                time = int(row['Runtime (Minutes)'])
-                movie = Movie(title, release_year)
+    @staticmethod
+    def __parse_optional(row: dict, column: str, number_type):
+        # Blank and N/A values, and missing columns, are unknown.
+        value = (row.get(column) or '').strip()
+        if value in ('', 'N/A'):
+            return None
+        try:
+            return number_type(value)
+        except ValueError:
+            raise ValueError(f'{column} is not a number: {row[column]!r}')
 
-                actors1 = row['Actors'].split(",")
-                actors2 = []
-                for i in actors1:
-                    actors2.append(Actor(i))
+    def __parse_movie(self, row: dict) -> Movie:
+        if None in row.values():
+            raise ValueError('row has too few fields')
 
-                director = Director(row['Director'])
+        release_year = self.__parse_int(row, 'Year')
+        time = self.__parse_int(row, 'Runtime (Minutes)')
+        if time <= 0:
+            raise ValueError(f'Runtime (Minutes) is not positive: {time}')
+        movie = Movie(row['Title'], release_year)
 
-                genres1 = row['Genre'].split(",")
-                genres2 = []
-                for i in genres1:
-                    genres2.append(Genre(i))
+        movie.director = self.__intern(self.__directors, Director, row['Director'])
+        movie.description = row['Description']
+        movie.actors = [self.__intern(self.__actors, Actor, name) for name in row['Actors'].split(",")]
+        movie.genres = [self.__intern(self.__genres, Genre, name) for name in row['Genre'].split(",")]
+        movie.runtime_minutes = time
+        movie.rating = self.__parse_optional(row, 'Rating', float)
+        movie.votes = self.__parse_optional(row, 'Votes', int)
+        movie.revenue_millions = self.__parse_optional(row, 'Revenue (Millions)', float)
+        movie.metascore = self.__parse_optional(row, 'Metascore', int)
+        return movie
 
-                movie.director = director
-                movie.description = description
-                movie.actors = actors2
-                movie.genres = genres2
-                movie.runtime_minutes = time
+    def __parse_rows(self, movie_file_reader: csv.DictReader, first_line: int, skip_bad_rows: bool,
+                     ranked: bool = False):
+        # Yields movies, or (line number, rank, movie) triples if ranked.
+        for row in movie_file_reader:
+            line_number = first_line + movie_file_reader.line_num - 1
+            try:
+                movie = self.__parse_movie(row)
+                if ranked:
+                    rank = self.__parse_int(row, 'Rank')
+                    if rank <= 0:
+                        raise ValueError(f'Rank is not positive: {rank}')
+                    movie = (line_number, rank, movie)
+            except ValueError as error:
+                if not skip_bad_rows:
+                    raise MovieFileCSVException(line_number, str(error))
+                self.__bad_rows.append((line_number, str(error)))
+                continue
+            yield movie
+
+    def iter_movies(self, skip_bad_rows: bool = False, workers: int = None):
+        """ Yields the movies in the file one row at a time, without keeping them.
+
+        A malformed row raises a MovieFileCSVException giving its line number, unless skip_bad_rows is True, in
+        which case the row is left out and its line number and problem are added to bad_rows.
+
+        With more than one worker, the file is split into chunks of whole rows that are parsed in parallel by worker
+        processes. Movies are still yielded in file order, a chunk at a time.
+        """
+        self.__bad_rows = list()
+        yield from self.__iter_rows(skip_bad_rows, workers, ranked=False)
+
+    def iter_ranked_movies(self, skip_bad_rows: bool = False, workers: int = None):
+        """ Yields (rank, movie) pairs, as iter_movies yields movies, taking each rank from the Rank column.
+
+        Ranks must be positive whole numbers, and a row repeating the rank of an earlier row is malformed too, so
+        every movie yielded has a rank of its own. The ranks of skipped rows are left unused.
+        """
+        self.__bad_rows = list()
+        ranks = set()
+        for line_number, rank, movie in self.__iter_rows(skip_bad_rows, workers, ranked=True):
+            if rank in ranks:
+                if not skip_bad_rows:
+                    raise MovieFileCSVException(line_number, f'Rank {rank} is repeated')
+                self.__bad_rows.append((line_number, f'Rank {rank} is repeated'))
+                continue
+            ranks.add(rank)
+            yield rank, movie
+
+    def __iter_rows(self, skip_bad_rows: bool, workers: int, ranked: bool):
+        if workers is not None and workers > 1:
+            yield from self.__iter_movies_parallel(skip_bad_rows, workers, ranked)
+            return
+
+        with open(self.__file_name, mode='r', encoding='utf-8-sig') as csvfile:
+            yield from self.__parse_rows(csv.DictReader(csvfile), 1, skip_bad_rows, ranked)
 
+    def __iter_movies_parallel(self, skip_bad_rows: bool, workers: int, ranked: bool = False):
+        fieldnames, chunks = split_into_chunks(self.__file_name, workers * 4)
 
-                #Adding to datasets
-                self.__dataset_of_movies.append(movie)
+        with ProcessPoolExecutor(workers) as executor:
+            results = executor.map(read_movies_chunk, [self.__file_name] * len(chunks), chunks,
+                                   [fieldnames] * len(chunks), [skip_bad_rows] * len(chunks), [ranked] * len(chunks))
+            for rows, bad_rows in results:
+                self.__bad_rows.extend(bad_rows)
+                for row in rows:
+                    movie = row[2] if ranked else row
+                    # Each worker interned its own copies, so intern them again across the whole file.
+                    movie.director = self.__intern(self.__directors, Director, movie.director.director_full_name or '')
+                    movie.actors = [self.__intern(self.__actors, Actor, actor.actor_full_name or '')
+                                    for actor in movie.actors]
+                    movie.genres = [self.__intern(self.__genres, Genre, genre.genre_name or '')
+                                    for genre in movie.genres]
+                    yield row
 
-                for actor in actors2:
-                    self.__dataset_of_actors.add(actor)
+    def read_chunk(self, chunk, fieldnames, skip_bad_rows: bool = False, ranked: bool = False):
+        """ Returns the movies in a chunk from split_into_chunks, as a list, or (line number, rank, movie) triples if
+        ranked. """
+        start, end, first_line = chunk
+        with open(self.__file_name, 'rb') as infile:
+            infile.seek(start)
+            text = infile.read(end - start).decode('utf-8')
 
-                self.__dataset_of_directors.add(director)
+        self.__bad_rows = list()
+        movie_file_reader = csv.DictReader(io.StringIO(text, newline=''), fieldnames=fieldnames)
+        return list(self.__parse_rows(movie_file_reader, first_line, skip_bad_rows, ranked))
 
-                for genre in genres2:
-                    self.__dataset_of_genres.add(genre)
+    def read_csv_file(self, skip_bad_rows: bool = False, workers: int = None):
+        for movie in self.iter_movies(skip_bad_rows, workers):
+            #Adding to datasets
+            self.__dataset_of_movies.append(movie)
+
+            for actor in movie.actors:
+                self.__dataset_of_actors.add(actor)
+
+            self.__dataset_of_directors.add(movie.director)
+
+            for genre in movie.genres:
+                self.__dataset_of_genres.add(genre)
 
     @property
     def dataset_of_movies(self):
@@ -68,3 +197,69 @@ class MovieFileCSVReader:
     @property
     def dataset_of_genres(self):
         return self.__dataset_of_genres
+
+    @property
+    def bad_rows(self):
+        """ (line number, problem) pairs for the rows skipped by the last read. """
+        return self.__bad_rows
+
+
+def count_bytes(data, start: int, end: int, byte: bytes) -> int:
+    count = 0
+    for block_start in range(start, end, SCAN_BLOCK_SIZE):
+        count += data[block_start:min(block_start + SCAN_BLOCK_SIZE, end)].count(byte)
+    return count
+
+
+def split_into_chunks(file_name: str, number_of_chunks: int):
+    """ Splits a CSV file's rows into about number_of_chunks byte ranges that start and end on row boundaries.
+
+    Returns the file's field names and a list of (start, end, first line number) chunks. A newline only ends a row
+    if an even number of quote characters precede it, so quoted fields may span lines.
+    """
+    with open(file_name, 'rb') as infile:
+        header = infile.readline()
+        size = infile.seek(0, 2)
+        fieldnames = next(csv.reader([header.decode('utf-8-sig')]))
+        if size == len(header):
+            return fieldnames, []
+        data = mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ)
+
+    try:
+        boundaries = [len(header)]
+        quotes = 0
+        position = len(header)
+        for index in range(1, number_of_chunks):
+            target = len(header) + (size - len(header)) * index // number_of_chunks
+            if target <= position:
+                continue
+            quotes += count_bytes(data, position, target, b'"')
+            position = target
+
+            # Move on to the first newline that isn't inside a quoted field.
+            while position < size:
+                newline = data.find(b'\n', position)
+                newline = size - 1 if newline == -1 else newline
+                quotes += count_bytes(data, position, newline + 1, b'"')
+                position = newline + 1
+                if quotes % 2 == 0:
+                    break
+            if position < size:
+                boundaries.append(position)
+        boundaries.append(size)
+
+        chunks = []
+        first_line = 2
+        for start, end in zip(boundaries, boundaries[1:]):
+            chunks.append((start, end, first_line))
+            first_line += count_bytes(data, start, end, b'\n')
+        return fieldnames, chunks
+    finally:
+        data.close()
+
+
+def read_movies_chunk(file_name: str, chunk, fieldnames, skip_bad_rows: bool, ranked: bool = False):
+    # Runs in a worker process: parses one chunk and returns its movies with the rows it skipped.
+    reader = MovieFileCSVReader(file_name)
+    movies = reader.read_chunk(chunk, fieldnames, skip_bad_rows, ranked)
+    return movies, reader.bad_rows
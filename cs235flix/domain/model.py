@@ -3,6 +3,11 @@ from typing import List, Iterable
 
 
 class User:
+    # Slots drop the per-instance __dict__; collections are allocated on first use.
+    __slots__ = ('__user_name', '__password', '__friends', '__friends_ids', '__pending_friends',
+                 '__pending_friends_ids', '__watched_movies', '__watched_ids', '__reviews',
+                 '__time_spent_watching_movies_minutes', '__id')
+
     def __init__(self, user_name: str, password: str):
         if type(user_name) is not str:
             self.__user_name = None
@@ -14,13 +19,13 @@ class User:
         else:
             self.__password = password
 
-        self.__friends = []
-        self.__friends_ids = []
-        self.__pending_friends = []
-        self.__pending_friends_ids = []
-        self.__watched_movies = []
-        self.__watched_ids = []
-        self.__reviews = []
+        self.__friends = None
+        self.__friends_ids = None
+        self.__pending_friends = None
+        self.__pending_friends_ids = None
+        self.__watched_movies = None
+        self.__watched_ids = None
+        self.__reviews = None
         self.__time_spent_watching_movies_minutes = 0
         self.__id = None
 
@@ -53,6 +58,8 @@ class User:
 
     @property
     def friends(self):
+        if self.__friends is None:
+            self.__friends = []
         return self.__friends
 
     @friends.setter
@@ -62,6 +69,8 @@ class User:
 
     @property
     def pending_friends(self):
+        if self.__pending_friends is None:
+            self.__pending_friends = []
         return self.__pending_friends
 
     @pending_friends.setter
@@ -71,6 +80,8 @@ class User:
 
     @property
     def friends_ids(self):
+        if self.__friends is None:
+            self.__friends = []
         return self.__friends
 
     @friends_ids.setter
@@ -80,6 +91,8 @@ class User:
 
     @property
     def pending_friends_ids(self):
+        if self.__pending_friends_ids is None:
+            self.__pending_friends_ids = []
         return self.__pending_friends_ids
 
     @pending_friends_ids.setter
@@ -89,6 +102,8 @@ class User:
 
     @property
     def watched_movies(self):
+        if self.__watched_movies is None:
+            self.__watched_movies = []
         return self.__watched_movies
 
     @watched_movies.setter
@@ -103,6 +118,8 @@ class User:
 
     @property
     def watched_ids(self):
+        if self.__watched_ids is None:
+            self.__watched_ids = []
         return self.__watched_ids
 
     @watched_ids.setter
@@ -117,6 +134,8 @@ class User:
 
     @property
     def reviews(self):
+        if self.__reviews is None:
+            self.__reviews = []
         return self.__reviews
 
     @reviews.setter
@@ -141,57 +160,57 @@ class User:
 
     def watch_movie(self, movie: 'Movie', id: int):
         if type(movie) is Movie:
-            self.__watched_movies.append(movie)
-            self.__watched_ids.append(id)
+            self.watched_movies.append(movie)
+            self.watched_ids.append(id)
             self.__time_spent_watching_movies_minutes += movie.runtime_minutes
 
     def add_review(self, review: 'Review'):
         if type(review) is Review:
-            self.__reviews.append(review)
+            self.reviews.append(review)
 
     @property
     def number_of_friends(self):
-        return len(self.__friends)
+        return len(self.__friends or ())
 
     def send_friend_request(self, recipient):
         if type(recipient) is User and self != recipient:
             # check to see if they are not already (pending) friends
-            if (recipient not in self.__pending_friends) and (recipient not in self.__friends):
+            if (recipient not in self.pending_friends) and (recipient not in self.friends):
                 # add both users to each other's pending lists
-                self.__pending_friends.append(recipient)
-                recipient.__pending_friends.append(self)
+                self.pending_friends.append(recipient)
+                recipient.pending_friends.append(self)
 
     def accept_pending_request(self, sender):
         if type(sender) is User and self != sender:
-            if sender in self.__pending_friends:
+            if sender in self.pending_friends:
                 # add both users to each other's friends lists
-                self.__friends.append(sender)
-                sender.__friends.append(self)
+                self.friends.append(sender)
+                sender.friends.append(self)
                 # remove both users from each other's pending lists
-                self.__pending_friends.remove(sender)
-                sender.__pending_friends.remove(self)
+                self.pending_friends.remove(sender)
+                sender.pending_friends.remove(self)
 
     def ignore_pending_request(self, user):
         if type(user) is User:
-            if user in self.__pending_friends:
-                self.__pending_friends.remove(user)
-                user.__pending_friends.remove(self)
+            if user in self.pending_friends:
+                self.pending_friends.remove(user)
+                user.pending_friends.remove(self)
 
     def ignore_all_pending_requests(self):
-        for user in self.__pending_friends:
-            user.__pending_friends.remove(self)
-        self.__pending_friends = []
+        for user in self.pending_friends:
+            user.pending_friends.remove(self)
+        self.__pending_friends = None
 
     def see_friend_watched_movies(self, friend):
-        if type(friend) is User and friend in self.__friends:
-            return friend.__watched_movies
+        if type(friend) is User and friend in self.friends:
+            return friend.watched_movies
 
     def see_friend_reviews(self, friend):
-        if type(friend) is User and friend in self.__friends:
-            return friend.__reviews
+        if type(friend) is User and friend in self.friends:
+            return friend.reviews
 
     def see_friend_minutes_watched(self, friend):
-        if type(friend) is User and friend in self.__friends:
+        if type(friend) is User and friend in self.friends:
             return friend.__time_spent_watching_movies_minutes
 
     def __repr__(self):
@@ -208,12 +227,14 @@ class User:
 
 
 class Actor:
+    __slots__ = ('__actor_full_name', '__colleagues')
+
     def __init__(self, actor_full_name: str):
         if actor_full_name == "" or type(actor_full_name) is not str:
             self.__actor_full_name = None
         else:
             self.__actor_full_name = actor_full_name.strip()
-        self.__colleagues = []
+        self.__colleagues = None
 
     @property
     def actor_full_name(self) -> str:
@@ -232,17 +253,22 @@ class Actor:
         return hash(self.__actor_full_name)
 
     def add_actor_colleague(self, colleague):
+        if self.__colleagues is None:
+            self.__colleagues = []
+        if colleague.__colleagues is None:
+            colleague.__colleagues = []
         self.__colleagues.append(colleague)
         colleague.__colleagues.append(self)
 
     def check_if_this_actor_worked_with(self, colleague):
-        for i in self.__colleagues:
+        for i in self.__colleagues or ():
             if i.__actor_full_name == colleague.__actor_full_name:
                 return True
         return False
 
 
 class Director:
+    __slots__ = ('__director_full_name',)
 
     def __init__(self, director_full_name: str):
         if director_full_name == "" or type(director_full_name) is not str:
@@ -268,6 +294,8 @@ class Director:
 
 
 class Genre:
+    __slots__ = ('__genre_name',)
+
     def __init__(self, genre_name: str):
         if genre_name == "" or type(genre_name) is not str:
             self.__genre_name = None
@@ -292,6 +320,8 @@ class Genre:
 
 
 class Review:
+    __slots__ = ('__movie', '__review_text', '__rating', '__timestamp', '__user')
+
     def __init__(self, movie: 'Movie', review_text: str, rating: int):
         # movie
         if type(movie) is not Movie:
@@ -321,6 +351,11 @@ class Review:
     def movie(self):
         return self.__movie
 
+    @movie.setter
+    def movie(self, movie):
+        if type(movie) is Movie:
+            self.__movie = movie
+
     @property
     def review_text(self):
         return self.__review_text
@@ -356,6 +391,12 @@ class Review:
 
 
 class Movie:
+    # Slots drop the per-instance __dict__; collections are allocated on first use. __weakref__ lets repositories
+    # hold movies weakly.
+    __slots__ = ('__title', '__release_year', '__reviews', '__director', '__description', '__actors', '__genres',
+                 '_tags', '__runtime_minutes', '__rating', '__votes', '__revenue_millions', '__metascore',
+                 '__rating_count', '__rating_sum', '__rating_histogram', '__version', '__weakref__')
+
     def __init__(self, title: str, release_year: int):
         if title == "" or type(title) is not str:
             self.__title = None
@@ -367,15 +408,24 @@ class Movie:
         else:
             self.__release_year = release_year
 
-        if True:
-            self.__reviews = []
-
+        self.__reviews = None
         self.__director = None
         self.__description = ""
-        self.__actors = []
-        self.__genres = []
-        self._tags = []
+        self.__actors = None
+        self.__genres = None
+        self._tags = None
         self.__runtime_minutes = 0
+        # Figures from the movie's source; None where they are unknown.
+        self.__rating = None
+        self.__votes = None
+        self.__revenue_millions = None
+        self.__metascore = None
+        # Running totals over the ratings of the movie's reviews; the histogram counts ratings 1 to 10.
+        self.__rating_count = 0
+        self.__rating_sum = 0
+        self.__rating_histogram = None
+        # Bumped whenever the movie's reviews change, so that pages rendered from the movie can tell they are stale.
+        self.__version = 0
 
     @property
     def title(self) -> str:
@@ -388,14 +438,51 @@ class Movie:
 
     @property
     def reviews(self) -> list:
+        if self.__reviews is None:
+            self.__reviews = []
         return self.__reviews
 
     @reviews.setter
     def reviews(self, reviews):
         self.__reviews = reviews
+        self.__rating_count = 0
+        self.__rating_sum = 0
+        self.__rating_histogram = None
+        for review in reviews:
+            self.__count_rating(review.rating)
+        self.__version += 1
 
     def add_review(self, review):
-        self.__reviews.append(review)
+        self.reviews.append(review)
+        self.__count_rating(review.rating)
+        self.__version += 1
+
+    @property
+    def version(self) -> int:
+        return self.__version
+
+    def __count_rating(self, rating):
+        if rating is None:
+            return
+        if self.__rating_histogram is None:
+            self.__rating_histogram = [0] * 10
+        self.__rating_histogram[rating - 1] += 1
+        self.__rating_count += 1
+        self.__rating_sum += rating
+
+    @property
+    def number_of_ratings(self) -> int:
+        return self.__rating_count
+
+    @property
+    def average_rating(self) -> float:
+        if self.__rating_count == 0:
+            return None
+        return self.__rating_sum / self.__rating_count
+
+    @property
+    def rating_histogram(self) -> tuple:
+        return tuple(self.__rating_histogram or [0] * 10)
 
     @property
     def release_year(self) -> int:
@@ -427,6 +514,8 @@ class Movie:
 
     @property
     def actors(self) -> list:
+        if self.__actors is None:
+            self.__actors = []
         return self.__actors
 
     @actors.setter
@@ -441,6 +530,8 @@ class Movie:
 
     @property
     def genres(self) -> list:
+        if self.__genres is None:
+            self.__genres = []
         return self.__genres
 
     @genres.setter
@@ -467,12 +558,50 @@ class Movie:
         else:
             raise ValueError
 
+    @property
+    def rating(self) -> float:
+        return self.__rating
+
+    @rating.setter
+    def rating(self, rating: float):
+        if rating is None or type(rating) in (int, float) and 0 <= rating <= 10:
+            self.__rating = rating
+
+    @property
+    def votes(self) -> int:
+        return self.__votes
+
+    @votes.setter
+    def votes(self, votes: int):
+        if votes is None or type(votes) is int and votes >= 0:
+            self.__votes = votes
+
+    @property
+    def revenue_millions(self) -> float:
+        return self.__revenue_millions
+
+    @revenue_millions.setter
+    def revenue_millions(self, revenue: float):
+        if revenue is None or type(revenue) in (int, float) and revenue >= 0:
+            self.__revenue_millions = revenue
+
+    @property
+    def metascore(self) -> int:
+        return self.__metascore
+
+    @metascore.setter
+    def metascore(self, metascore: int):
+        if metascore is None or type(metascore) is int and 0 <= metascore <= 100:
+            self.__metascore = metascore
+
     @property
     def number_of_tags(self) -> int:
-        return len(self._tags)
+        return len(self._tags or ())
 
     @property
     def tags(self):
+        if self._tags is None:
+            self._tags = []
         return self._tags
 
     @tags.setter
@@ -480,32 +609,32 @@ class Movie:
         self._tags = tags
 
     def is_tagged_by(self, tag: 'Tag'):
-        return tag in self._tags
+        return tag in (self._tags or ())
 
     def is_tagged(self) -> bool:
-        return len(self._tags) > 0
+        return self.number_of_tags > 0
 
     def add_tag(self, tag: 'Tag'):
-        self._tags.append(tag)
+        self.tags.append(tag)
 
     def add_actor(self, actor: Actor):
         if type(actor) is Actor:
-            self.__actors.append(actor)
+            self.actors.append(actor)
 
     def remove_actor(self, actor: Actor):
-        if actor in self.__actors:
+        if actor in (self.__actors or ()):
             self.__actors.remove(actor)
 
     def add_genre(self, genre: Genre):
         if type(genre) is Genre:
-            self.__genres.append(genre)
+            self.genres.append(genre)
 
     def remove_genre(self, genre: Genre):
-        if genre in self.__genres:
+        if genre in (self.__genres or ()):
             self.__genres.remove(genre)
 
     def __repr__(self):
-        return f"<Movie {self.__title}, {self.__release_year}, {self.__reviews}>"
+        return f"<Movie {self.__title}, {self.__release_year}, {self.__reviews or []}>"
 
     def __eq__(self, other):
         return self.__title == other.__title and self.__release_year == other.__release_year
@@ -521,6 +650,8 @@ class Movie:
 
 
 class Tag:
+    __slots__ = ('_tag_name', '_tagged_movies')
+
     def __init__(
             self, tag_name: str
     ):
@@ -1,4 +1,5 @@
 from flask import Blueprint, render_template
+
 import cs235flix.utilities.utilities as utilities
 
 
@@ -7,8 +8,6 @@ home_blueprint = Blueprint(
 
 
 @home_blueprint.route('/', methods=['GET'])
+@utilities.conditional_get
 def home():
-    return render_template(
-        'home/home.html',
-        tag_urls=utilities.get_tags_and_urls()
-    )
+    return render_template('home/home.html')
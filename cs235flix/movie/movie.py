@@ -1,14 +1,13 @@
 from datetime import date
 
 from flask import Blueprint
-from flask import request, render_template, redirect, url_for, session
+from flask import request, render_template, redirect, url_for, session, g
 
 from better_profanity import profanity
 from flask_wtf import FlaskForm
 from wtforms import TextAreaField, HiddenField, SubmitField, SelectField
 from wtforms.validators import DataRequired, Length, ValidationError
 
-import cs235flix.adapters.repository as repo
 import cs235flix.utilities.utilities as utilities
 import cs235flix.movie.services as services
 
@@ -21,25 +20,29 @@ movie_blueprint = Blueprint(
 
 
 @movie_blueprint.route('/browse', methods=['GET'])
+@utilities.conditional_get
 def browse():
     if 'user_name' in session:
         watchbtn = "yes"
-        watched = services.get_watched(session['user_name'], repo.repo_instance)
+        watched = services.get_watched(session['user_name'], g.repo)
     else:
         watchbtn = "no"
         watched = []
 
     movies_per_page = 10
-    length = services.get_last_movie(repo.repo_instance)['id']
 
     searchStr = request.args.get('search')
     searchFor = request.args.get('type')
     cursor = request.args.get('cursor')
     movie_to_show_reviews = request.args.get('view_reviews_for')
 
-    # Fetch the first and last movies in the series.
-    first_movie = services.get_first_movie(repo.repo_instance)
-    last_movie = services.get_last_movie(repo.repo_instance)
+    # Optional ordering, such as sort=-votes, and filtering, such as filter=metascore&min=70.
+    sort = request.args.get('sort')
+    filter_metric = request.args.get('filter')
+    minimum = services.parse_number(request.args.get('min'))
+    maximum = services.parse_number(request.args.get('max'))
+    browse_args = dict(search=searchStr, type=searchFor, sort=sort, filter=filter_metric,
+                       min=request.args.get('min'), max=request.args.get('max'))
 
     if cursor is None:
         cursor = 0
@@ -53,23 +56,37 @@ def browse():
         # Convert movie_to_show_reviews from string to int.
         movie_to_show_reviews = int(movie_to_show_reviews)
 
-    id_list = []
-    full_list = []
+    full_list = None
+    number_of_matches = None
     if searchStr and searchFor is not None:
+        full_list = []
         if searchFor == "Actor":
-            full_list = services.get_movie_ids_for_actor(searchStr, repo.repo_instance)
+            full_list = services.get_movie_ids_for_actor(searchStr, g.repo)
         elif searchFor == "Director":
-            full_list = services.get_movie_ids_for_director(searchStr, repo.repo_instance)
-        full_list = sorted(full_list)
-        length = len(full_list)
-        id_list = full_list[cursor:min(cursor+movies_per_page, length)]
-
-    else:
-        full_list.extend(range(1,length+1))
-        for i in range(cursor, cursor + movies_per_page):
-            id_list.append(i+1)
-
-    movies = services.get_movies_by_id(id_list, repo.repo_instance)
+            full_list = services.get_movie_ids_for_director(searchStr, g.repo)
+        elif searchFor == "Text":
+            if sort or filter_metric:
+                full_list = services.search_movie_ids(searchStr, g.repo)[0]
+            else:
+                # Only rank as many matches as it takes to fill this page.
+                full_list, number_of_matches = services.search_movie_ids(searchStr, g.repo,
+                                                                         cursor + movies_per_page)
+        elif searchFor in ("Year", "Runtime"):
+            bounds = services.parse_range(searchStr)
+            if bounds is not None and searchFor == "Year":
+                full_list = services.get_movie_ids_for_year_range(bounds[0], bounds[1], g.repo)
+            elif bounds is not None:
+                full_list = services.get_movie_ids_for_runtime(bounds[0], bounds[1], g.repo)
+
+    full_list = services.sort_and_filter_movie_ids(full_list, g.repo, sort, filter_metric, minimum,
+                                                   maximum)
+    if full_list is None:
+        full_list = services.get_movie_ids(g.repo)
+    length = len(full_list) if number_of_matches is None else number_of_matches
+    id_list = full_list[cursor:cursor + movies_per_page]
+
+    # movies.html only shows tag names, so skip building the tagged movie id lists.
+    movies = services.get_movies_by_id(id_list, g.repo, include_tagged_movies=False)
 
     first_movie_url = None
     last_movie_url = None
@@ -78,23 +95,24 @@ def browse():
 
     if len(movies) > 0:
         # There's at least one movie in the list
-        if id_list[0] > full_list[0]:
-            # There are movies with a lower id, so generate URLs for the 'previous' and 'first' navigation buttons.
-            prev_movie_url = url_for('movie_bp.browse', search=searchStr, type=searchFor, cursor=cursor-movies_per_page)
-            first_movie_url = url_for('movie_bp.browse', search=searchStr, type=searchFor)
+        if cursor > 0:
+            # There are preceding movies, so generate URLs for the 'previous' and 'first' navigation buttons.
+            prev_movie_url = url_for('movie_bp.browse', cursor=cursor-movies_per_page, **browse_args)
+            first_movie_url = url_for('movie_bp.browse', **browse_args)
 
-        # There are movies with a higher id, so generate URLs for the 'next' and 'last' navigation buttons.
-        if id_list[len(id_list)-1] < full_list[length-1]:
-            next_movie_url = url_for('movie_bp.browse', search=searchStr, type=searchFor, cursor=cursor+movies_per_page)
+        # There are further movies, so generate URLs for the 'next' and 'last' navigation buttons.
+        if cursor + movies_per_page < length:
+            next_movie_url = url_for('movie_bp.browse', cursor=cursor+movies_per_page, **browse_args)
 
             last_cursor = movies_per_page * (length // movies_per_page)
             if length % movies_per_page == 0:
                 last_cursor -= movies_per_page
-            last_movie_url = url_for('movie_bp.browse', search=searchStr, type=searchFor, cursor=last_cursor)
+            last_movie_url = url_for('movie_bp.browse', cursor=last_cursor, **browse_args)
 
         # Construct urls for viewing movie reviews and adding reviews.
         for movie in movies:
-            movie['view_review_url'] = url_for('movie_bp.browse', search=searchStr, type=searchFor, cursor=cursor, view_reviews_for=movie['id'])
+            movie['view_review_url'] = url_for('movie_bp.browse', cursor=cursor, view_reviews_for=movie['id'],
+                                               **browse_args)
             movie['add_review_url'] = url_for('movie_bp.review_movie', movie=movie['id'])
             movie['watch_url'] = url_for('authentication_bp.profile', watched=movie['id'])
 
@@ -106,12 +124,14 @@ def browse():
             movies=movies,
             watched=watched,
             watchbtn=watchbtn,
-            tag_urls=utilities.get_tags_and_urls(),
             first_movie_url=first_movie_url,
             last_movie_url=last_movie_url,
             prev_movie_url=prev_movie_url,
             next_movie_url=next_movie_url,
-            show_reviews_for_movie=movie_to_show_reviews
+            show_reviews_for_movie=movie_to_show_reviews,
+            browse_url=url_for('movie_bp.browse'),
+            browse_args=browse_args,
+            metrics=METRIC_LABELS
         )
 
     # No movies to show, so return the homepage.
@@ -119,10 +139,11 @@ def browse():
 
 
 @movie_blueprint.route('/movies_by_tag', methods=['GET'])
+@utilities.conditional_get
 def movies_by_tag():
     if 'user_name' in session:
         watchbtn = "yes"
-        watched = services.get_watched(session['user_name'], repo.repo_instance)
+        watched = services.get_watched(session['user_name'], g.repo)
     else:
         watchbtn = "no"
         watched = []
@@ -149,10 +170,11 @@ def movies_by_tag():
         cursor = int(cursor)
 
     # Retrieve movie ids for movies that are tagged with tag_name.
-    movie_ids = services.get_movie_ids_for_tag(tag_name, repo.repo_instance)
+    movie_ids = services.get_movie_ids_for_tag(tag_name, g.repo)
 
     # Retrieve the batch of movies to display on the Web page.
-    movies = services.get_movies_by_id(movie_ids[cursor:cursor + movies_per_page], repo.repo_instance)
+    movies = services.get_movies_by_id(movie_ids[cursor:cursor + movies_per_page], g.repo,
+                                       include_tagged_movies=False)
 
     first_movie_url = None
     last_movie_url = None
@@ -186,7 +208,85 @@ def movies_by_tag():
         movies_title='Movies tagged by ' + tag_name,
         movies=movies,
         watched=watched,
-        tag_urls=utilities.get_tags_and_urls(),
+        first_movie_url=first_movie_url,
+        last_movie_url=last_movie_url,
+        prev_movie_url=prev_movie_url,
+        next_movie_url=next_movie_url,
+        show_reviews_for_movie=movie_to_show_reviews,
+        watchbtn=watchbtn
+    )
+
+
+@movie_blueprint.route('/top_rated', methods=['GET'])
+@utilities.conditional_get
+def top_rated():
+    if 'user_name' in session:
+        watchbtn = "yes"
+        watched = services.get_watched(session['user_name'], g.repo)
+    else:
+        watchbtn = "no"
+        watched = []
+
+    movies_per_page = 10
+    top_rated_count = 100
+
+    # Read query parameters.
+    cursor = request.args.get('cursor')
+    movie_to_show_reviews = request.args.get('view_reviews_for')
+
+    if movie_to_show_reviews is None:
+        # No view-reviews query parameter, so set to a non-existent movie id.
+        movie_to_show_reviews = -1
+    else:
+        # Convert movie_to_show_reviews from string to int.
+        movie_to_show_reviews = int(movie_to_show_reviews)
+
+    if cursor is None:
+        # No cursor query parameter, so initialise cursor to start at the beginning.
+        cursor = 0
+    else:
+        # Convert cursor from string to int.
+        cursor = int(cursor)
+
+    # Retrieve ids for the best rated movies, best first.
+    movie_ids = services.get_top_rated_movie_ids(top_rated_count, g.repo)
+
+    # Retrieve the batch of movies to display on the Web page.
+    movies = services.get_movies_by_id(movie_ids[cursor:cursor + movies_per_page], g.repo,
+                                       include_tagged_movies=False)
+
+    first_movie_url = None
+    last_movie_url = None
+    next_movie_url = None
+    prev_movie_url = None
+
+    if cursor > 0:
+        # There are preceding movies, so generate URLs for the 'previous' and 'first' navigation buttons.
+        prev_movie_url = url_for('movie_bp.top_rated', cursor=cursor - movies_per_page)
+        first_movie_url = url_for('movie_bp.top_rated')
+
+    if cursor + movies_per_page < len(movie_ids):
+        # There are further movies, so generate URLs for the 'next' and 'last' navigation buttons.
+        next_movie_url = url_for('movie_bp.top_rated', cursor=cursor + movies_per_page)
+
+        last_cursor = movies_per_page * int(len(movie_ids) / movies_per_page)
+        if len(movie_ids) % movies_per_page == 0:
+            last_cursor -= movies_per_page
+        last_movie_url = url_for('movie_bp.top_rated', cursor=last_cursor)
+
+    # Construct urls for viewing movie reviews and adding reviews.
+    for movie in movies:
+        movie['view_review_url'] = url_for('movie_bp.top_rated', cursor=cursor, view_reviews_for=movie['id'])
+        movie['add_review_url'] = url_for('movie_bp.review_movie', movie=movie['id'])
+        movie['watch_url'] = url_for('authentication_bp.profile', watched=movie['id'])
+
+    # Generate the webpage to display the movies.
+    return render_template(
+        'movie/movies.html',
+        title='Movies',
+        movies_title='Top rated movies',
+        movies=movies,
+        watched=watched,
         first_movie_url=first_movie_url,
         last_movie_url=last_movie_url,
         prev_movie_url=prev_movie_url,
@@ -200,7 +300,7 @@ def movies_by_tag():
 def search_movie():
     if 'user_name' in session:
         watchbtn = "yes"
-        watched = services.get_watched(session['user_name'], repo.repo_instance)
+        watched = services.get_watched(session['user_name'], g.repo)
     else:
         watchbtn = "no"
         watched = []
@@ -215,8 +315,9 @@ def search_movie():
     form = SearchForm()
 
     if form.validate_on_submit():
-        searchStr = form.search.data.title()
         searchFor = form.searching_for.data
+        # Text searches ignore case, so the query is passed on as typed.
+        searchStr = form.search.data if searchFor == "Text" else form.search.data.title()
 
         return redirect(url_for('movie_bp.browse', search=searchStr, type=searchFor))
 
@@ -225,13 +326,12 @@ def search_movie():
     # the user to enter a review. The generated Web page includes a form object.
     return render_template(
         'movie/search.html',
-        title='Search by actor or director',
+        title='Search by actor, director, year, runtime or text',
         form=form,
         handler_url=url_for('movie_bp.search_movie'),
         watched=watched,
         watchbtn=watchbtn,
         selected_movies=utilities.get_selected_movies(),
-        tag_urls=utilities.get_tags_and_urls(),
         none_message=none_message
     )
 
@@ -254,10 +354,10 @@ def review_movie():
         movie_id = int(form.movie_id.data)
 
         # Use the service layer to store the new review.
-        services.add_review(movie_id, form.review.data, int(form.rating.data), username, repo.repo_instance)
+        services.add_review(movie_id, form.review.data, int(form.rating.data), username, g.repo)
 
         # Retrieve the movie in dict form.
-        movie = services.get_movie(movie_id, repo.repo_instance)
+        movie = services.get_movie(movie_id, g.repo)
 
         # Cause the web browser to go to 'browse' page containing the movie.
         num = (movie_id // movies_per_page) * movies_per_page
@@ -281,18 +381,26 @@ def review_movie():
 
     # For a GET or an unsuccessful POST, retrieve the movie to review in dict form, and return a Web page that allows
     # the user to enter a review. The generated Web page includes a form object.
-    movie = services.get_movie(movie_id, repo.repo_instance)
+    movie = services.get_movie(movie_id, g.repo)
     return render_template(
         'movie/review_movie.html',
         title='Create review',
         movie=movie,
         form=form,
         handler_url=url_for('movie_bp.review_movie'),
-        selected_movies=utilities.get_selected_movies(),
-        tag_urls=utilities.get_tags_and_urls()
+        selected_movies=utilities.get_selected_movies()
     )
 
 
+# Labels for the metrics that browse can sort and filter by.
+METRIC_LABELS = {
+    'rating': 'Rating',
+    'votes': 'Votes',
+    'revenue_millions': 'Revenue (millions)',
+    'metascore': 'Metascore'
+}
+
+
 class ProfanityFree:
     def __init__(self, message=None):
         if not message:
@@ -316,5 +424,7 @@ class ReviewForm(FlaskForm):
 
 class SearchForm(FlaskForm):
     search = TextAreaField('Search', [DataRequired(), Length(min=1, message='Please enter a name')])
-    searching_for = SelectField('searchfor', choices=[("Actor", "Actor"), ("Director", "Director")])
+    searching_for = SelectField('searchfor', choices=[("Actor", "Actor"), ("Director", "Director"), ("Year", "Year"),
+                                                      ("Runtime", "Runtime (minutes)"),
+                                                      ("Text", "Title or description")])
     submit = SubmitField('Search')
\ No newline at end of file
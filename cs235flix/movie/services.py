@@ -1,6 +1,7 @@
+import math
 from typing import List, Iterable
 
-from cs235flix.adapters.repository import AbstractRepository
+from cs235flix.adapters.repository import AbstractRepository, MOVIE_METRICS
 from cs235flix.domain.model import make_review, Movie, Review, Tag
 
 
@@ -29,6 +30,37 @@ def add_review(movie_id: int, review_text: str, rating: int, user_name: str, rep
     repo.add_review(review)
 
 
+def add_reviews(reviews: Iterable[dict], repo: AbstractRepository):
+    # Adds a batch of reviews, given as dictionaries like those of review_to_dict, where the timestamp is optional.
+    # Every movie and user is checked before any review is added, so a bad batch adds nothing.
+    reviews = list(reviews)
+
+    movie_ids = sorted(set(review['movie_id'] for review in reviews))
+    movies = repo.get_movies_by_id(movie_ids)
+    if len(movies) != len(movie_ids):
+        raise NonExistentMovieException
+    movies = dict(zip(movie_ids, movies))
+
+    users = dict()
+    for user_name in set(review['user_name'] for review in reviews):
+        users[user_name] = repo.get_user(user_name)
+        if users[user_name] is None:
+            raise UnknownUserException
+
+    # Create the reviews; the repository attaches them to their movies and users.
+    new_reviews = []
+    for review in reviews:
+        new_review = Review(movies[review['movie_id']], review['review_text'], review['rating'])
+        new_review.user = users[review['user_name']]
+        if review.get('timestamp') is not None:
+            new_review.timestamp = review['timestamp']
+        new_reviews.append(new_review)
+
+    # Update the repository.
+    repo.add_reviews(new_reviews)
+    return len(new_reviews)
+
+
 def get_movie(movie_id: int, repo: AbstractRepository):
     movie = repo.get_movie(movie_id)
 
@@ -38,17 +70,28 @@ def get_movie(movie_id: int, repo: AbstractRepository):
     return movie_to_dict(movie, movie_id, repo)
 
 
-def get_first_movie(repo: AbstractRepository):
+def get_movie_ids(repo: AbstractRepository):
+    movie_ids = repo.get_movie_ids()
+
+    return movie_ids
 
-    movie = repo.get_movie(1)
 
-    return movie_to_dict(movie, 1, repo)
+def get_first_movie(repo: AbstractRepository):
+    # Returns None if the repository has no movies.
+    movie = repo.get_first_movie()
+    if movie is None:
+        return None
+
+    return movie_to_dict(movie, repo.movie_index(movie), repo)
 
 
 def get_last_movie(repo: AbstractRepository):
-    id = repo.get_number_of_movies()
-    movie = repo.get_movie(repo.get_number_of_movies())
-    return movie_to_dict(movie, id, repo)
+    # Returns None if the repository has no movies.
+    movie = repo.get_last_movie()
+    if movie is None:
+        return None
+
+    return movie_to_dict(movie, repo.movie_index(movie), repo)
 
 
 def get_movie_ids_for_tag(tag_name, repo: AbstractRepository):
@@ -69,11 +112,98 @@ def get_movie_ids_for_director(name, repo: AbstractRepository):
     return movie_ids
 
 
-def get_movies_by_id(id_list, repo: AbstractRepository):
+def get_movie_ids_for_year_range(start: int, end: int, repo: AbstractRepository):
+    movie_ids = repo.get_movie_ids_for_year_range(start, end)
+
+    return movie_ids
+
+
+def get_movie_ids_for_runtime(minimum: int, maximum: int, repo: AbstractRepository):
+    movie_ids = repo.get_movie_ids_for_runtime(minimum, maximum)
+
+    return movie_ids
+
+
+def search_movie_ids(query: str, repo: AbstractRepository, limit: int = None):
+    # Returns the ids of the best limit movies for query, or all of them, and the number of matching movies.
+    movie_ids, count = repo.search_movie_ids(query, limit)
+
+    return movie_ids, count
+
+
+def get_top_rated_movie_ids(quantity: int, repo: AbstractRepository):
+    movie_ids = repo.get_top_rated_movie_ids(quantity)
+
+    return movie_ids
+
+
+def get_movie_ids_for_metric_range(metric: str, minimum, maximum, repo: AbstractRepository):
+    movie_ids = repo.get_movie_ids_for_metric_range(metric, minimum, maximum)
+
+    return movie_ids
+
+
+def get_movie_ids_by_metric(metric: str, repo: AbstractRepository, descending: bool = False):
+    movie_ids = repo.get_movie_ids_by_metric(metric, descending)
+
+    return movie_ids
+
+
+def sort_and_filter_movie_ids(movie_ids, repo: AbstractRepository, sort: str = None, filter_metric: str = None,
+                              minimum=None, maximum=None):
+    # Narrows movie_ids, a sequence of ids in the caller's order or None for every movie, to the movies whose
+    # filter_metric lies between minimum and maximum, keeping their order, then orders them by sort, a metric name such
+    # as 'votes', or '-votes' for highest first. Unknown metrics are ignored. Orders come from the repository's
+    # indexes, so nothing is sorted here.
+    if filter_metric in MOVIE_METRICS and (minimum is not None or maximum is not None):
+        filtered_ids = get_movie_ids_for_metric_range(filter_metric, minimum, maximum, repo)
+        if movie_ids is not None:
+            allowed = set(filtered_ids)
+            filtered_ids = [id for id in movie_ids if id in allowed]
+        movie_ids = filtered_ids
+
+    descending = sort is not None and sort.startswith('-')
+    sort_metric = sort[1:] if descending else sort
+    if sort_metric in MOVIE_METRICS:
+        ordered_ids = get_movie_ids_by_metric(sort_metric, repo, descending)
+        if movie_ids is not None:
+            wanted = set(movie_ids)
+            ordered_ids = [id for id in ordered_ids if id in wanted]
+        movie_ids = ordered_ids
+
+    return movie_ids
+
+
+def parse_number(text: str):
+    # Returns text as a number, or None if it isn't one. nan and inf are not numbers here, as no metric lies between
+    # them.
+    try:
+        number = float(text)
+    except (TypeError, ValueError):
+        return None
+    return number if math.isfinite(number) else None
+
+
+def parse_range(text: str):
+    # Accepts '2014' or '2010-2015', returning (low, high), or None if text isn't a valid range.
+    parts = text.split('-')
+    try:
+        if len(parts) == 1:
+            low = high = int(parts[0])
+        elif len(parts) == 2:
+            low, high = int(parts[0]), int(parts[1])
+        else:
+            return None
+    except ValueError:
+        return None
+    return min(low, high), max(low, high)
+
+
+def get_movies_by_id(id_list, repo: AbstractRepository, include_tagged_movies: bool = True):
     movies = repo.get_movies_by_id(id_list)
 
     # Convert Movies to dictionary form.
-    movies_as_dict = movies_to_dict(movies, id_list, repo)
+    movies_as_dict = movies_to_dict(movies, id_list, repo, include_tagged_movies)
 
     return movies_as_dict
 
@@ -91,9 +221,10 @@ def get_reviews_for_movie(movie_id, repo: AbstractRepository):
 # Functions to convert model entities to dicts
 # ============================================
 
-def movie_to_dict(movie: Movie, movie_id: int, repo: AbstractRepository):
+def movie_to_dict(movie: Movie, movie_id: int, repo: AbstractRepository, include_tagged_movies: bool = True):
     movie_dict = {
         'id': movie_id,
+        'version': movie.version,
         'year': movie.release_year,
         'title': movie.title,
         'description': movie.description,
@@ -101,16 +232,23 @@ def movie_to_dict(movie: Movie, movie_id: int, repo: AbstractRepository):
         'actors': movie.actors,
         'length': movie.runtime_minutes,
         'reviews': reviews_to_dict(movie.reviews, movie_id),
-        'tags': tags_to_dict(movie.tags, movie_id, repo)
+        'tags': tags_to_dict(movie.tags, movie_id, repo, include_tagged_movies),
+        'rating': movie.rating,
+        'votes': movie.votes,
+        'revenue_millions': movie.revenue_millions,
+        'metascore': movie.metascore,
+        'average_rating': movie.average_rating,
+        'number_of_ratings': movie.number_of_ratings,
+        'rating_histogram': movie.rating_histogram
     }
     return movie_dict
 
 
-def movies_to_dict(movies: Iterable[Movie], movie_ids, repo: AbstractRepository):
+def movies_to_dict(movies: Iterable[Movie], movie_ids, repo: AbstractRepository, include_tagged_movies: bool = True):
     returnlist = []
     index = 0
     for movie in movies:
-        returnlist.append(movie_to_dict(movie, movie_ids[index], repo))
+        returnlist.append(movie_to_dict(movie, movie_ids[index], repo, include_tagged_movies))
         index += 1
     return returnlist
 
@@ -130,16 +268,21 @@ def reviews_to_dict(reviews: Iterable[Review], movie_id: int):
     return [review_to_dict(review, movie_id) for review in reviews]
 
 
-def tag_to_dict(tag: Tag, movie_id: int, repo: AbstractRepository):
+def tag_to_dict(tag: Tag, movie_id: int, repo: AbstractRepository, include_tagged_movies: bool = True):
     tag_dict = {
-        'name': tag.tag_name,
-        'tagged_movies': [repo.movie_index(movie) for movie in tag.tagged_movies]
+        'name': tag.tag_name
     }
+    if include_tagged_movies:
+        # Shared, immutable id tuple from the repository's tag summary cache. A movie may still hold a tag the
+        # repository no longer has, such as one a reload has replaced, which tags no movies.
+        movie_ids, count = repo.get_tag_summary(tag.tag_name) or ((), 0)
+        tag_dict['tagged_movies'] = movie_ids
+        tag_dict['number_of_tagged_movies'] = count
     return tag_dict
 
 
-def tags_to_dict(tags: Iterable[Tag], movie_id: int, repo: AbstractRepository):
-    return [tag_to_dict(tag, movie_id, repo) for tag in tags]
+def tags_to_dict(tags: Iterable[Tag], movie_id: int, repo: AbstractRepository, include_tagged_movies: bool = True):
+    return [tag_to_dict(tag, movie_id, repo, include_tagged_movies) for tag in tags]
 
 
 # ============================================
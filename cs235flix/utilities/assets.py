@@ -0,0 +1,124 @@
+import os
+import gzip
+import hashlib
+import threading
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:
+    # Responses are only gzipped without the Brotli package.
+    brotli = None
+
+
+# Content types worth compressing; images and fonts other than SVG are compressed already.
+COMPRESSIBLE_TYPES = ('text/html', 'text/css', 'text/plain', 'text/javascript', 'application/javascript',
+                      'application/json', 'image/svg+xml')
+
+# Compression levels that trade a little size for speed, as pages are compressed on every request.
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+# Static files named with their current fingerprint can be cached for a year.
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+def accepted_encoding():
+    # Returns the best encoding the client accepts, or None.
+    if brotli is not None and request.accept_encodings['br']:
+        return 'br'
+    if request.accept_encodings['gzip']:
+        return 'gzip'
+    return None
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL)
+
+
+class ResponseCompressor:
+    # after_request hook that gzip or brotli-compresses responses of at least min_size bytes for clients accepting
+    # either. Static files are compressed once per version rather than on every request.
+
+    def __init__(self, min_size: int):
+        self._min_size = min_size
+        self._static_bodies = dict()  # key=(static file ETag, encoding), value=compressed body
+
+    def __call__(self, response):
+        if response.status_code != 200 or 'Content-Encoding' in response.headers \
+                or response.mimetype not in COMPRESSIBLE_TYPES:
+            return response
+        if response.is_streamed and request.endpoint != 'static':
+            # Compressing a streamed response would mean holding it all in memory first.
+            return response
+        if response.content_length is not None and response.content_length < self._min_size:
+            return response
+        encoding = accepted_encoding()
+        if encoding is None:
+            return response
+
+        etag, weak = response.get_etag()
+        key = (etag, encoding)
+        if request.endpoint == 'static' and key in self._static_bodies:
+            body = self._static_bodies[key]
+        else:
+            # Static files are streamed from disk, so read them in first.
+            response.direct_passthrough = False
+            data = response.get_data()
+            if len(data) < self._min_size:
+                return response
+            body = compress(data, encoding)
+            if request.endpoint == 'static' and etag is not None:
+                self._static_bodies[key] = body
+
+        response.direct_passthrough = False
+        response.set_data(body)
+        response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        if etag is not None:
+            # The compressed body differs byte for byte, so its ETag may only match weakly.
+            response.set_etag(etag, weak=True)
+        return response
+
+
+class StaticFingerprints:
+    # Adds a hash of each static file's content to its URLs, as url_for('static', filename=...) builds them, and
+    # lets browsers cache files requested with their current hash for good. A changed file gets a new URL.
+
+    def __init__(self, app):
+        self._static_folder = app.static_folder
+        self._lock = threading.Lock()
+        self._fingerprints = dict()  # key=filename, value=(modification time, content hash)
+        app.url_defaults(self.add_fingerprint)
+        app.after_request(self.set_cache_control)
+
+    def fingerprint(self, filename: str):
+        path = os.path.join(self._static_folder, filename)
+        try:
+            modified = os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+        cached = self._fingerprints.get(filename)
+        if cached is not None and cached[0] == modified:
+            return cached[1]
+
+        with open(path, 'rb') as infile:
+            fingerprint = hashlib.sha256(infile.read()).hexdigest()[:12]
+        with self._lock:
+            self._fingerprints[filename] = modified, fingerprint
+        return fingerprint
+
+    def add_fingerprint(self, endpoint, values):
+        if endpoint == 'static' and 'filename' in values and 'v' not in values:
+            fingerprint = self.fingerprint(values['filename'])
+            if fingerprint is not None:
+                values['v'] = fingerprint
+
+    def set_cache_control(self, response):
+        if request.endpoint == 'static' and response.status_code in (200, 304) and request.args.get('v') \
+                and request.args['v'] == self.fingerprint(request.view_args['filename']):
+            response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+        return response
@@ -12,6 +12,18 @@ def get_tag_names(repo: AbstractRepository):
     return tag_names
 
 
+def get_data_version(repo: AbstractRepository):
+    return repo.get_data_version()
+
+
+def get_watched_count(user_name: str, repo: AbstractRepository):
+    return len(repo.get_watched_ids(user_name))
+
+
+def get_tags_version(repo: AbstractRepository):
+    return repo.get_tags_version()
+
+
 def get_random_movies(quantity, repo: AbstractRepository):
     movie_count = repo.get_number_of_movies()
 
@@ -1,6 +1,8 @@
-from flask import Blueprint, request, render_template, redirect, url_for, session
+import hashlib
+from functools import wraps
+
+from flask import Blueprint, request, render_template, redirect, url_for, session, g, current_app, Markup, make_response
 
-import cs235flix.adapters.repository as repo
 import cs235flix.utilities.services as services
 
 
@@ -10,16 +12,95 @@ utilities_blueprint = Blueprint(
 
 
 def get_tags_and_urls():
-    tag_names = services.get_tag_names(repo.repo_instance)
-    tag_urls = dict()
-    for tag_name in tag_names:
-        tag_urls[tag_name] = url_for('movie_bp.movies_by_tag', tag=tag_name)
+    return tag_cache()['tag_urls']
+
+
+def get_tag_sidebar():
+    # The sidebar is rendered once per set of tags; navigation.html calls this on every page.
+    cache = tag_cache()
+    if cache['sidebar'] is None:
+        cache['sidebar'] = Markup(render_template('tag_sidebar.html', tag_urls=cache['tag_urls']))
+    return cache['sidebar']
+
+
+def tag_cache():
+    # Returns the app's cached tag URLs, rebuilding them if the repository has been replaced or its tags have changed
+    # since they were built. URLs also depend on where the app is mounted, so that is checked too.
+    cache = current_app.extensions.get('tag_cache')
+    version = services.get_tags_version(g.repo)
+    if cache is None or cache['repo'] is not g.repo or cache['version'] != version \
+            or cache['script_root'] != request.script_root:
+        tag_urls = dict()
+        for tag_name in services.get_tag_names(g.repo):
+            tag_urls[tag_name] = url_for('movie_bp.movies_by_tag', tag=tag_name)
+        cache = dict(repo=g.repo, version=version, script_root=request.script_root, tag_urls=tag_urls,
+                     sidebar=None)
+        current_app.extensions['tag_cache'] = cache
+    return cache
+
+
+def get_movie_card(movie: dict):
+    # Returns the markup for the parts of a movie in movies.html that are the same for every user and page. Cards
+    # are rendered once per movie version, as adding a review bumps the version, and all are dropped if the
+    # repository is replaced or its tags change.
+    cards = current_app.extensions.get('movie_cards')
+    tags_version = services.get_tags_version(g.repo)
+    if cards is None or cards['repo'] is not g.repo or cards['tags_version'] != tags_version:
+        cards = dict(repo=g.repo, tags_version=tags_version, cards=dict())
+        current_app.extensions['movie_cards'] = cards
+
+    version, card = cards['cards'].get(movie['id'], (None, None))
+    if version != movie['version']:
+        card = Markup(render_template('movie/movie_card.html', movie=movie))
+        cards['cards'][movie['id']] = movie['version'], card
+    return card
+
+
+@utilities_blueprint.app_context_processor
+def inject_fragments():
+    return dict(tag_sidebar=get_tag_sidebar, movie_card=get_movie_card)
+
+
+def conditional_get(view):
+    # Answers with 304 Not Modified, before the view does any work, if the client's copy of the page is current.
+    # Pages depend on the repository's movies, tags and reviews and on the session user's watch list, so the ETag is
+    # built from those. Last-Modified is only sent for anonymous visitors, as watch lists don't record when they
+    # change.
+    @wraps(view)
+    def wrapped_view(**kwargs):
+        version, last_modified = services.get_data_version(g.repo)
+        user_name = session.get('user_name')
+        watched = None
+        if user_name is not None:
+            watched = services.get_watched_count(user_name, g.repo)
+            last_modified = None
+        else:
+            # HTTP dates are whole seconds.
+            last_modified = last_modified.replace(microsecond=0)
+        etag = hashlib.sha1(f'{version}|{user_name}|{watched}'.encode('utf-8')).hexdigest()
+
+        if request.if_none_match:
+            # Compressed pages carry a weak version of the ETag, which still matches.
+            current = request.if_none_match.contains_weak(etag)
+        else:
+            current = last_modified is not None and request.if_modified_since is not None \
+                      and last_modified <= request.if_modified_since
+        if current:
+            response = current_app.response_class(status=304)
+        else:
+            response = make_response(view(**kwargs))
+            if response.status_code != 200:
+                return response
 
-    return tag_urls
+        response.set_etag(etag)
+        if last_modified is not None:
+            response.last_modified = last_modified
+        return response
+    return wrapped_view
 
 
 def get_selected_movies(quantity=3):
-    movies = services.get_random_movies(quantity, repo.repo_instance)
+    movies = services.get_random_movies(quantity, g.repo)
 
     #for movie in movies:
     #    movie['hyperlink'] = url_for('movie_bp.movies_by_date', date=movie['date'].isoformat())
@@ -27,6 +108,6 @@ def get_selected_movies(quantity=3):
 
 
 def get_movies(movie_count):
-    movies = services.get_movies(movie_count, repo.repo_instance)
+    movies = services.get_movies(movie_count, g.repo)
 
     return movies
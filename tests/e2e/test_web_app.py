@@ -1,7 +1,17 @@
+import re
+import gzip
+
 import pytest
 
 from flask import session
 
+from tests.conftest import TEST_DATA_PATH
+from cs235flix import create_app
+from cs235flix.adapters.memory_repository import MemoryRepository
+
+import cs235flix.adapters.repository as repo
+from cs235flix.domain.model import Tag, make_review
+
 
 def test_register(client):
     # Check that we retrieve the register page.
@@ -185,3 +195,208 @@ def test_movies_with_tag(client):
     assert b'Movies tagged by Action' in response.data
     assert b'Guardians of the Galaxy' in response.data
     assert b'Colossal' in response.data
+
+
+def test_tag_sidebar_follows_new_tags(client):
+    response = client.get('/')
+    assert b'/movies_by_tag?tag=Action' in response.data
+    assert b'Cheese' not in response.data
+
+    repo.repo_instance.add_tag(Tag('Cheese'))
+    response = client.get('/browse')
+    assert b'/movies_by_tag?tag=Cheese' in response.data
+
+
+def test_movie_cards_follow_new_reviews(client):
+    response = client.get('/movies_by_tag?tag=Sci-Fi')
+    assert b'Rated 3.0/10 from 2 ratings' in response.data
+    assert 1 in client.application.extensions['movie_cards']['cards']
+
+    user = repo.repo_instance.get_user('thorke')
+    repo.repo_instance.add_review(make_review(repo.repo_instance.get_movie(1), 'Better second time', 9, user, None))
+    response = client.get('/movies_by_tag?tag=Sci-Fi')
+    assert b'Rated 5.0/10 from 3 ratings' in response.data
+
+
+def test_unchanged_pages_are_not_modified(client):
+    response = client.get('/movies_by_tag?tag=Action')
+    etag = response.headers['ETag']
+    last_modified = response.headers['Last-Modified']
+
+    response = client.get('/movies_by_tag?tag=Action', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b''
+    response = client.get('/', headers={'If-Modified-Since': last_modified})
+    assert response.status_code == 304
+
+    user = repo.repo_instance.get_user('thorke')
+    repo.repo_instance.add_review(make_review(repo.repo_instance.get_movie(1), 'Seen it again', 8, user, None))
+    response = client.get('/movies_by_tag?tag=Action', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+
+def test_pages_for_users_follow_their_watch_lists(client, auth):
+    auth.login()
+    response = client.get('/browse')
+    etag = response.headers['ETag']
+    assert 'Last-Modified' not in response.headers
+    assert client.get('/browse', headers={'If-None-Match': etag}).status_code == 304
+
+    client.get('/authentication/profile?watched=3')
+    assert client.get('/browse', headers={'If-None-Match': etag}).status_code == 200
+
+
+def test_movies_by_year_range(client):
+    response = client.get('/browse?search=2012-2014&type=Year')
+    assert response.status_code == 200
+
+    assert b'Guardians of the Galaxy' in response.data
+    assert b'Prometheus' in response.data
+    assert b'Passengers' not in response.data
+
+
+def test_top_rated_movies(client):
+    response = client.get('/top_rated')
+    assert response.status_code == 200
+
+    assert b'Top rated movies' in response.data
+    assert b'Rated 9.5/10 from 2 ratings' in response.data
+    assert response.data.index(b'Prometheus') < response.data.index(b'Guardians of the Galaxy')
+
+
+def test_browse_sorted_and_filtered(client):
+    response = client.get('/browse?sort=-votes&filter=metascore&min=70')
+    assert response.status_code == 200
+
+    # The 11 movies with a metascore of 70 or more, most voted first.
+    assert b'Metascore 76' in response.data
+    assert response.data.index(b'Guardians of the Galaxy') < response.data.index(b'Hidden Figures')
+    assert b'Prometheus' not in response.data
+    assert b'sort=-votes' in response.data and b'cursor=10' in response.data
+
+
+def test_browse_text_search(client):
+    response = client.get('/browse?search=team+of+explorers&type=Text')
+    assert response.status_code == 200
+
+    # The best match comes first, and later matches are a page away.
+    assert response.data.index(b'Prometheus') < response.data.index(b'Hidden Figures')
+    assert b'cursor=10' in response.data
+
+    response = client.get('/browse?search=dinosaurs&type=Text')
+    assert response.headers['Location'].endswith('/search?none=True')
+
+
+@pytest.fixture
+def tuned_client():
+    my_app = create_app({
+        'TESTING': True,
+        'TEST_DATA_PATH': TEST_DATA_PATH,
+        'WTF_CSRF_ENABLED': False,
+        'COMPRESS_MIN_SIZE': 500,
+        'STATIC_FINGERPRINTS': True
+    })
+
+    return my_app.test_client()
+
+
+def test_pages_are_compressed(tuned_client):
+    response = tuned_client.get('/browse', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    page = gzip.decompress(response.data)
+    assert b'Guardians of the Galaxy' in page
+    assert len(response.data) < len(page) / 3
+
+    # The weak ETag of a compressed page still matches it.
+    etag = response.headers['ETag']
+    assert etag.startswith('W/')
+    assert tuned_client.get('/browse', headers={'If-None-Match': etag}).status_code == 304
+
+    assert 'Content-Encoding' not in tuned_client.get('/browse').headers
+
+
+def test_static_urls_are_fingerprinted(tuned_client):
+    page = tuned_client.get('/').data.decode('utf-8')
+    url = re.search(r'/static/css/main\.css\?v=[0-9a-f]+', page).group()
+
+    response = tuned_client.get(url, headers={'Accept-Encoding': 'gzip'})
+    assert response.status_code == 200
+    assert 'immutable' in response.headers['Cache-Control']
+    assert response.headers['Content-Encoding'] == 'gzip'
+
+    assert 'immutable' not in tuned_client.get('/static/css/main.css?v=0').headers.get('Cache-Control', '')
+
+
+def test_api_lists_movies_with_selected_fields(client):
+    response = client.get('/api/v1/movies?fields=id,title&limit=2')
+    assert response.status_code == 200
+    assert response.is_streamed
+    assert response.get_json() == {
+        'movies': [{'id': 1, 'title': 'Guardians of the Galaxy'}, {'id': 2, 'title': 'Prometheus'}],
+        'count': 30,
+        'next': 'http://localhost/api/v1/movies?fields=id%2Ctitle&limit=2&cursor=2'
+    }
+
+    page = client.get('/api/v1/movies?fields=id&limit=2&cursor=28').get_json()
+    assert page['movies'] == [{'id': 29}, {'id': 30}]
+    assert page['next'] is None
+
+
+def test_api_searches_movies(client):
+    page = client.get('/api/v1/movies?actor=Chris+Pratt&fields=id,director').get_json()
+    assert page['movies'] == [{'id': 1, 'director': 'James Gunn'}, {'id': 10, 'director': 'Morten Tyldum'}]
+
+    page = client.get('/api/v1/movies?tag=Horror&sort=-votes&fields=id').get_json()
+    assert [movie['id'] for movie in page['movies']] == [3, 23, 28]
+
+    page = client.get('/api/v1/movies?q=team+of+explorers&limit=1&fields=id').get_json()
+    assert page['movies'] == [{'id': 2}]
+    assert page['count'] == 23
+
+
+def test_api_gets_movie_and_reviews(client):
+    movie = client.get('/api/v1/movies/1?fields=title,tags,number_of_reviews').get_json()
+    assert movie == {'title': 'Guardians of the Galaxy', 'tags': ['Action', 'Adventure', 'Sci-Fi'],
+                     'number_of_reviews': 2}
+
+    page = client.get('/api/v1/movies/1/reviews').get_json()
+    assert [review['user_name'] for review in page['reviews']] == ['fmercury', 'thorke']
+    assert page['reviews'][0]['timestamp'] == '2020-02-28T00:00:00'
+
+    assert client.get('/api/v1/movies/99').status_code == 404
+    assert client.get('/api/v1/movies/99/reviews').get_json() == {'error': 'No such movie'}
+
+
+def test_api_streams_a_page_from_the_repository_it_began_with(client):
+    # As if a reload put a new repository in place while the page was being sent.
+    response = client.get('/api/v1/movies?fields=id&limit=2', buffered=False)
+    repo.repo_instance = MemoryRepository()
+    assert response.get_json()['movies'] == [{'id': 1}, {'id': 2}]
+
+
+def test_api_rejects_bad_parameters(client):
+    assert client.get('/api/v1/movies?fields=id,colour').get_json() == {'error': 'Unknown fields: colour'}
+    assert client.get('/api/v1/movies?limit=5000').status_code == 400
+    assert client.get('/api/v1/movies?cursor=first').status_code == 400
+    assert client.get('/api/v1/movies?filter=metascore&min=inf').status_code == 200
+
+
+def test_api_next_url_keeps_query_parameters(client):
+    # Parameters that url_for would take as its own, or as the view's, are passed through as they are.
+    page = client.get('/api/v1/movies/1/reviews?movie_id=3&limit=1').get_json()
+    assert page['next'] == 'http://localhost/api/v1/movies/1/reviews?movie_id=3&limit=1&cursor=1'
+
+    page = client.get('/api/v1/movies?endpoint=x&_external=1&_scheme=ftp&limit=1&fields=id').get_json()
+    assert page['next'] == 'http://localhost/api/v1/movies?endpoint=x&_external=1&_scheme=ftp&limit=1&fields=id' \
+                           '&cursor=1'
+
+
+def test_api_lists_watched_movies(client, auth):
+    assert client.get('/api/v1/watched').status_code == 401
+
+    auth.login()
+    client.get('/authentication/profile?watched=3')
+    page = client.get('/api/v1/watched?fields=id,title').get_json()
+    assert page['movies'] == [{'id': 3, 'title': 'Split'}]
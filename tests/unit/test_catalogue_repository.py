@@ -0,0 +1,107 @@
+import os
+import csv
+import shutil
+
+import pytest
+
+from tests.conftest import TEST_DATA_PATH
+from cs235flix.adapters.repository import RepositoryException
+from cs235flix.adapters.catalogue_repository import CatalogueRepository, populate_catalogue, read_header
+from cs235flix.domain.model import Movie, Tag, make_review
+from cs235flix.movie import services as movie_services
+
+
+@pytest.fixture
+def catalogue_repo(tmp_path):
+    return populate_catalogue(TEST_DATA_PATH, str(tmp_path / 'movies.catalogue'))
+
+
+def test_catalogue_can_retrieve_movie(catalogue_repo):
+    movie = catalogue_repo.get_movie(1)
+
+    assert movie.title == "Guardians of the Galaxy"
+    assert movie.release_year == 2014
+    assert movie.director.director_full_name == "James Gunn"
+    assert [actor.actor_full_name for actor in movie.actors] == \
+           ["Chris Pratt", "Vin Diesel", "Bradley Cooper", "Zoe Saldana"]
+    assert movie.runtime_minutes == 121
+    assert movie.is_tagged_by(Tag('Sci-Fi'))
+    assert catalogue_repo.movie_index(movie) == 1
+
+
+def test_catalogue_matches_memory_repository(catalogue_repo, in_memory_repo):
+    assert catalogue_repo.get_number_of_movies() == in_memory_repo.get_number_of_movies()
+    assert list(catalogue_repo.get_movie_ids()) == list(in_memory_repo.get_movie_ids())
+    assert catalogue_repo.get_movies_by_id([2, 31, 4]) == in_memory_repo.get_movies_by_id([2, 31, 4])
+    assert catalogue_repo.get_last_movie() == in_memory_repo.get_last_movie()
+    assert catalogue_repo.get_movie(31) is None
+    assert catalogue_repo.get_movie_ids_for_actor('Chris Pratt') == [1, 10]
+    assert catalogue_repo.get_movie_ids_for_actor('Dead Rat') == []
+    assert catalogue_repo.get_movie_ids_for_director('Ridley Scott') == \
+           in_memory_repo.get_movie_ids_for_director('Ridley Scott')
+    assert catalogue_repo.get_movie_ids_for_tag('Horror') == [3, 23, 28]
+    assert catalogue_repo.get_tag_summary('Comedy') == in_memory_repo.get_tag_summary('Comedy')
+    assert [tag.tag_name for tag in catalogue_repo.get_tags()] == [tag.tag_name for tag in in_memory_repo.get_tags()]
+    assert catalogue_repo.get_movie_ids_for_year_range(2012, 2015) == [1, 2, 27]
+    assert catalogue_repo.get_movie_ids_for_runtime(80, 90) == [8, 16, 26]
+    assert len(catalogue_repo.get_movies_by_year(2016)) == len(in_memory_repo.get_movies_by_year(2016))
+    for metric, low, high in (('rating', 7.0, 7.3), ('votes', 100000, None), ('revenue_millions', None, 100.5),
+                              ('metascore', 70, None)):
+        assert catalogue_repo.get_movie_ids_for_metric_range(metric, low, high) == \
+               in_memory_repo.get_movie_ids_for_metric_range(metric, low, high)
+        assert catalogue_repo.get_movie_ids_by_metric(metric, True) == \
+               in_memory_repo.get_movie_ids_by_metric(metric, True)
+    assert catalogue_repo.search_movie_ids('team of explorers', 5) == \
+           in_memory_repo.search_movie_ids('team of explorers', 5)
+
+
+def test_catalogue_keeps_reviews_and_watched_movies(catalogue_repo):
+    assert len(catalogue_repo.get_movie(1).reviews) == 2
+    assert len(catalogue_repo.get_watched('admin')) == 5
+
+    user = catalogue_repo.get_user('thorke')
+    review = make_review(catalogue_repo.get_movie(15), 'garlic bread', 7, user, None)
+    catalogue_repo.add_review(review)
+    del review
+
+    assert movie_services.get_reviews_for_movie(15, catalogue_repo)[0]['review_text'] == 'garlic bread'
+
+
+def test_catalogue_is_read_only(catalogue_repo):
+    with pytest.raises(RepositoryException):
+        catalogue_repo.add_movie(Movie("Arrivaz", 2020))
+    with pytest.raises(RepositoryException):
+        catalogue_repo.add_tag(Tag('Cheese'))
+
+
+def test_catalogue_is_rebuilt_for_a_different_movies_file(tmp_path):
+    catalogue_path = str(tmp_path / 'movies.catalogue')
+    populate_catalogue(TEST_DATA_PATH, catalogue_path)
+    digest = read_header(catalogue_path)[1]
+
+    with open(catalogue_path, 'r+b') as outfile:
+        outfile.seek(20)
+        outfile.write(b'\0' * 32)
+
+    repo = populate_catalogue(TEST_DATA_PATH, catalogue_path)
+    assert read_header(catalogue_path)[1] == digest
+    assert repo.get_number_of_movies() == 30
+
+
+def test_catalogue_keeps_ranks_of_movies_after_a_skipped_row(tmp_path, in_memory_repo):
+    for name in ('movies.csv', 'users.csv', 'reviews.csv'):
+        shutil.copy(os.path.join(TEST_DATA_PATH, name), tmp_path / name)
+    with open(tmp_path / 'movies.csv', encoding='utf-8-sig', newline='') as infile:
+        rows = list(csv.reader(infile))
+    rows[5][7] = 'long'
+    with open(tmp_path / 'movies.csv', 'w', encoding='utf-8', newline='') as outfile:
+        csv.writer(outfile, lineterminator='\n').writerows(rows)
+
+    repo = populate_catalogue(str(tmp_path), str(tmp_path / 'movies.catalogue'))
+    assert repo.get_number_of_movies() == 29
+    assert list(repo.get_movie_ids()) == [id for id in range(1, 31) if id != 5]
+    assert repo.get_movie(5) is None
+    assert repo.get_movies_by_id([4, 5, 6]) == in_memory_repo.get_movies_by_id([4, 6])
+    assert repo.get_last_movie() == in_memory_repo.get_last_movie()
+    assert repo.get_movie_ids_for_actor('Chris Pratt') == [1, 10]
+    assert repo.search_movie_ids('Sing')[0][0] == in_memory_repo.search_movie_ids('Sing')[0][0]
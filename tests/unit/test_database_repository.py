@@ -0,0 +1,134 @@
+import threading
+from datetime import datetime
+
+import pytest
+
+from tests.conftest import TEST_DATA_PATH
+from cs235flix.adapters import database_repository
+from cs235flix.adapters.database_repository import DatabaseRepository
+from cs235flix.adapters.repository import RepositoryException
+from cs235flix.domain.model import Genre, Movie, Review, User, make_review
+
+
+@pytest.fixture
+def database_repo(tmp_path):
+    repo = DatabaseRepository(str(tmp_path / 'cs235flix.db'))
+    database_repository.populate(TEST_DATA_PATH, repo)
+    yield repo
+    repo.close()
+
+
+def test_database_repository_matches_memory_repository(database_repo, in_memory_repo):
+    assert database_repo.get_number_of_movies() == in_memory_repo.get_number_of_movies()
+    assert list(database_repo.get_movie_ids()) == list(in_memory_repo.get_movie_ids())
+    assert database_repo.get_movies_by_id(range(1, 31)) == in_memory_repo.get_movies_by_id(range(1, 31))
+    assert database_repo.get_last_movie() == in_memory_repo.get_last_movie()
+    assert database_repo.get_movie_ids_for_tag('Horror') == in_memory_repo.get_movie_ids_for_tag('Horror')
+    assert database_repo.get_tag_summary('Horror') == in_memory_repo.get_tag_summary('Horror')
+    assert database_repo.get_movie_ids_for_actor('Chris Pratt') == in_memory_repo.get_movie_ids_for_actor('Chris Pratt')
+    assert database_repo.get_movie_ids_for_director('Ridley Scott') == \
+        in_memory_repo.get_movie_ids_for_director('Ridley Scott')
+    assert database_repo.get_movie_ids_for_year_range(2010, 2012) == \
+        in_memory_repo.get_movie_ids_for_year_range(2010, 2012)
+    assert database_repo.get_movie_ids_for_runtime(80, 90) == in_memory_repo.get_movie_ids_for_runtime(80, 90)
+    assert [tag.tag_name for tag in database_repo.get_tags()] == [tag.tag_name for tag in in_memory_repo.get_tags()]
+    assert database_repo.movie_index(Movie('Prometheus', 2012)) == 2
+    assert database_repo.get_top_rated_movie_ids(10) == in_memory_repo.get_top_rated_movie_ids(10)
+    for metric, low, high in (('rating', 7.0, 7.3), ('votes', 100000, None), ('revenue_millions', None, 100.5),
+                              ('metascore', 70, None)):
+        assert database_repo.get_movie_ids_for_metric_range(metric, low, high) == \
+            in_memory_repo.get_movie_ids_for_metric_range(metric, low, high)
+        assert database_repo.get_movie_ids_by_metric(metric) == in_memory_repo.get_movie_ids_by_metric(metric)
+    assert database_repo.search_movie_ids('team of explorers') == in_memory_repo.search_movie_ids('team of explorers')
+
+
+def test_database_repository_builds_movies_with_reviews(database_repo):
+    movie = database_repo.get_movie(1)
+
+    assert movie.title == 'Guardians of the Galaxy'
+    assert movie.director.director_full_name == 'James Gunn'
+    assert [actor.actor_full_name for actor in movie.actors][:2] == ['Chris Pratt', 'Vin Diesel']
+    assert movie.genres == [Genre('Action'), Genre('Adventure'), Genre('Sci-Fi')]
+    assert [review.review_text for review in movie.reviews] == ['I LOVE THIS MOVIE!!!', 'doo doo actors']
+    assert movie.reviews[0].user.user_name == 'fmercury'
+    assert database_repo.get_movie(31) is None
+
+
+def test_database_repository_loads_users(database_repo):
+    user = database_repo.get_user('Admin')
+
+    assert user.id == 4
+    assert [friend.user_name for friend in user.friends] == ['thorke', 'fmercury', 'emelg']
+    assert [friend.user_name for friend in user.pending_friends] == ['friend1', 'friend2', 'friend3']
+    assert user.watched_ids == [1, 2, 5, 7, 9]
+    assert user.watched_movies[1].title == 'Prometheus'
+    assert len(user.reviews) == 3
+    assert database_repo.get_review_num_of_user(user) == 3
+    assert database_repo.get_user('nobody') is None
+
+
+def test_database_repository_persists_writes(database_repo, tmp_path):
+    user = User('Dave', '123456789')
+    database_repo.add_user(user)
+    movie = database_repo.get_movie(2)
+    review = make_review(movie, 'Great', 8, user, datetime(2020, 10, 1))
+    database_repo.add_review(review)
+    database_repo.add_watched_ids('dave', movie, 2)
+
+    # A second repository, as another process would open, sees the writes.
+    other_repo = DatabaseRepository(str(tmp_path / 'cs235flix.db'))
+    database_repository.populate(TEST_DATA_PATH, other_repo)
+    assert other_repo.get_number_of_movies() == 30
+    assert other_repo.get_user('dave').id == user.id
+    assert other_repo.get_watched_ids('dave') == [2]
+    assert other_repo.get_movie(2).reviews[-1] == review
+    assert len(other_repo.get_reviews()) == 8
+    other_repo.close()
+
+    with pytest.raises(RepositoryException):
+        database_repo.add_user(User('dave', 'abcdefghi'))
+
+
+def test_database_repository_can_add_reviews_in_bulk(database_repo):
+    user = database_repo.get_user('thorke')
+    movie = database_repo.get_movie(3)
+    reviews = [Review(movie, 'first', 5), Review(movie, 'second', 6)]
+    for review in reviews:
+        review.user = user
+
+    version = database_repo.get_data_version()[0]
+    database_repo.add_reviews(reviews)
+    assert database_repo.get_data_version()[0] != version
+    assert [review.review_text for review in database_repo.get_movie(3).reviews] == ['rev1', 'first', 'second']
+    assert database_repo.get_review_num_of_user('thorke') == 5
+
+
+def test_database_repository_keeps_a_few_connections_for_many_threads(database_repo):
+    def look_up():
+        assert database_repo.get_user('thorke') is not None
+
+    threads = [threading.Thread(target=look_up) for _ in range(50)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(database_repo._pool._idle) <= database_repository.POOL_SIZE
+
+    # Connections opened by other threads can be closed from this one.
+    database_repo.close()
+    assert database_repo._pool._idle == []
+
+
+def test_database_repository_reuses_users_within_a_request(database_repo):
+    assert database_repo.get_user('thorke') is not database_repo.get_user('thorke')
+
+    database_repo.begin_request()
+    user = database_repo.get_user('thorke')
+    assert database_repo.get_user(' THORKE') is user
+    assert database_repo.get_user_by_id(user.id) is user
+
+    # Writes drop the users kept so far, so they are fetched again with the write.
+    database_repo.add_watched_ids('thorke', database_repo.get_movie(3), 3)
+    assert database_repo.get_user('thorke').watched_ids[-1] == 3
+    database_repo.end_request()
+    assert database_repo.get_user('thorke') is not database_repo.get_user('thorke')
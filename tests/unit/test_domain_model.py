@@ -76,6 +76,24 @@ def test_make_review_establishes_relationships(movie, user):
     assert review.movie is movie
 
 
+def test_make_review_updates_rating_aggregates(movie, user):
+    assert movie.average_rating is None
+    assert movie.rating_histogram == (0,) * 10
+
+    make_review(movie, "Good", 8, user, None)
+    version = movie.version
+    make_review(movie, "Bad", 3, user, None)
+    assert movie.version != version
+
+    assert movie.number_of_ratings == 2
+    assert movie.average_rating == 5.5
+    assert movie.rating_histogram == (0, 0, 1, 0, 0, 0, 0, 1, 0, 0)
+
+    movie.reviews = movie.reviews[:1]
+    assert movie.number_of_ratings == 1
+    assert movie.average_rating == 8
+
+
 def test_make_tag_associations(movie, tag):
     make_tag_association(movie, tag)
 
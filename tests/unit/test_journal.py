@@ -0,0 +1,162 @@
+import shutil
+import threading
+from datetime import datetime
+
+import pytest
+
+from tests.conftest import TEST_DATA_PATH
+from cs235flix.adapters import journal, memory_repository
+from cs235flix.adapters.memory_repository import MemoryRepository, populate
+from cs235flix.domain.model import User, make_review
+
+
+@pytest.fixture
+def data_path(tmp_path):
+    path = tmp_path / 'data'
+    shutil.copytree(TEST_DATA_PATH, path)
+    return str(path)
+
+
+def populated_repo(data_path):
+    repo = MemoryRepository()
+    populate(data_path, repo)
+    return repo
+
+
+def make_writes(repo):
+    user = User('Dave', 'hash')
+    repo.add_user(user)
+    repo.add_review(make_review(repo.get_movie(2), 'Great, "really"\nGreat', 8, user, datetime(2020, 10, 1, 12, 30)))
+    repo.add_watched_ids('dave', repo.get_movie(3), 3)
+
+
+def assert_writes_present(repo):
+    user = repo.get_user('dave')
+    assert user.password == 'hash'
+    assert [review.review_text for review in user.reviews] == ['Great, "really"\nGreat']
+    assert repo.get_movie(2).reviews[-1].timestamp == datetime(2020, 10, 1, 12, 30)
+    assert repo.get_watched_ids('dave') == [3]
+    assert len(repo.get_reviews()) == 8
+
+
+def test_journal_is_replayed_after_populate(data_path, tmp_path):
+    journal_path = str(tmp_path / 'journal')
+    repo = populated_repo(data_path)
+    log = journal.open_journal(journal_path, repo, data_path)
+    make_writes(repo)
+    log.close()
+
+    repo = populated_repo(data_path)
+    assert repo.get_user('dave') is None
+    assert journal.replay_journal(journal_path, repo) == 3
+    assert_writes_present(repo)
+
+
+def test_replay_drops_incomplete_final_record(data_path, tmp_path):
+    journal_path = tmp_path / 'journal'
+    journal_path.write_bytes(b'["U","dave","hash"]\n["W","dave",3,')
+
+    repo = populated_repo(data_path)
+    assert journal.replay_journal(str(journal_path), repo) == 1
+    assert repo.get_user('dave') is not None
+    assert journal_path.read_bytes() == b'["U","dave","hash"]\n'
+
+
+def test_compaction_folds_journal_into_csv_files(data_path, tmp_path):
+    journal_path = str(tmp_path / 'journal')
+    repo = populated_repo(data_path)
+    log = journal.open_journal(journal_path, repo, data_path)
+    make_writes(repo)
+
+    journal.compact_journal(log, data_path)
+    assert log.is_empty()
+    log.close()
+
+    repo = populated_repo(data_path)
+    assert_writes_present(repo)
+    assert repo.get_user('admin').watched_ids == [1, 2, 5, 7, 9]
+    assert [friend.user_name for friend in repo.get_user('admin').friends] == ['thorke', 'fmercury', 'emelg']
+
+
+def test_replaying_a_folded_journal_changes_nothing(data_path, tmp_path):
+    journal_path = str(tmp_path / 'journal')
+    repo = populated_repo(data_path)
+    log = journal.open_journal(journal_path, repo, data_path)
+    make_writes(repo)
+    log.close()
+
+    # As if a compaction rewrote the CSV files but stopped before emptying the journal.
+    memory_repository.save_users(data_path, repo)
+    memory_repository.save_reviews(data_path, repo)
+    repo = populated_repo(data_path)
+    journal.replay_journal(journal_path, repo)
+    assert_writes_present(repo)
+
+
+def test_reloaded_repository_keeps_journaling(data_path, tmp_path):
+    journal_path = str(tmp_path / 'journal')
+    repo = populated_repo(data_path)
+    log = journal.open_journal(journal_path, repo, data_path)
+    repo, changes = memory_repository.reload_movies_and_tags(data_path, repo)
+    make_writes(repo)
+    log.close()
+
+    repo = populated_repo(data_path)
+    assert journal.replay_journal(journal_path, repo) == 3
+    assert_writes_present(repo)
+
+
+def test_compaction_keeps_records_of_other_workers(data_path, tmp_path):
+    # Two workers share the journal; each has only its own writes in memory.
+    journal_path = str(tmp_path / 'journal')
+    repo = populated_repo(data_path)
+    log = journal.open_journal(journal_path, repo, data_path)
+    other_repo = populated_repo(data_path)
+    other_log = journal.open_journal(journal_path, other_repo, data_path)
+
+    make_writes(other_repo)
+    repo.add_user(User('Erin', 'hash'))
+    journal.compact_journal(log, data_path)
+    assert other_log.is_empty()
+
+    # The other worker goes on appending to the same, now empty, journal.
+    other_repo.add_user(User('Fred', 'hash'))
+    log.close()
+    other_log.close()
+
+    repo = populated_repo(data_path)
+    assert_writes_present(repo)
+    assert repo.get_user('erin') is not None
+    assert repo.get_user('fred') is None
+    assert journal.replay_journal(journal_path, repo) == 1
+    assert repo.get_user('fred') is not None
+
+
+def test_compaction_populates_before_locking_the_journal(data_path, tmp_path, monkeypatch):
+    journal_path = str(tmp_path / 'journal')
+    repo = populated_repo(data_path)
+    log = journal.open_journal(journal_path, repo, data_path)
+    other_repo = populated_repo(data_path)
+    other_log = journal.open_journal(journal_path, other_repo, data_path)
+    repo.add_user(User('Erin', 'hash'))
+
+    def populate_while_others_write(path, memory_repo):
+        monkeypatch.setattr(journal, 'populate', populate)
+        populate(path, memory_repo)
+        # Other workers can write, and compact, while the repository is populated.
+        writer = threading.Thread(target=other_repo.add_user, args=(User('Fred', 'hash'),), daemon=True)
+        writer.start()
+        writer.join(5)
+        assert not writer.is_alive()
+        journal.compact_journal(other_log, data_path)
+        other_repo.add_user(User('Gail', 'hash'))
+
+    monkeypatch.setattr(journal, 'populate', populate_while_others_write)
+    journal.compact_journal(log, data_path)
+    assert log.is_empty()
+    log.close()
+    other_log.close()
+
+    # Erin and Fred were folded by the other worker's compaction, and Gail by this one.
+    repo = populated_repo(data_path)
+    assert [repo.get_user(name) is not None for name in ('erin', 'fred', 'gail')] == [True, True, True]
@@ -1,9 +1,18 @@
+import os
+import csv
+import shutil
 from datetime import date, datetime
 from typing import List
 
 import pytest
+from werkzeug.security import check_password_hash
 
-from cs235flix.domain.model import Actor, Genre, Director, Movie, User, Tag, Review, make_review
+from tests.conftest import TEST_DATA_PATH
+from cs235flix.adapters import memory_repository
+from cs235flix.adapters.memory_repository import MemoryRepository
+from cs235flix.datafilereaders.movie_file_csv_reader import MovieFileCSVReader
+
+from cs235flix.domain.model import Actor, Genre, Director, Movie, User, Tag, Review, make_review, make_tag_association
 from cs235flix.adapters.repository import RepositoryException
 
 
@@ -59,6 +68,8 @@ def test_repository_can_retrieve_movie_count(in_memory_repo):
 
     # Check that the query returned 30 Movies.
     assert number_of_movies == 30
+    assert list(in_memory_repo.get_movie_ids()) == list(range(1, 31))
+    assert MemoryRepository().get_movie_ids() == []
 
 
 def test_repository_can_add_movie(in_memory_repo):
@@ -190,10 +201,12 @@ def test_repository_returns_an_empty_list_for_non_existent_director(in_memory_re
 
 
 def test_repository_can_add_a_tag(in_memory_repo):
+    version = in_memory_repo.get_tags_version()
     tag = Tag('Cheese')
     in_memory_repo.add_tag(tag)
 
     assert tag in in_memory_repo.get_tags()
+    assert in_memory_repo.get_tags_version() != version
 
 
 def test_repository_can_add_a_review(in_memory_repo):
@@ -225,6 +238,37 @@ def test_repository_does_not_add_a_review_without_an_movie_properly_attached(in_
         in_memory_repo.add_review(review)
 
 
+def test_repository_can_add_reviews_in_bulk(in_memory_repo):
+    user = in_memory_repo.get_user('thorke')
+    movie = in_memory_repo.get_movie(2)
+    reviews = [Review(movie, "first", 5), Review(movie, "second", 6)]
+    for review in reviews:
+        review.user = user
+
+    in_memory_repo.add_reviews(reviews)
+    assert in_memory_repo.get_reviews()[-2:] == reviews
+    assert movie.reviews[-2:] == reviews
+    assert user.reviews[-2:] == reviews
+
+
+def test_repository_does_not_add_reviews_without_a_user(in_memory_repo):
+    movie = in_memory_repo.get_movie(2)
+    reviews = [Review(movie, "first", 5), Review(movie, "second", 6)]
+    reviews[0].user = in_memory_repo.get_user('thorke')
+
+    with pytest.raises(RepositoryException):
+        in_memory_repo.add_reviews(reviews)
+    assert len(movie.reviews) == 2
+
+
+def test_repository_keeps_movies_ordered_by_rating(in_memory_repo):
+    assert in_memory_repo.get_top_rated_movie_ids(10) == [2, 11, 4, 3, 1]
+
+    user = in_memory_repo.get_user('thorke')
+    in_memory_repo.add_review(make_review(in_memory_repo.get_movie(3), "Better", 10, user, None))
+    assert in_memory_repo.get_top_rated_movie_ids(3) == [2, 3, 11]
+
+
 def test_repository_can_retrieve_reviews(in_memory_repo):
     assert len(in_memory_repo.get_reviews()) == 7
 
@@ -254,3 +298,277 @@ def test_add_watched(in_memory_repo):
     assert len(watched) == 6
 
 
+def test_movie_index(in_memory_repo):
+    movie = in_memory_repo.get_movie(10)
+    assert in_memory_repo.movie_index(movie) == 10
+
+    new_movie = Movie("Arrivaz", 2020)
+    assert in_memory_repo.movie_index(new_movie) is ValueError
+    in_memory_repo.add_movie(new_movie)
+    assert in_memory_repo.movie_index(new_movie) == 31
+
+
+def test_repository_get_user_normalises_user_name(in_memory_repo):
+    user = in_memory_repo.get_user(' Thorke ')
+    assert user is in_memory_repo.get_user('thorke')
+
+
+def test_repository_can_retrieve_a_user_by_id(in_memory_repo):
+    user = in_memory_repo.get_user_by_id(1)
+    assert user.user_name == 'thorke'
+    assert in_memory_repo.get_user_by_id(999) is None
+
+
+def test_repository_indexes_people_of_added_movie(in_memory_repo):
+    movie = Movie("Arrivaz", 2020)
+    movie.director = Director("James Gunn")
+    movie.actors = [Actor("Chris Pratt"), Actor("Dead Rat")]
+    in_memory_repo.add_movie(movie)
+
+    assert in_memory_repo.get_movie_ids_for_actor('Chris Pratt') == [1, 10, 31]
+    assert in_memory_repo.get_movie_ids_for_actor('Dead Rat') == [31]
+    assert in_memory_repo.get_movie_ids_for_director('James Gunn') == [1, 31]
+
+
+def test_repository_can_get_tag_summary(in_memory_repo):
+    movie_ids, count = in_memory_repo.get_tag_summary('Horror')
+    assert movie_ids == (3, 23, 28)
+    assert count == 3
+
+    tag = [tag for tag in in_memory_repo.get_tags() if tag.tag_name == 'Horror'][0]
+    make_tag_association(in_memory_repo.get_movie(1), tag)
+    assert in_memory_repo.get_tag_summary('Horror') == ((3, 23, 28, 1), 4)
+
+    assert in_memory_repo.get_tag_summary('United States') is None
+
+
+def test_repository_returns_movie_ids_for_year_range(in_memory_repo):
+    assert in_memory_repo.get_movie_ids_for_year_range(2012, 2015) == [1, 2, 27]
+    assert in_memory_repo.get_movie_ids_for_year_range(2000, 2010) == []
+
+
+def test_repository_returns_movie_ids_for_runtime(in_memory_repo):
+    assert in_memory_repo.get_movie_ids_for_runtime(80, 90) == [8, 16, 26]
+    assert in_memory_repo.get_movie_ids_for_runtime(200, 300) == []
+
+
+def test_repository_can_add_movies_in_bulk(in_memory_repo):
+    movie_one = Movie("Arrivaz", 2020)
+    movie_one.genres = [Genre("Horror"), Genre("Cheese")]
+    movie_two = Movie("Aardvark", 2019)
+    movie_two.genres = [Genre("Cheese"), Genre("Cheese")]
+    in_memory_repo.add_movies_bulk([movie_one, movie_two])
+
+    assert in_memory_repo.get_number_of_movies() == 32
+    assert in_memory_repo.get_movie(31) is movie_one
+    assert in_memory_repo.get_movie(32) is movie_two
+    assert in_memory_repo.get_movie_ids_for_tag('Horror') == [3, 23, 28, 31]
+    assert in_memory_repo.get_movie_ids_for_tag('Cheese') == [31, 32]
+    assert in_memory_repo.get_movie_ids_for_year_range(2019, 2020) == [31, 32]
+
+
+def test_hash_seed_passwords(tmp_path):
+    shutil.copy(os.path.join(TEST_DATA_PATH, 'users.csv'), tmp_path / 'users.csv')
+
+    assert memory_repository.hash_seed_passwords(str(tmp_path / 'users.csv')) == 7
+    assert memory_repository.hash_seed_passwords(str(tmp_path / 'users.csv')) == 0
+    assert os.listdir(tmp_path) == ['users.csv']
+
+    users = memory_repository.load_users(str(tmp_path), MemoryRepository())
+    assert users['1'].user_name == 'thorke'
+    assert check_password_hash(users['1'].password, 'cLQ^C#oFXloS')
+    assert users['4'].friends[0].user_name == 'thorke'
+
+
+def write_movies_with_bad_row(data_path, rank: int = 5):
+    # Copies the test data to data_path, with the movie ranked rank given a runtime that can't be parsed.
+    for name in ('movies.csv', 'users.csv', 'reviews.csv'):
+        shutil.copy(os.path.join(TEST_DATA_PATH, name), data_path / name)
+    with open(data_path / 'movies.csv', encoding='utf-8-sig', newline='') as infile:
+        rows = list(csv.reader(infile))
+    rows[rank][7] = 'long'
+    with open(data_path / 'movies.csv', 'w', encoding='utf-8', newline='') as outfile:
+        csv.writer(outfile, lineterminator='\n').writerows(rows)
+
+
+def test_skipped_movie_leaves_a_gap_in_ids(in_memory_repo, tmp_path):
+    write_movies_with_bad_row(tmp_path)
+    repo = MemoryRepository()
+    memory_repository.populate(str(tmp_path), repo)
+    assert repo.get_movie(5) is None
+    assert repo.get_movie(6) == in_memory_repo.get_movie(6)
+    assert repo.get_last_movie() == in_memory_repo.get_last_movie()
+    assert list(repo.get_movie_ids()) == [id for id in range(1, 31) if id != 5]
+    assert [review.movie for review in repo.get_user('admin').reviews] == \
+        [review.movie for review in in_memory_repo.get_user('admin').reviews]
+
+
+def test_reviews_and_watched_movies_of_a_skipped_movie_are_skipped(tmp_path):
+    # Movie 1 is reviewed twice and watched by admin.
+    write_movies_with_bad_row(tmp_path, rank=1)
+    repo = MemoryRepository()
+    memory_repository.populate(str(tmp_path), repo)
+
+    assert repo.get_movie(1) is None
+    assert len(repo.get_reviews()) == 5
+    assert all(review.movie is repo.get_movie(repo.movie_index(review.movie)) for review in repo.get_reviews())
+    assert repo.get_user('admin').watched_ids == [2, 5, 7, 9]
+    assert repo.get_first_movie() is repo.get_movie(2)
+
+
+def test_first_movie_is_the_lowest_ranked_when_rank_one_is_missing():
+    reader = MovieFileCSVReader(os.path.join(TEST_DATA_PATH, 'movies.csv'))
+    repo = MemoryRepository()
+    repo.add_ranked_movies_bulk((rank, movie) for rank, movie in reader.iter_ranked_movies() if rank != 1)
+
+    assert repo.get_first_movie() is repo.get_movie(2)
+    assert MemoryRepository().get_first_movie() is None
+
+
+def write_reloaded_movies(data_path):
+    # Copies the test data to data_path, with Prometheus redescribed, Split no longer a horror, Assassin's Creed
+    # removed and a new movie ranked 31.
+    for name in ('movies.csv', 'users.csv', 'reviews.csv'):
+        shutil.copy(os.path.join(TEST_DATA_PATH, name), data_path / name)
+
+    with open(data_path / 'movies.csv', encoding='utf-8-sig', newline='') as infile:
+        rows = list(csv.reader(infile))
+    rows[2][3] = 'A new description.'
+    rows[3][2] = 'Thriller'
+    rows[30:] = [['31', 'Arrivaz', 'Horror', 'Aliens.', 'Ridley Scott', 'Chris Pratt', '2020', '90', '7', '1', '1',
+                  '1']]
+    with open(data_path / 'movies.csv', 'w', encoding='utf-8', newline='') as outfile:
+        csv.writer(outfile, lineterminator='\n').writerows(rows)
+
+
+def test_repository_can_reload_movies(in_memory_repo, tmp_path):
+    write_reloaded_movies(tmp_path)
+    old_movie_one = in_memory_repo.get_movie(1)
+    old_prometheus = in_memory_repo.get_movie(2)
+
+    repo, changes = memory_repository.reload_movies_and_tags(str(tmp_path), in_memory_repo)
+
+    assert changes == ([31], [2, 3], [30])
+    assert repo.get_number_of_movies() == 30
+    assert repo.get_last_movie().title == 'Arrivaz'
+    assert repo.get_movie(30) is None
+
+    # Unchanged movies, and the reviews of changed ones, are carried over.
+    assert repo.get_movie(1) is old_movie_one
+    assert len(old_movie_one.reviews) == 2
+    assert repo.get_movie(2).description == 'A new description.'
+    assert repo.get_movie(2).reviews == old_prometheus.reviews
+    assert repo.get_movie(2).reviews is not old_prometheus.reviews
+    assert repo.get_movie(2).number_of_ratings == 2
+    assert all(review.movie is repo.get_movie(2) for review in repo.get_movie(2).reviews)
+    assert repo.get_top_rated_movie_ids(2) == in_memory_repo.get_top_rated_movie_ids(2)
+    assert repo.get_reviews() is in_memory_repo.get_reviews()
+    assert repo.get_user('admin') is in_memory_repo.get_user('admin')
+
+    assert repo.get_movie_ids_for_tag('Horror') == [23, 28, 31]
+    assert repo.get_movie_ids_for_tag('Thriller')[:2] == [3, 18]
+    assert 31 in repo.get_movie_ids_for_actor('Chris Pratt')
+    assert 30 not in repo.get_movie_ids_for_year_range(2016, 2016)
+    assert repo.get_movie_ids_for_year_range(2020, 2020) == [31]
+
+    # The repository that was reloaded still holds the old catalogue.
+    assert in_memory_repo.get_movie(2) is old_prometheus
+    assert in_memory_repo.get_movie(30).title == "Assassin's Creed"
+    assert in_memory_repo.get_movie_ids_for_tag('Horror') == [3, 23, 28]
+    assert 31 not in in_memory_repo.get_movie_ids_for_actor('Chris Pratt')
+
+
+def test_writes_to_a_reloaded_repository_are_passed_on(in_memory_repo, tmp_path):
+    write_reloaded_movies(tmp_path)
+    old_prometheus = in_memory_repo.get_movie(2)
+    repo, changes = memory_repository.reload_movies_and_tags(str(tmp_path), in_memory_repo)
+
+    # As by a request that fetched Prometheus, and Assassin's Creed, before the reload.
+    user = in_memory_repo.get_user('emelg')
+    in_memory_repo.add_review(make_review(old_prometheus, 'Late', 10, user, datetime(2020, 11, 1)))
+    in_memory_repo.add_review(make_review(in_memory_repo.get_movie(30), 'Gone', 1, user, datetime(2020, 11, 1)))
+    in_memory_repo.add_watched_ids('emelg', old_prometheus, 2)
+
+    review = repo.get_movie(2).reviews[-1]
+    assert review.review_text == 'Late' and review.movie is repo.get_movie(2)
+    assert repo.get_movie(2).number_of_ratings == 3
+    assert repo.get_top_rated_movie_ids(1) == [2]
+    assert [review.review_text for review in user.reviews] == ['Late']
+    assert repo.get_reviews()[-1] is review
+    assert repo.get_watched('emelg') == [repo.get_movie(2)]
+
+
+def test_reviews_of_removed_movies_are_dropped(in_memory_repo, tmp_path):
+    for name in ('movies.csv', 'users.csv', 'reviews.csv'):
+        shutil.copy(os.path.join(TEST_DATA_PATH, name), tmp_path / name)
+    with open(tmp_path / 'movies.csv', encoding='utf-8-sig', newline='') as infile:
+        rows = list(csv.reader(infile))
+    del rows[1]
+    with open(tmp_path / 'movies.csv', 'w', encoding='utf-8', newline='') as outfile:
+        csv.writer(outfile, lineterminator='\n').writerows(rows)
+
+    repo, changes = memory_repository.reload_movies_and_tags(str(tmp_path), in_memory_repo)
+    assert changes == ([], [], [1])
+    assert len(repo.get_reviews()) == 5
+    assert len(in_memory_repo.get_reviews()) == 7
+    assert all(review.movie is not in_memory_repo.get_movie(1) for review in repo.get_user('thorke').reviews)
+
+    memory_repository.save_reviews(str(tmp_path), repo)
+    with open(tmp_path / 'reviews.csv', encoding='utf-8') as infile:
+        assert len(list(csv.reader(infile))) == 6
+
+
+def test_reloading_unchanged_movies_changes_nothing(in_memory_repo):
+    repo, changes = memory_repository.reload_movies_and_tags(TEST_DATA_PATH, in_memory_repo)
+
+    assert changes == ([], [], [])
+    assert repo.get_movies_by_id(range(1, 31)) == in_memory_repo.get_movies_by_id(range(1, 31))
+    assert repo.get_tags() == in_memory_repo.get_tags()
+
+
+def test_reloading_after_a_skipped_row_changes_nothing(tmp_path):
+    # Startup and reload identify movies the same way, so a skipped row doesn't make later movies look changed.
+    write_movies_with_bad_row(tmp_path)
+    repo = MemoryRepository()
+    memory_repository.populate(str(tmp_path), repo)
+
+    reloaded_repo, changes = memory_repository.reload_movies_and_tags(str(tmp_path), repo)
+    assert changes == ([], [], [])
+    assert reloaded_repo.get_movie(6) is repo.get_movie(6)
+
+
+def test_repository_can_retrieve_movie_ids_for_metric_range(in_memory_repo):
+    assert in_memory_repo.get_movie_ids_for_metric_range('metascore', 70, None) == \
+        [1, 7, 8, 9, 12, 14, 15, 17, 20, 22, 23]
+    assert in_memory_repo.get_movie_ids_for_metric_range('rating', 8.1, 8.1) == [1, 19]
+    assert in_memory_repo.get_movie_ids_for_metric_range('revenue_millions', None, 0.01) == [28]
+
+
+def test_repository_can_retrieve_movie_ids_by_metric(in_memory_repo):
+    by_votes = in_memory_repo.get_movie_ids_by_metric('votes', descending=True)
+    assert by_votes[:5] == (1, 2, 5, 20, 13)
+    assert len(by_votes) == 30
+
+    # Movies without a metascore come last, whichever way the order runs.
+    assert in_memory_repo.get_movie_ids_by_metric('metascore')[-3:] == (26, 27, 28)
+    assert in_memory_repo.get_movie_ids_by_metric('metascore', descending=True)[-3:] == (26, 27, 28)
+
+
+def test_repository_can_search_movie_titles_and_descriptions(in_memory_repo):
+    assert in_memory_repo.search_movie_ids('galaxy guardians') == ([1], 1)
+    assert in_memory_repo.search_movie_ids('"a group of"') == ([1], 1)
+
+    movie_ids, count = in_memory_repo.search_movie_ids('the', limit=5)
+    assert len(movie_ids) == 5
+    assert count == 27
+    assert movie_ids == in_memory_repo.search_movie_ids('the')[0][:5]
+
+
+def test_repository_data_version_follows_changes(in_memory_repo):
+    version, last_modified = in_memory_repo.get_data_version()
+
+    in_memory_repo.add_tag(Tag('Cheese'))
+    new_version, new_last_modified = in_memory_repo.get_data_version()
+    assert new_version != version
+    assert new_last_modified >= last_modified
+    assert in_memory_repo.get_data_version() == (new_version, new_last_modified)
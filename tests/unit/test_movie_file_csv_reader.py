@@ -0,0 +1,146 @@
+import io
+import os
+import csv
+
+import pytest
+
+from tests.conftest import TEST_DATA_PATH
+from cs235flix.datafilereaders.movie_file_csv_reader import MovieFileCSVReader, MovieFileCSVException, split_into_chunks
+from cs235flix.domain.model import Actor
+
+
+def test_reader_shares_people_and_genres_between_movies():
+    reader = MovieFileCSVReader(os.path.join(TEST_DATA_PATH, 'movies.csv'))
+    reader.read_csv_file()
+    movies = reader.dataset_of_movies
+
+    guardians = movies[0]
+    passengers = movies[9]
+    assert guardians.actors[0] is passengers.actors[1]
+    assert guardians.genres[0] is movies[4].genres[0]
+
+    chris_pratt = [actor for actor in reader.dataset_of_actors if actor == Actor('Chris Pratt')][0]
+    assert chris_pratt is guardians.actors[0]
+    assert len(reader.dataset_of_genres) == 16
+
+
+@pytest.fixture
+def bad_movies_file(tmp_path):
+    with open(os.path.join(TEST_DATA_PATH, 'movies.csv'), encoding='utf-8-sig') as infile:
+        lines = infile.readlines()
+    lines[2] = lines[2].replace(',2012,124,', ',2012,two hours,')
+    lines[4] = '4,Sing\n'
+    filename = tmp_path / 'movies.csv'
+    filename.write_text(''.join(lines), encoding='utf-8')
+    return str(filename)
+
+
+def test_reader_iterates_movies():
+    reader = MovieFileCSVReader(os.path.join(TEST_DATA_PATH, 'movies.csv'))
+    movies = reader.iter_movies()
+
+    assert next(movies).title == 'Guardians of the Galaxy'
+    assert next(movies).title == 'Prometheus'
+    assert len(list(movies)) == 28
+    assert reader.dataset_of_movies == []
+
+
+def test_reader_reports_line_of_bad_row(bad_movies_file):
+    reader = MovieFileCSVReader(bad_movies_file)
+
+    with pytest.raises(MovieFileCSVException) as exception_info:
+        reader.read_csv_file()
+    assert exception_info.value.line_number == 3
+    assert 'Runtime (Minutes)' in exception_info.value.message
+
+
+def test_reader_can_skip_bad_rows(bad_movies_file):
+    reader = MovieFileCSVReader(bad_movies_file)
+    movies = list(reader.iter_movies(skip_bad_rows=True))
+
+    assert len(movies) == 28
+    assert 'Prometheus' not in [movie.title for movie in movies]
+    assert [line_number for line_number, problem in reader.bad_rows] == [3, 5]
+
+
+def test_skipped_rows_leave_gaps_in_ranks(bad_movies_file):
+    reader = MovieFileCSVReader(bad_movies_file)
+    ranks = [rank for rank, movie in reader.iter_ranked_movies(skip_bad_rows=True)]
+    assert ranks == [1, 3] + list(range(5, 31))
+
+    parallel_reader = MovieFileCSVReader(bad_movies_file)
+    assert [rank for rank, movie in parallel_reader.iter_ranked_movies(skip_bad_rows=True, workers=2)] == ranks
+    assert [line_number for line_number, problem in parallel_reader.bad_rows] == [3, 5]
+
+
+def test_reader_rejects_repeated_ranks(tmp_path):
+    with open(os.path.join(TEST_DATA_PATH, 'movies.csv'), encoding='utf-8-sig') as infile:
+        lines = infile.readlines()
+    lines[3] = '2' + lines[3][1:]
+    filename = tmp_path / 'movies.csv'
+    filename.write_text(''.join(lines), encoding='utf-8')
+
+    reader = MovieFileCSVReader(str(filename))
+    ranked_movies = list(reader.iter_ranked_movies(skip_bad_rows=True))
+    assert [rank for rank, movie in ranked_movies][:3] == [1, 2, 4]
+    assert reader.bad_rows == [(4, 'Rank 2 is repeated')]
+
+    with pytest.raises(MovieFileCSVException) as exception_info:
+        list(MovieFileCSVReader(str(filename)).iter_ranked_movies())
+    assert exception_info.value.line_number == 4
+
+
+def test_split_into_chunks_keeps_rows_whole(tmp_path):
+    filename = tmp_path / 'movies.csv'
+    filename.write_text('Rank,Title,Description\n1,A,"one\ntwo"\n2,B,three\n3,C,"four, ""five""\nsix"\n4,D,x\n',
+                        encoding='utf-8')
+    text = filename.read_bytes()
+
+    fieldnames, chunks = split_into_chunks(str(filename), 8)
+    assert fieldnames == ['Rank', 'Title', 'Description']
+    assert len(chunks) > 1
+
+    titles = []
+    for start, end, first_line in chunks:
+        titles.extend(row[1] for row in csv.reader(io.StringIO(text[start:end].decode('utf-8'), newline='')))
+    assert titles == ['A', 'B', 'C', 'D']
+    assert chunks[0][0] == len('Rank,Title,Description\n')
+    assert chunks[-1][1] == len(text)
+    assert chunks[0][2] == 2
+
+
+def test_reader_reads_in_parallel():
+    filename = os.path.join(TEST_DATA_PATH, 'movies.csv')
+    serial_reader = MovieFileCSVReader(filename)
+    serial_reader.read_csv_file()
+    parallel_reader = MovieFileCSVReader(filename)
+    parallel_reader.read_csv_file(workers=2)
+
+    assert parallel_reader.dataset_of_movies == serial_reader.dataset_of_movies
+    assert parallel_reader.dataset_of_actors == serial_reader.dataset_of_actors
+    movies = parallel_reader.dataset_of_movies
+    assert movies[0].actors[0] is movies[9].actors[1]
+
+
+def test_reader_reports_line_of_bad_row_in_parallel(bad_movies_file):
+    reader = MovieFileCSVReader(bad_movies_file)
+    movies = list(reader.iter_movies(skip_bad_rows=True, workers=2))
+
+    assert len(movies) == 28
+    assert [line_number for line_number, problem in reader.bad_rows] == [3, 5]
+
+    with pytest.raises(MovieFileCSVException) as exception_info:
+        list(MovieFileCSVReader(bad_movies_file).iter_movies(workers=2))
+    assert exception_info.value.line_number == 3
+
+
+def test_reader_parses_optional_metrics():
+    reader = MovieFileCSVReader(os.path.join(TEST_DATA_PATH, 'movies.csv'))
+    reader.read_csv_file()
+    movies = reader.dataset_of_movies
+
+    assert (movies[0].rating, movies[0].votes, movies[0].revenue_millions, movies[0].metascore) == \
+        (8.1, 757074, 333.13, 76)
+    # Blank and N/A values are read as missing.
+    assert movies[7].revenue_millions is None
+    assert movies[25].metascore is None and movies[25].revenue_millions is None
@@ -0,0 +1,31 @@
+import os
+import shutil
+
+from tests.conftest import TEST_DATA_PATH
+import cs235flix.adapters.repository as repo
+from cs235flix.adapters.memory_repository import MemoryRepository, populate
+from cs235flix.adapters.reloader import CatalogueReloader
+
+
+def test_reloader_swaps_in_reloaded_repository(tmp_path):
+    shutil.copytree(TEST_DATA_PATH, tmp_path, dirs_exist_ok=True)
+    old_repo = MemoryRepository()
+    populate(str(tmp_path), old_repo)
+    repo.repo_instance = old_repo
+    reloader = CatalogueReloader(str(tmp_path), 0)
+
+    # Nothing happens until movies.csv changes.
+    reloader.check()
+    reloader.join()
+    assert repo.repo_instance is old_repo
+
+    with open(tmp_path / 'movies.csv', 'a', encoding='utf-8') as outfile:
+        outfile.write('31,Arrivaz,Horror,More aliens.,Ridley Scott,Chris Pratt,2020,90,7,1,1,1\n')
+    stat = os.stat(tmp_path / 'movies.csv')
+    os.utime(tmp_path / 'movies.csv', ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+
+    reloader.check()
+    reloader.join()
+    assert repo.repo_instance is not old_repo
+    assert repo.repo_instance.get_movie(31).title == 'Arrivaz'
+    assert old_repo.get_movie(31) is None
@@ -1,11 +1,13 @@
-from datetime import date
+from datetime import date, datetime
 
 import pytest
 
+from cs235flix.adapters.memory_repository import MemoryRepository
 from cs235flix.authentication.services import AuthenticationException
 from cs235flix.movie import services as movie_services
 from cs235flix.authentication import services as auth_services
 from cs235flix.movie.services import NonExistentMovieException
+from cs235flix.domain.model import Tag
 
 
 def test_can_add_user(in_memory_repo):
@@ -130,6 +132,17 @@ def test_get_last_movie(in_memory_repo):
     assert movie_as_dict['id'] == 30
 
 
+def test_get_first_and_last_movie_of_empty_repository():
+    assert movie_services.get_first_movie(MemoryRepository()) is None
+    assert movie_services.get_last_movie(MemoryRepository()) is None
+
+
+def test_tag_unknown_to_repository_has_no_tagged_movies(in_memory_repo):
+    tag_as_dict = movie_services.tag_to_dict(Tag('Cheese'), 1, in_memory_repo)
+
+    assert tag_as_dict == {'name': 'Cheese', 'tagged_movies': (), 'number_of_tagged_movies': 0}
+
+
 def test_get_movies_by_tag(in_memory_repo):
     target_tag = "Action"
 
@@ -247,3 +260,106 @@ def test_add_watched_for_user(in_memory_repo):
     auth_services.add_watched("admin", 5, in_memory_repo)
     assert len(auth_services.get_watched("admin", in_memory_repo)) == 6
     assert auth_services.get_watched("admin", in_memory_repo)[0] == 1
+
+
+def test_get_movies_by_id_without_tagged_movies(in_memory_repo):
+    as_dict = movie_services.get_movies_by_id([3], in_memory_repo, include_tagged_movies=False)
+
+    tag_names = [dictionary['name'] for dictionary in as_dict[0]['tags']]
+    assert 'Horror' in tag_names
+    assert all('tagged_movies' not in dictionary for dictionary in as_dict[0]['tags'])
+
+
+def test_get_movie_tags_include_tagged_movies(in_memory_repo):
+    movie_as_dict = movie_services.get_movie(3, in_memory_repo)
+
+    horror = [dictionary for dictionary in movie_as_dict['tags'] if dictionary['name'] == 'Horror'][0]
+    assert horror['tagged_movies'] == (3, 23, 28)
+    assert horror['number_of_tagged_movies'] == 3
+
+
+def test_get_movies_by_year_range(in_memory_repo):
+    id_list = movie_services.get_movie_ids_for_year_range(2014, 2015, in_memory_repo)
+    as_dict = movie_services.get_movies_by_id(id_list, in_memory_repo)
+
+    assert id_list == [1, 27]
+    assert as_dict[1]['title'] == "Bahubali: The Beginning"
+
+
+def test_get_movies_by_runtime(in_memory_repo):
+    id_list = movie_services.get_movie_ids_for_runtime(150, 160, in_memory_repo)
+    assert id_list == [27]
+
+
+def test_parse_range():
+    assert movie_services.parse_range('2014') == (2014, 2014)
+    assert movie_services.parse_range('2015 - 2010') == (2010, 2015)
+    assert movie_services.parse_range('garlic bread') is None
+
+
+def test_parse_number():
+    assert movie_services.parse_number('7.5') == 7.5
+    assert movie_services.parse_number('garlic bread') is None
+    assert movie_services.parse_number(None) is None
+    assert movie_services.parse_number('inf') is None
+    assert movie_services.parse_number('nan') is None
+
+
+def test_movie_dict_includes_rating_aggregates(in_memory_repo):
+    movie_as_dict = movie_services.get_movie(1, in_memory_repo)
+
+    assert movie_as_dict['average_rating'] == 3
+    assert movie_as_dict['number_of_ratings'] == 2
+    assert movie_as_dict['rating_histogram'] == (1, 0, 0, 0, 1, 0, 0, 0, 0, 0)
+    assert movie_services.get_top_rated_movie_ids(2, in_memory_repo) == [2, 11]
+
+
+def test_can_add_reviews_in_bulk(in_memory_repo):
+    reviews = [
+        {'movie_id': 3, 'review_text': 'Scary', 'rating': 7, 'user_name': 'fmercury'},
+        {'movie_id': 5, 'review_text': 'Long', 'rating': 4, 'user_name': 'thorke',
+         'timestamp': datetime(2020, 3, 1)},
+        {'movie_id': 3, 'review_text': 'Not scary', 'rating': 2, 'user_name': 'thorke'},
+    ]
+
+    assert movie_services.add_reviews(reviews, in_memory_repo) == 3
+
+    reviews_as_dict = movie_services.get_reviews_for_movie(3, in_memory_repo)
+    assert [review['review_text'] for review in reviews_as_dict] == ['rev1', 'Scary', 'Not scary']
+    assert movie_services.get_reviews_for_movie(5, in_memory_repo)[0]['timestamp'] == datetime(2020, 3, 1)
+    assert len(in_memory_repo.get_user('thorke').reviews) == 5
+
+
+def test_bulk_reviews_are_checked_before_any_is_added(in_memory_repo):
+    reviews = [
+        {'movie_id': 3, 'review_text': 'Scary', 'rating': 7, 'user_name': 'fmercury'},
+        {'movie_id': 31, 'review_text': 'Missing', 'rating': 7, 'user_name': 'fmercury'},
+    ]
+
+    with pytest.raises(movie_services.NonExistentMovieException):
+        movie_services.add_reviews(reviews, in_memory_repo)
+
+    reviews[1] = {'movie_id': 4, 'review_text': 'Unknown', 'rating': 7, 'user_name': 'gmichael'}
+    with pytest.raises(movie_services.UnknownUserException):
+        movie_services.add_reviews(reviews, in_memory_repo)
+
+    assert len(in_memory_repo.get_reviews()) == 7
+
+
+def test_sort_and_filter_movie_ids(in_memory_repo):
+    movie_ids = movie_services.sort_and_filter_movie_ids(None, in_memory_repo, '-votes', 'metascore', 70)
+    assert movie_ids == [1, 20, 7, 17, 22, 14, 12, 15, 9, 8, 23]
+
+    # Only the given movies are kept, and unknown metrics are ignored.
+    assert movie_services.sort_and_filter_movie_ids([3, 18, 20], in_memory_repo, 'votes') == [18, 3, 20]
+    assert movie_services.sort_and_filter_movie_ids([3, 18], in_memory_repo, 'title', 'title', 1) == [3, 18]
+    assert movie_services.sort_and_filter_movie_ids(None, in_memory_repo) is None
+
+    # Filtering keeps the order the ids were given in, such as that of search results.
+    assert movie_services.sort_and_filter_movie_ids([23, 3, 8, 1], in_memory_repo, None, 'metascore', 70) == [23, 8, 1]
+
+
+def test_search_movie_ids(in_memory_repo):
+    movie_ids, count = movie_services.search_movie_ids('Space', in_memory_repo)
+    assert movie_ids == [12, 25]
+    assert count == 2
@@ -0,0 +1,59 @@
+import os
+import shutil
+
+import pytest
+
+from tests.conftest import TEST_DATA_PATH
+from cs235flix.adapters import snapshot
+
+
+@pytest.fixture
+def data_path(tmp_path):
+    path = tmp_path / 'data'
+    shutil.copytree(TEST_DATA_PATH, path)
+    return str(path)
+
+
+def test_populate_from_snapshot_writes_snapshot(data_path, tmp_path):
+    snapshot_path = str(tmp_path / 'repo.snapshot')
+    repo = snapshot.populate_from_snapshot(data_path, snapshot_path)
+
+    assert os.path.exists(snapshot_path)
+    assert repo.get_number_of_movies() == 30
+
+
+def test_populate_from_snapshot_reuses_snapshot(data_path, tmp_path):
+    snapshot_path = str(tmp_path / 'repo.snapshot')
+    snapshot.populate_from_snapshot(data_path, snapshot_path)
+
+    repo = snapshot.load_snapshot(snapshot_path, snapshot.data_fingerprint(data_path))
+    assert repo is not None
+
+    movie = repo.get_movie(1)
+    assert movie.title == 'Guardians of the Galaxy'
+    assert repo.movie_index(movie) == 1
+    assert repo.get_movie_ids_for_actor('Chris Pratt') == [1, 10]
+    assert repo.get_movie_ids_for_tag('Horror') == [3, 23, 28]
+    assert repo.get_user('thorke').reviews[0].movie is repo.get_movie(1)
+
+
+def test_snapshot_is_stale_when_data_changes(data_path, tmp_path):
+    snapshot_path = str(tmp_path / 'repo.snapshot')
+    snapshot.populate_from_snapshot(data_path, snapshot_path)
+
+    with open(os.path.join(data_path, 'reviews.csv'), 'a') as outfile:
+        outfile.write('8,1,3,garlic bread,7,2020-03-01\n')
+
+    assert snapshot.load_snapshot(snapshot_path, snapshot.data_fingerprint(data_path)) is None
+
+    repo = snapshot.populate_from_snapshot(data_path, snapshot_path)
+    assert len(repo.get_reviews()) == 8
+    assert snapshot.load_snapshot(snapshot_path, snapshot.data_fingerprint(data_path)) is not None
+
+
+def test_snapshot_with_wrong_version_is_ignored(data_path, tmp_path, monkeypatch):
+    snapshot_path = str(tmp_path / 'repo.snapshot')
+    snapshot.populate_from_snapshot(data_path, snapshot_path)
+
+    monkeypatch.setattr(snapshot, 'SNAPSHOT_VERSION', snapshot.SNAPSHOT_VERSION + 1)
+    assert snapshot.load_snapshot(snapshot_path, snapshot.data_fingerprint(data_path)) is None
@@ -0,0 +1,44 @@
+from cs235flix.adapters.text_index import TextIndex, tokenise, parse_query
+
+
+def test_tokenise():
+    assert tokenise("Don't look UP, it's 2021!") == ["don't", 'look', 'up', "it's", '2021']
+    assert tokenise(None) == []
+
+
+def test_parse_query():
+    assert parse_query('space "a group of" space') == (['space', 'a', 'group', 'of'], [['a', 'group', 'of']])
+
+
+def test_search_ranks_titles_first():
+    index = TextIndex()
+    index.add(1, 'Arrival', 'Linguists meet the aliens who land across the world.')
+    index.add(2, 'Aliens', 'Ripley returns to the planet.')
+    index.add(3, 'Sing', 'A koala holds a singing competition.')
+
+    assert index.search('aliens') == ([2, 1], 2)
+    assert index.search('ALIENS planet', limit=1) == ([2], 2)
+    assert index.search('dinosaurs') == ([], 0)
+
+
+def test_search_matches_phrases():
+    index = TextIndex()
+    index.add(1, 'Split', 'Three girls are kidnapped by a man.')
+    index.add(2, 'Lion', 'A man finds his family after he was kidnapped as a girl.')
+
+    assert index.search('"kidnapped by"') == ([1], 1)
+    assert index.search('"man finds" kidnapped') == ([2], 1)
+    # Phrases don't run from a title into its description.
+    assert index.search('"split three"') == ([], 0)
+
+
+def test_copy_leaves_original_unchanged():
+    index = TextIndex()
+    index.add(1, 'Arrival', 'Aliens land.')
+    copy = index.copy()
+    copy.remove(1)
+    copy.add(2, 'Aliens', 'Aliens return.')
+
+    assert index.search('aliens') == ([1], 1)
+    assert copy.search('aliens') == ([2], 1)
+    assert len(index) == len(copy) == 1